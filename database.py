@@ -3,17 +3,121 @@
 Модуль для работы с базой данных
 """
 
+import asyncio
+import functools
+import hashlib
 import sqlite3
-from typing import List, Tuple, Dict, Any, Optional
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable, List, Tuple, Dict, Any, Optional
+import config
 from config import DB_PATH, MAX_SERVERS_PER_USER
+from services.circuit_breaker import circuit_breaker
+from services.command_cache import command_cache
+from services.ssh_pool import ssh_pool, CONNECTION_FIELDS
+from utils.cache import LRUCache
 
-def get_db_connection():
-    """Получить соединение с базой данных"""
-    return sqlite3.connect(DB_PATH)
+SERVER_CACHE_SIZE = getattr(config, 'SERVER_CACHE_SIZE', 1024)
+DB_READ_WORKERS = getattr(config, 'DB_READ_WORKERS', 2)
+DB_BUSY_TIMEOUT = getattr(config, 'DB_BUSY_TIMEOUT', 5.0)
+RESULT_COMPRESS_THRESHOLD = getattr(config, 'RESULT_COMPRESS_THRESHOLD', 4096)
+RESULT_PREVIEW_CHARS = getattr(config, 'RESULT_PREVIEW_CHARS', 200)
+
+ALERT_MAX_RULES_PER_USER = getattr(config, 'ALERT_MAX_RULES_PER_USER', 20)
+
+# Разрешения агрегатов метрик: имя -> длина интервала в секундах
+METRIC_RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+# Кэш конфигураций серверов ('server', server_id, user_id) и списков серверов ('servers', user_id)
+server_cache = LRUCache(maxsize=SERVER_CACHE_SIZE)
+# Поколения кэша: номер последнего сброса ключа. Чтение, начатое до сброса своего ключа,
+# не сохраняет прочитанную старую запись. Поколения удаленных серверов забываются, а
+# _server_cache_floor запрещает сохранять чтения, начатые до этого
+_server_cache_epoch = 0
+_server_cache_generations: Dict[Hashable, int] = {}
+_server_cache_floor = 0
+
+# Запросы выполняются вне цикла событий: чтение - в небольшом пуле потоков,
+# запись - в одном потоке, чтобы записи не конкурировали за блокировку файла
+_read_executor = ThreadPoolExecutor(max_workers=DB_READ_WORKERS, thread_name_prefix='db-read')
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+_thread_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+
+def invalidate_server_cache(user_id: int, server_id: Optional[int] = None, deleted: bool = False) -> None:
+    """
+    Сбросить кэш серверов пользователя (deleted - сервер удален, его поколение забывается)
+
+    Вызывается в цикле событий после завершения записи в базу: чтение, начатое позже,
+    уже видит изменение, а начатое раньше не сохранит результат в кэш.
+    """
+    global _server_cache_epoch, _server_cache_floor
+    _server_cache_epoch += 1
+    keys = [('servers', user_id)]
+    if server_id is not None:
+        keys.append(('server', server_id, user_id))
+    for key in keys:
+        _server_cache_generations[key] = _server_cache_epoch
+        server_cache.invalidate(key)
+    if deleted and server_id is not None:
+        del _server_cache_generations[('server', server_id, user_id)]
+        _server_cache_floor = _server_cache_epoch
+
+def _server_cache_generation() -> int:
+    return _server_cache_epoch
+
+def _server_cache_store(key: Hashable, value: Any, generation: int) -> None:
+    """Сохранить прочитанное, если ключ не сбрасывался после начала чтения"""
+    if max(_server_cache_generations.get(key, 0), _server_cache_floor) <= generation:
+        server_cache.set(key, value)
+
+def get_cache_stats() -> Dict[str, int]:
+    """Статистика кэша серверов"""
+    return server_cache.stats()
+
+def _connect() -> sqlite3.Connection:
+    """Открыть соединение с базой данных в режиме WAL"""
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT * 1000)}')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def get_db_connection() -> sqlite3.Connection:
+    """Получить долгоживущее соединение с базой данных текущего потока"""
+    conn = getattr(_thread_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _thread_local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+async def run_read(func: Callable, *args, **kwargs) -> Any:
+    """Выполнить чтение из базы в потоке чтения"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_read_executor, functools.partial(func, *args, **kwargs))
+
+async def run_write(func: Callable, *args, **kwargs) -> Any:
+    """Выполнить запись в базу в потоке записи"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_write_executor, functools.partial(func, *args, **kwargs))
+
+def close_database() -> None:
+    """Остановить потоки базы данных и закрыть соединения"""
+    _read_executor.shutdown(wait=True)
+    _write_executor.shutdown(wait=True)
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
 
 def init_database():
     """Инициализация базы данных"""
-    conn = get_db_connection()
+    conn = _connect()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -46,14 +150,152 @@ def init_database():
     )
     ''')
     
+    # Сжатые результаты и превью (миграция существующих баз)
+    _ensure_column(cursor, 'server_commands', 'result_blob', 'BLOB')
+    _ensure_column(cursor, 'server_commands', 'result_preview', 'TEXT')
+    _ensure_column(cursor, 'server_commands', 'result_size', 'INTEGER')
+    
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_server_commands_server_time
+    ON server_commands (server_id, executed_at)
+    ''')
+    
+    # Выводы команд хранятся один раз и адресуются хэшем содержимого
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS command_outputs (
+        hash TEXT PRIMARY KEY,
+        body TEXT,
+        body_blob BLOB,
+        preview TEXT,
+        size INTEGER,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    _ensure_column(cursor, 'server_commands', 'output_hash', 'TEXT')
+    
+    # Позиции последнего чтения логов на серверах
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS log_cursors (
+        server_id INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        inode INTEGER NOT NULL,
+        offset INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (server_id, path)
+    )
+    ''')
+    
+    # Последний снимок состояния каждого сервера (фоновый мониторинг)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS server_status_snapshots (
+        server_id INTEGER PRIMARY KEY,
+        checked_at REAL NOT NULL,
+        ok BOOLEAN NOT NULL,
+        elapsed REAL,
+        error TEXT,
+        results TEXT
+    )
+    ''')
+    
+    # Агрегаты метрик серверов: одна строка на интервал (1m, 1h, 1d)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS host_metrics (
+        server_id INTEGER NOT NULL,
+        metric TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        sum REAL NOT NULL,
+        min REAL NOT NULL,
+        max REAL NOT NULL,
+        PRIMARY KEY (server_id, metric, resolution, bucket)
+    ) WITHOUT ROWID
+    ''')
+    
+    # Правила оповещений пользователей (server_id NULL - все серверы пользователя)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS alert_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        server_id INTEGER,
+        metric TEXT NOT NULL,
+        operator TEXT NOT NULL,
+        threshold REAL NOT NULL,
+        per_core BOOLEAN DEFAULT 0,
+        for_checks INTEGER DEFAULT 1,
+        clear_threshold REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Сработавшие оповещения - чтобы после перезапуска не уведомлять повторно
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS alert_states (
+        rule_id INTEGER NOT NULL,
+        server_id INTEGER NOT NULL,
+        firing BOOLEAN NOT NULL,
+        changed_at REAL NOT NULL,
+        notified_at REAL,
+        PRIMARY KEY (rule_id, server_id)
+    )
+    ''')
+    
+    # Автоматический перезапуск бота (crash_loop_at - перезапуски остановлены из-за циклических падений,
+    # held - бот остановлен вручную и не перезапускается до /start_bot)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS bot_watchdogs (
+        server_id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        enabled_at REAL NOT NULL,
+        crash_loop_at REAL,
+        held BOOLEAN NOT NULL DEFAULT 0
+    )
+    ''')
+    _ensure_column(cursor, 'bot_watchdogs', 'held', 'BOOLEAN NOT NULL DEFAULT 0')
+    
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_command_outputs_refcount
+    ON command_outputs (refcount)
+    ''')
+    
+    # Счетчики ссылок поддерживаются триггерами при любой вставке, изменении и удалении
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS server_commands_output_ref
+    AFTER INSERT ON server_commands WHEN NEW.output_hash IS NOT NULL
+    BEGIN
+        UPDATE command_outputs SET refcount = refcount + 1 WHERE hash = NEW.output_hash;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS server_commands_output_unref
+    AFTER DELETE ON server_commands WHEN OLD.output_hash IS NOT NULL
+    BEGIN
+        UPDATE command_outputs SET refcount = refcount - 1 WHERE hash = OLD.output_hash;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS server_commands_output_reref
+    AFTER UPDATE OF output_hash ON server_commands
+    BEGIN
+        UPDATE command_outputs SET refcount = refcount - 1 WHERE hash = OLD.output_hash;
+        UPDATE command_outputs SET refcount = refcount + 1 WHERE hash = NEW.output_hash;
+    END
+    ''')
+    
     conn.commit()
     conn.close()
 
-def add_user_server(user_id: int, server_name: str, hostname: str, username: str, 
-                   password: Optional[str] = None, private_key: Optional[str] = None,
-                   port: int = 22, bot_directory: str = "/home", 
-                   bot_filename: str = "bot.py", service_name: Optional[str] = None) -> Tuple[bool, str]:
-    """Добавить сервер пользователя"""
+def _ensure_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+    """Добавить колонку в таблицу, если ее нет"""
+    columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+def _insert_user_server(user_id: int, server_name: str, hostname: str, username: str, 
+                        password: Optional[str], private_key: Optional[str], port: int,
+                        bot_directory: str, bot_filename: str, service_name: Optional[str]) -> Tuple[bool, str]:
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -81,16 +323,26 @@ def add_user_server(user_id: int, server_name: str, hostname: str, username: str
     except Exception as e:
         conn.rollback()
         return False, f"❌ Ошибка добавления сервера: {str(e)}"
-    finally:
-        conn.close()
 
-def get_user_servers(user_id: int) -> List[Dict[str, Any]]:
-    """Получить список серверов пользователя"""
+async def add_user_server(user_id: int, server_name: str, hostname: str, username: str, 
+                          password: Optional[str] = None, private_key: Optional[str] = None,
+                          port: int = 22, bot_directory: str = "/home", 
+                          bot_filename: str = "bot.py", service_name: Optional[str] = None) -> Tuple[bool, str]:
+    """Добавить сервер пользователя"""
+    success, message = await run_write(
+        _insert_user_server, user_id, server_name, hostname, username,
+        password, private_key, port, bot_directory, bot_filename, service_name
+    )
+    if success:
+        invalidate_server_cache(user_id)
+    return success, message
+
+def _select_user_servers(user_id: int) -> List[Dict[str, Any]]:
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
-    SELECT id, server_name, hostname, port, username, bot_directory, bot_filename, service_name
+    SELECT id, server_name, hostname, port, username, bot_directory, bot_filename, service_name, user_id
     FROM user_servers 
     WHERE user_id = ? 
     ORDER BY created_at DESC
@@ -106,25 +358,56 @@ def get_user_servers(user_id: int) -> List[Dict[str, Any]]:
             'username': row[4],
             'directory': row[5],
             'filename': row[6],
-            'service_name': row[7]
+            'service_name': row[7],
+            'user_id': row[8]
         })
     
-    conn.close()
     return servers
 
-def get_server_config(server_id: int, user_id: int) -> Optional[Dict[str, Any]]:
-    """Получить конфигурацию сервера"""
+async def get_user_servers(user_id: int) -> List[Dict[str, Any]]:
+    """Получить список серверов пользователя"""
+    key = ('servers', user_id)
+    servers = server_cache.get(key)
+    if servers is None:
+        generation = _server_cache_generation()
+        servers = await run_read(_select_user_servers, user_id)
+        _server_cache_store(key, servers, generation)
+    return [dict(server) for server in servers]
+
+def _select_monitored_servers() -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    cursor = conn.execute('''
+    SELECT id, user_id, server_name, hostname, bot_filename, service_name
+    FROM user_servers
+    ORDER BY id
+    ''')
+    return [
+        {
+            'id': row[0],
+            'user_id': row[1],
+            'name': row[2],
+            'hostname': row[3],
+            'filename': row[4],
+            'service_name': row[5]
+        }
+        for row in cursor.fetchall()
+    ]
+
+async def get_monitored_servers() -> List[Dict[str, Any]]:
+    """Все серверы всех пользователей для фонового мониторинга"""
+    return await run_read(_select_monitored_servers)
+
+def _select_server_config(server_id: int, user_id: int) -> Optional[Dict[str, Any]]:
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
-    SELECT id, server_name, hostname, port, username, password, private_key, bot_directory, bot_filename, service_name
+    SELECT id, server_name, hostname, port, username, password, private_key, bot_directory, bot_filename, service_name, user_id
     FROM user_servers 
     WHERE id = ? AND user_id = ?
     ''', (server_id, user_id))
     
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return {
@@ -137,12 +420,24 @@ def get_server_config(server_id: int, user_id: int) -> Optional[Dict[str, Any]]:
             'private_key': row[6],
             'bot_directory': row[7],
             'bot_filename': row[8],
-            'service_name': row[9]
+            'service_name': row[9],
+            'user_id': row[10]
         }
     return None
 
-def update_user_server(server_id: int, user_id: int, **kwargs) -> Tuple[bool, str]:
-    """Обновить данные сервера"""
+async def get_server_config(server_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+    """Получить конфигурацию сервера"""
+    key = ('server', server_id, user_id)
+    server_config = server_cache.get(key)
+    if server_config is None:
+        generation = _server_cache_generation()
+        server_config = await run_read(_select_server_config, server_id, user_id)
+        if server_config is None:
+            return None
+        _server_cache_store(key, server_config, generation)
+    return dict(server_config)
+
+def _update_user_server(server_id: int, user_id: int, fields: Dict[str, Any]) -> Tuple[bool, str]:
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -160,7 +455,7 @@ def update_user_server(server_id: int, user_id: int, **kwargs) -> Tuple[bool, st
         allowed_fields = ['server_name', 'hostname', 'port', 'username', 
                          'password', 'private_key', 'bot_directory', 'bot_filename', 'service_name']
         
-        for field, value in kwargs.items():
+        for field, value in fields.items():
             if field in allowed_fields and value is not None:
                 update_fields.append(f"{field} = ?")
                 update_values.append(value)
@@ -185,11 +480,21 @@ def update_user_server(server_id: int, user_id: int, **kwargs) -> Tuple[bool, st
     except Exception as e:
         conn.rollback()
         return False, f"❌ Ошибка обновления сервера: {str(e)}"
-    finally:
-        conn.close()
 
-def delete_user_server(server_id: int, user_id: int) -> Tuple[bool, str]:
-    """Удалить сервер пользователя"""
+async def update_user_server(server_id: int, user_id: int, **kwargs) -> Tuple[bool, str]:
+    """Обновить данные сервера"""
+    success, message = await run_write(_update_user_server, server_id, user_id, kwargs)
+    if success:
+        invalidate_server_cache(user_id, server_id)
+        command_cache.invalidate(server_id)
+        
+        # Сбрасываем SSH соединение при смене параметров подключения
+        if any(field in kwargs for field in CONNECTION_FIELDS):
+            ssh_pool.invalidate(server_id)
+            circuit_breaker.reset(server_id)
+    return success, message
+
+def _delete_user_server(server_id: int, user_id: int) -> Tuple[bool, str]:
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -198,13 +503,567 @@ def delete_user_server(server_id: int, user_id: int) -> Tuple[bool, str]:
                       (server_id, user_id))
         
         if cursor.rowcount == 0:
+            conn.rollback()
             return False, "❌ Сервер не найден"
         
+        cursor.execute('DELETE FROM log_cursors WHERE server_id = ?', (server_id,))
+        cursor.execute('DELETE FROM server_status_snapshots WHERE server_id = ?', (server_id,))
+        cursor.execute('DELETE FROM host_metrics WHERE server_id = ?', (server_id,))
+        cursor.execute('DELETE FROM alert_states WHERE server_id = ?', (server_id,))
+        cursor.execute('''
+        DELETE FROM alert_states WHERE rule_id IN (SELECT id FROM alert_rules WHERE server_id = ?)
+        ''', (server_id,))
+        cursor.execute('DELETE FROM alert_rules WHERE server_id = ?', (server_id,))
+        cursor.execute('DELETE FROM bot_watchdogs WHERE server_id = ?', (server_id,))
+        
         conn.commit()
         return True, "✅ Сервер успешно удален"
         
     except Exception as e:
         conn.rollback()
         return False, f"❌ Ошибка удаления сервера: {str(e)}"
-    finally:
-        conn.close()
\ No newline at end of file
+
+async def delete_user_server(server_id: int, user_id: int) -> Tuple[bool, str]:
+    """Удалить сервер пользователя"""
+    success, message = await run_write(_delete_user_server, server_id, user_id)
+    if success:
+        invalidate_server_cache(user_id, server_id, deleted=True)
+        command_cache.invalidate(server_id)
+        ssh_pool.invalidate(server_id)
+        circuit_breaker.reset(server_id)
+    return success, message
+
+def make_result_preview(result: str) -> str:
+    """Начало и конец результата для просмотра без загрузки полного текста"""
+    if len(result) <= RESULT_PREVIEW_CHARS * 2:
+        return result
+    return f"{result[:RESULT_PREVIEW_CHARS]}\n...\n{result[-RESULT_PREVIEW_CHARS:]}"
+
+def encode_result(result: Optional[str]) -> Tuple[Optional[str], Optional[bytes], str, int]:
+    """Подготовить результат к хранению: (текст, сжатый blob, превью, размер)"""
+    result = result or ''
+    data = result.encode('utf-8')
+    preview = make_result_preview(result)
+    
+    if len(data) > RESULT_COMPRESS_THRESHOLD:
+        return None, zlib.compress(data, 6), preview, len(data)
+    return result, None, preview, len(data)
+
+def decode_result(result: Optional[str], result_blob: Optional[bytes]) -> str:
+    """Восстановить результат из хранимого вида"""
+    if result_blob is not None:
+        return zlib.decompress(result_blob).decode('utf-8', errors='ignore')
+    return result or ''
+
+def output_hash(result: Optional[str]) -> str:
+    """Хэш содержимого вывода команды"""
+    return hashlib.blake2b((result or '').encode('utf-8'), digest_size=16).hexdigest()
+
+def _store_outputs(cursor: sqlite3.Cursor, results: List[Optional[str]]) -> List[str]:
+    """Сохранить отсутствующие выводы и вернуть их хэши"""
+    hashes = [output_hash(result) for result in results]
+    unique = dict(zip(hashes, results))
+    
+    # Повторяющиеся выводы не сжимаются и не записываются заново
+    placeholders = ','.join('?' * len(unique))
+    existing = {
+        row[0] for row in cursor.execute(
+            f'SELECT hash FROM command_outputs WHERE hash IN ({placeholders})', list(unique)
+        )
+    }
+    new_outputs = [
+        (digest, *encode_result(result))
+        for digest, result in unique.items() if digest not in existing
+    ]
+    cursor.executemany('''
+    INSERT OR IGNORE INTO command_outputs (hash, body, body_blob, preview, size)
+    VALUES (?, ?, ?, ?, ?)
+    ''', new_outputs)
+    return hashes
+
+def _insert_server_commands(rows: List[Tuple[int, str, str, bool, str]]) -> None:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        hashes = _store_outputs(cursor, [row[2] for row in rows])
+        cursor.executemany('''
+        INSERT INTO server_commands (server_id, command, output_hash, success, executed_at)
+        VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (server_id, command, digest, success, executed_at)
+            for (server_id, command, _, success, executed_at), digest in zip(rows, hashes)
+        ])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+async def log_server_commands(rows: List[Tuple[int, str, str, bool, str]]) -> None:
+    """Сохранить пакет выполненных команд одной транзакцией"""
+    await run_write(_insert_server_commands, rows)
+
+def _compact_server_commands(max_age_days: int, max_rows: int, overrides: Dict[int, Dict[str, int]],
+                             vacuum_pages: int, batch_size: int) -> Dict[str, int]:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    stats = {'expired': 0, 'trimmed': 0, 'orphaned': 0, 'migrated': 0, 'collected': 0}
+    
+    try:
+        # Записи удаленных серверов
+        cursor.execute('''
+        DELETE FROM server_commands
+        WHERE server_id NOT IN (SELECT id FROM user_servers)
+        ''')
+        stats['orphaned'] = cursor.rowcount
+        
+        server_ids = [row[0] for row in cursor.execute('SELECT id FROM user_servers')]
+        for server_id in server_ids:
+            limits = overrides.get(server_id, {})
+            days = limits.get('days', max_age_days)
+            rows_limit = limits.get('max_rows', max_rows)
+            
+            if days:
+                cursor.execute('''
+                DELETE FROM server_commands
+                WHERE server_id = ? AND executed_at < datetime('now', ?)
+                ''', (server_id, f'-{int(days)} days'))
+                stats['expired'] += cursor.rowcount
+            
+            if rows_limit:
+                cursor.execute('''
+                DELETE FROM server_commands
+                WHERE server_id = ? AND id <= (
+                    SELECT id FROM server_commands
+                    WHERE server_id = ?
+                    ORDER BY id DESC
+                    LIMIT 1 OFFSET ?
+                )
+                ''', (server_id, server_id, int(rows_limit)))
+                stats['trimmed'] += cursor.rowcount
+        
+        # Перенос результатов, записанных до появления таблицы выводов
+        rows = cursor.execute('''
+        SELECT id, result, result_blob FROM server_commands
+        WHERE output_hash IS NULL
+        LIMIT ?
+        ''', (batch_size,)).fetchall()
+        if rows:
+            hashes = _store_outputs(cursor, [decode_result(result, blob) for _, result, blob in rows])
+            cursor.executemany('''
+            UPDATE server_commands
+            SET output_hash = ?, result = NULL, result_blob = NULL, result_preview = NULL, result_size = NULL
+            WHERE id = ?
+            ''', [(digest, row[0]) for row, digest in zip(rows, hashes)])
+        stats['migrated'] = len(rows)
+        
+        # Выводы, на которые больше не ссылается ни одна запись
+        cursor.execute('DELETE FROM command_outputs WHERE refcount <= 0')
+        stats['collected'] = cursor.rowcount
+        
+        conn.commit()
+        
+        # Возвращаем системе ограниченное число свободных страниц за проход
+        cursor.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})').fetchall()
+        stats['freelist_pages'] = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        return stats
+        
+    except Exception:
+        conn.rollback()
+        raise
+
+def _select_incremental_vacuum() -> bool:
+    conn = get_db_connection()
+    return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+async def is_incremental_vacuum() -> bool:
+    """Включена ли инкрементальная очистка свободных страниц"""
+    # Соединения чтения не видят смену режима до переоткрытия - спрашиваем поток записи
+    return await run_write(_select_incremental_vacuum)
+
+def _enable_incremental_vacuum() -> float:
+    conn = get_db_connection()
+    started = time.monotonic()
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    # Смена режима вступает в силу только после полного переписывания файла
+    conn.execute('VACUUM')
+    return time.monotonic() - started
+
+async def enable_incremental_vacuum() -> float:
+    """Включить инкрементальную очистку (один полный VACUUM в потоке записи); время в секундах"""
+    return await run_write(_enable_incremental_vacuum)
+
+async def compact_server_commands(max_age_days: int, max_rows: int, overrides: Dict[int, Dict[str, int]],
+                                  vacuum_pages: int, batch_size: int = 500) -> Dict[str, int]:
+    """Удалить устаревшие записи журнала команд, сжать большие результаты и освободить место"""
+    return await run_write(_compact_server_commands, max_age_days, max_rows, overrides,
+                           vacuum_pages, batch_size)
+
+def _select_output_changes(server_id: int, command: str, limit: int) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    rows = conn.execute('''
+    SELECT executed_at, output_hash, preview FROM (
+        SELECT c.executed_at, c.output_hash, o.preview,
+               LAG(c.output_hash) OVER (ORDER BY c.executed_at, c.id) AS previous_hash
+        FROM server_commands c
+        LEFT JOIN command_outputs o ON o.hash = c.output_hash
+        WHERE c.server_id = ? AND c.command = ?
+    )
+    WHERE previous_hash IS NULL OR previous_hash != output_hash
+    ORDER BY executed_at DESC
+    LIMIT ?
+    ''', (server_id, command, limit)).fetchall()
+    return [{'executed_at': row[0], 'hash': row[1], 'preview': row[2]} for row in rows]
+
+async def get_output_changes(server_id: int, command: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Моменты, когда вывод команды на сервере отличался от предыдущего запуска"""
+    return await run_read(_select_output_changes, server_id, command, limit)
+
+def _select_command_history(server_id: int, cursor_position: Optional[Tuple[str, int]], newer: bool,
+                            success: Optional[bool], command_prefix: Optional[str],
+                            limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+    conn = get_db_connection()
+    conditions = ['c.server_id = ?']
+    params: List[Any] = [server_id]
+    
+    # Keyset пагинация по индексу (server_id, executed_at), rowid - последний ключ индекса
+    if cursor_position:
+        conditions.append('(c.executed_at, c.id) > (?, ?)' if newer else '(c.executed_at, c.id) < (?, ?)')
+        params.extend(cursor_position)
+    if success is not None:
+        conditions.append('c.success = ?')
+        params.append(success)
+    if command_prefix:
+        conditions.append('substr(c.command, 1, ?) = ?')
+        params.extend([len(command_prefix), command_prefix])
+    
+    order = 'ASC' if newer else 'DESC'
+    rows = conn.execute(f'''
+    SELECT c.id, c.executed_at, c.command, c.success, o.preview, o.size
+    FROM server_commands c
+    LEFT JOIN command_outputs o ON o.hash = c.output_hash
+    WHERE {' AND '.join(conditions)}
+    ORDER BY c.executed_at {order}, c.id {order}
+    LIMIT ?
+    ''', params + [limit + 1]).fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if newer:
+        rows.reverse()
+    
+    return [
+        {
+            'id': row[0],
+            'executed_at': row[1],
+            'command': row[2],
+            'success': bool(row[3]),
+            'preview': row[4] or '',
+            'size': row[5] or 0
+        }
+        for row in rows
+    ], has_more
+
+async def get_command_history(server_id: int, cursor_position: Optional[Tuple[str, int]] = None,
+                              newer: bool = False, success: Optional[bool] = None,
+                              command_prefix: Optional[str] = None,
+                              limit: int = 10) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Страница истории команд сервера, от новых к старым
+    
+    Args:
+        cursor_position: (executed_at, id) граничной записи предыдущей страницы
+        newer: Листать к более новым записям от cursor_position
+    
+    Returns:
+        Tuple[List[Dict], bool]: Записи страницы и признак наличия следующих в выбранном направлении
+    """
+    return await run_read(_select_command_history, server_id, cursor_position, newer,
+                          success, command_prefix, limit)
+
+def _select_log_cursor(server_id: int, path: str) -> Optional[Tuple[int, int]]:
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT inode, offset FROM log_cursors WHERE server_id = ? AND path = ?', (server_id, path)
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+async def get_log_cursor(server_id: int, path: str) -> Optional[Tuple[int, int]]:
+    """Inode и смещение последнего прочитанного байта лога"""
+    return await run_read(_select_log_cursor, server_id, path)
+
+def _upsert_log_cursor(server_id: int, path: str, inode: int, offset: int) -> None:
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+        INSERT INTO log_cursors (server_id, path, inode, offset, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT (server_id, path) DO UPDATE
+        SET inode = excluded.inode, offset = excluded.offset, updated_at = excluded.updated_at
+        ''', (server_id, path, inode, offset))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+async def save_log_cursor(server_id: int, path: str, inode: int, offset: int) -> None:
+    """Запомнить позицию чтения лога"""
+    await run_write(_upsert_log_cursor, server_id, path, inode, offset)
+
+def _upsert_status_snapshots(rows: List[Tuple[int, float, bool, Optional[float], Optional[str], str]]) -> None:
+    conn = get_db_connection()
+    try:
+        conn.executemany('''
+        INSERT INTO server_status_snapshots (server_id, checked_at, ok, elapsed, error, results)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (server_id) DO UPDATE
+        SET checked_at = excluded.checked_at, ok = excluded.ok, elapsed = excluded.elapsed,
+            error = excluded.error, results = excluded.results
+        ''', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+async def save_status_snapshots(rows: List[Tuple[int, float, bool, Optional[float], Optional[str], str]]) -> None:
+    """Сохранить снимки состояния: (server_id, checked_at, ok, elapsed, error, results в JSON)"""
+    await run_write(_upsert_status_snapshots, rows)
+
+def _select_status_snapshots() -> List[Tuple[int, float, bool, Optional[float], Optional[str], str]]:
+    conn = get_db_connection()
+    return conn.execute('''
+    SELECT s.server_id, s.checked_at, s.ok, s.elapsed, s.error, s.results
+    FROM server_status_snapshots s
+    JOIN user_servers u ON u.id = s.server_id
+    ''').fetchall()
+
+async def load_status_snapshots() -> List[Tuple[int, float, bool, Optional[float], Optional[str], str]]:
+    """Последние сохраненные снимки состояния существующих серверов"""
+    return await run_read(_select_status_snapshots)
+
+def _upsert_host_metrics(samples: List[Tuple[int, str, float, float]]) -> None:
+    conn = get_db_connection()
+    rows = []
+    for server_id, metric, timestamp, value in samples:
+        for resolution, step in METRIC_RESOLUTIONS.items():
+            rows.append((server_id, metric, resolution, int(timestamp // step * step), value, value, value))
+    try:
+        # Каждое значение сразу попадает во все разрешения - отдельного прохода свертки нет
+        conn.executemany('''
+        INSERT INTO host_metrics (server_id, metric, resolution, bucket, count, sum, min, max)
+        VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+        ON CONFLICT (server_id, metric, resolution, bucket) DO UPDATE
+        SET count = count + 1, sum = sum + excluded.sum,
+            min = MIN(min, excluded.min), max = MAX(max, excluded.max)
+        ''', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+async def save_host_metrics(samples: List[Tuple[int, str, float, float]]) -> None:
+    """Сохранить значения метрик: (server_id, metric, timestamp, value)"""
+    await run_write(_upsert_host_metrics, samples)
+
+def _select_host_metrics(server_id: int, resolution: str, since: float) -> Dict[str, List[Tuple[int, int, float, float, float]]]:
+    conn = get_db_connection()
+    cursor = conn.execute('''
+    SELECT metric, bucket, count, sum, min, max
+    FROM host_metrics
+    WHERE server_id = ? AND resolution = ? AND bucket >= ?
+    ORDER BY metric, bucket
+    ''', (server_id, resolution, int(since // METRIC_RESOLUTIONS[resolution] * METRIC_RESOLUTIONS[resolution])))
+    
+    series: Dict[str, List[Tuple[int, int, float, float, float]]] = {}
+    for metric, bucket, count, total, low, high in cursor.fetchall():
+        series.setdefault(metric, []).append((bucket, count, total, low, high))
+    return series
+
+async def get_host_metrics(server_id: int, resolution: str,
+                           since: float) -> Dict[str, List[Tuple[int, int, float, float, float]]]:
+    """Агрегаты метрик сервера: metric -> [(bucket, count, sum, min, max)]"""
+    return await run_read(_select_host_metrics, server_id, resolution, since)
+
+def _prune_host_metrics(max_age: Dict[str, float], now: float) -> int:
+    conn = get_db_connection()
+    try:
+        deleted = 0
+        for resolution, seconds in max_age.items():
+            deleted += conn.execute(
+                'DELETE FROM host_metrics WHERE resolution = ? AND bucket < ?',
+                (resolution, now - seconds)
+            ).rowcount
+        conn.commit()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+
+async def prune_host_metrics(max_age: Dict[str, float], now: float) -> int:
+    """Удалить агрегаты старше срока хранения своего разрешения"""
+    return await run_write(_prune_host_metrics, max_age, now)
+
+ALERT_RULE_FIELDS = ('id', 'user_id', 'server_id', 'metric', 'operator', 'threshold',
+                     'per_core', 'for_checks', 'clear_threshold')
+
+def _insert_alert_rule(user_id: int, server_id: Optional[int], metric: str, operator: str, threshold: float,
+                       per_core: bool, for_checks: int, clear_threshold: Optional[float]) -> Tuple[bool, str, Optional[int]]:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT COUNT(*) FROM alert_rules WHERE user_id = ?', (user_id,))
+        if cursor.fetchone()[0] >= ALERT_MAX_RULES_PER_USER:
+            return False, f"❌ Достигнут лимит правил: {ALERT_MAX_RULES_PER_USER}", None
+        
+        cursor.execute('''
+        INSERT INTO alert_rules (user_id, server_id, metric, operator, threshold, per_core, for_checks, clear_threshold)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, server_id, metric, operator, threshold, per_core, for_checks, clear_threshold))
+        conn.commit()
+        return True, "✅ Правило добавлено", cursor.lastrowid
+    except Exception as e:
+        conn.rollback()
+        return False, f"❌ Ошибка добавления правила: {str(e)}", None
+
+async def add_alert_rule(user_id: int, server_id: Optional[int], metric: str, operator: str, threshold: float,
+                         per_core: bool = False, for_checks: int = 1,
+                         clear_threshold: Optional[float] = None) -> Tuple[bool, str, Optional[int]]:
+    """Добавить правило оповещения; возвращает (успех, сообщение, id правила)"""
+    return await run_write(_insert_alert_rule, user_id, server_id, metric, operator, threshold,
+                           per_core, for_checks, clear_threshold)
+
+def _select_alert_rules(user_id: Optional[int]) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    query = f"SELECT {', '.join(ALERT_RULE_FIELDS)} FROM alert_rules"
+    if user_id is None:
+        rows = conn.execute(query + ' ORDER BY id').fetchall()
+    else:
+        rows = conn.execute(query + ' WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+    return [dict(zip(ALERT_RULE_FIELDS, row)) for row in rows]
+
+async def get_alert_rules(user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Правила оповещений пользователя или всех пользователей"""
+    return await run_read(_select_alert_rules, user_id)
+
+def _delete_alert_rule(rule_id: int, user_id: int) -> Tuple[bool, str]:
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute('DELETE FROM alert_rules WHERE id = ? AND user_id = ?', (rule_id, user_id))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return False, "❌ Правило не найдено"
+        conn.execute('DELETE FROM alert_states WHERE rule_id = ?', (rule_id,))
+        conn.commit()
+        return True, "✅ Правило удалено"
+    except Exception as e:
+        conn.rollback()
+        return False, f"❌ Ошибка удаления правила: {str(e)}"
+
+async def delete_alert_rule(rule_id: int, user_id: int) -> Tuple[bool, str]:
+    """Удалить правило оповещения пользователя"""
+    return await run_write(_delete_alert_rule, rule_id, user_id)
+
+def _upsert_alert_state(rule_id: int, server_id: int, firing: bool, changed_at: float,
+                        notified_at: Optional[float]) -> None:
+    conn = get_db_connection()
+    try:
+        conn.execute('''
+        INSERT INTO alert_states (rule_id, server_id, firing, changed_at, notified_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (rule_id, server_id) DO UPDATE
+        SET firing = excluded.firing, changed_at = excluded.changed_at, notified_at = excluded.notified_at
+        ''', (rule_id, server_id, firing, changed_at, notified_at))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+async def save_alert_state(rule_id: int, server_id: int, firing: bool, changed_at: float,
+                           notified_at: Optional[float]) -> None:
+    """Запомнить смену состояния оповещения"""
+    await run_write(_upsert_alert_state, rule_id, server_id, firing, changed_at, notified_at)
+
+def _select_alert_states() -> List[Tuple[int, int, bool, float, Optional[float]]]:
+    conn = get_db_connection()
+    return conn.execute('''
+    SELECT rule_id, server_id, firing, changed_at, notified_at FROM alert_states
+    ''').fetchall()
+
+async def load_alert_states() -> List[Tuple[int, int, bool, float, Optional[float]]]:
+    """Сохраненные состояния оповещений: (rule_id, server_id, firing, changed_at, notified_at)"""
+    return await run_read(_select_alert_states)
+
+def _update_bot_watchdog(server_id: int, user_id: int, enabled: bool, now: float) -> Tuple[bool, str]:
+    conn = get_db_connection()
+    try:
+        if enabled:
+            # Повторное включение сбрасывает признак циклических падений
+            conn.execute('''
+            INSERT INTO bot_watchdogs (server_id, user_id, enabled_at, crash_loop_at)
+            VALUES (?, ?, ?, NULL)
+            ON CONFLICT (server_id) DO UPDATE SET enabled_at = excluded.enabled_at, crash_loop_at = NULL
+            ''', (server_id, user_id, now))
+            message = "✅ Автоперезапуск включен"
+        else:
+            conn.execute('DELETE FROM bot_watchdogs WHERE server_id = ? AND user_id = ?', (server_id, user_id))
+            message = "✅ Автоперезапуск выключен"
+        conn.commit()
+        return True, message
+    except Exception as e:
+        conn.rollback()
+        return False, f"❌ Ошибка настройки автоперезапуска: {str(e)}"
+
+async def set_bot_watchdog(server_id: int, user_id: int, enabled: bool) -> Tuple[bool, str]:
+    """Включить или выключить автоперезапуск бота на сервере"""
+    return await run_write(_update_bot_watchdog, server_id, user_id, enabled, time.time())
+
+def _mark_watchdog_crash_loop(server_id: int, crash_loop_at: Optional[float]) -> None:
+    conn = get_db_connection()
+    try:
+        conn.execute('UPDATE bot_watchdogs SET crash_loop_at = ? WHERE server_id = ?', (crash_loop_at, server_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+async def mark_watchdog_crash_loop(server_id: int, crash_loop_at: Optional[float]) -> None:
+    """Запомнить, что перезапуски остановлены из-за циклических падений (None - сбросить)"""
+    await run_write(_mark_watchdog_crash_loop, server_id, crash_loop_at)
+
+def _mark_watchdog_held(server_id: int, held: bool) -> None:
+    conn = get_db_connection()
+    try:
+        conn.execute('UPDATE bot_watchdogs SET held = ? WHERE server_id = ?', (held, server_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+async def mark_watchdog_held(server_id: int, held: bool) -> None:
+    """Запомнить ручную остановку бота, чтобы она пережила перезапуск админ-бота"""
+    await run_write(_mark_watchdog_held, server_id, held)
+
+def _select_bot_watchdogs() -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    cursor = conn.execute('''
+    SELECT s.id, s.user_id, s.server_name, s.bot_filename, s.service_name, w.enabled_at, w.crash_loop_at, w.held
+    FROM bot_watchdogs w
+    JOIN user_servers s ON s.id = w.server_id AND s.user_id = w.user_id
+    ORDER BY s.id
+    ''')
+    return [
+        {
+            'id': row[0],
+            'user_id': row[1],
+            'name': row[2],
+            'filename': row[3],
+            'service_name': row[4],
+            'enabled_at': row[5],
+            'crash_loop_at': row[6],
+            'held': bool(row[7])
+        }
+        for row in cursor.fetchall()
+    ]
+
+async def get_bot_watchdogs() -> List[Dict[str, Any]]:
+    """Серверы с включенным автоперезапуском бота"""
+    return await run_read(_select_bot_watchdogs)
@@ -15,12 +15,16 @@ from .server.edit import (
     edit_server_start, edit_server_choose, edit_server_value, edit_server_cancel
 )
 from .server.delete import delete_server_handler
+from .server.alerts import alerts_handler, alert_add_handler, alert_del_handler
 from .server.list import my_servers_handler  # ← Импорт из правильного места
 from .bot.start import start_bot_handler
 from .bot.stop import stop_bot_handler
 from .bot.status import server_status_handler
-from .bot.logs import bot_logs_handler
+from .bot.stats import stats_handler
+from .bot.watchdog import watchdog_handler
+from .bot.logs import bot_logs_handler, cancel_follow_handler
 from .command.execute import run_command_handler
+from .command.history import history_handler, history_callback_handler
 
 __all__ = [
     'start_handler', 'help_handler', 'my_servers_handler',  # ← Теперь есть
@@ -29,5 +33,7 @@ __all__ = [
     'add_server_directory', 'add_server_filename', 'add_server_cancel',
     'edit_server_start', 'edit_server_choose', 'edit_server_value', 'edit_server_cancel',
     'delete_server_handler', 'server_status_handler', 'start_bot_handler',
-    'stop_bot_handler', 'bot_logs_handler', 'run_command_handler'
+    'stop_bot_handler', 'bot_logs_handler', 'cancel_follow_handler', 'run_command_handler',
+    'history_handler', 'history_callback_handler', 'stats_handler',
+    'alerts_handler', 'alert_add_handler', 'alert_del_handler', 'watchdog_handler'
 ]
\ No newline at end of file
@@ -3,11 +3,37 @@
 Обработчики для логов бота
 """
 
+from typing import Any, Dict, List
 from telegram import Update
 from telegram.ext import ContextTypes
+import config
 from database import get_server_config
 from services.ssh_client import execute_server_command
-from utils.helpers import safe_send_message
+from services.log_stream import (
+    follow_log, stop_follow, LOG_FOLLOW_DEFAULT_SECONDS, LOG_FOLLOW_MAX_SECONDS,
+    FOLLOW_CANCELLED, FOLLOW_EOF
+)
+from services.log_reader import fetch_log_delta, search_log, LOG_GREP_CONTEXT
+from utils.helpers import safe_send_message, ThrottledEditor, format_size
+
+LOG_FOLLOW_EDIT_INTERVAL = getattr(config, 'LOG_FOLLOW_EDIT_INTERVAL', 3.0)
+LOG_MESSAGE_CHARS = 3800
+
+def default_log_file(server_config: Dict[str, Any]) -> str:
+    """Файл лога по умолчанию: имя файла бота с расширением .log"""
+    bot_filename = server_config.get('bot_filename', 'bot.py')
+    return f"{bot_filename.replace('.py', '.log')}"
+
+def render_log_lines(header: str, lines: List[str]) -> str:
+    """Заголовок и последние строки лога, помещающиеся в одно сообщение"""
+    shown = []
+    size = len(header)
+    for line in reversed(lines):
+        size += len(line) + 1
+        if size > LOG_MESSAGE_CHARS:
+            break
+        shown.append(line)
+    return header + "\n\n" + "\n".join(reversed(shown))
 
 async def bot_logs_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Логи бота на сервере"""
@@ -22,13 +48,24 @@ async def bot_logs_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         server_id = int(context.args[0])
         
         # Получаем конфигурацию сервера
-        server_config = get_server_config(server_id, user_id)
+        server_config = await get_server_config(server_id, user_id)
         if not server_config:
             await safe_send_message(update, "❌ Сервер не найден")
             return
         
-        bot_filename = server_config.get('bot_filename', 'bot.py')
-        log_file = context.args[1] if len(context.args) > 1 else f"{bot_filename.replace('.py', '.log')}"
+        if len(context.args) > 1 and context.args[1].lower() == 'follow':
+            await follow_logs(update, server_id, user_id, server_config, context.args[2:])
+            return
+        
+        if len(context.args) > 1 and context.args[1].lower() == 'grep':
+            await grep_logs(update, server_id, user_id, server_config, context.args[2:])
+            return
+        
+        if len(context.args) > 1 and context.args[1].lower() == 'new':
+            await new_logs(update, server_id, user_id, server_config, context.args[2:])
+            return
+        
+        log_file = context.args[1] if len(context.args) > 1 else default_log_file(server_config)
         
         from config import MAX_LOG_LINES
         command = f"cd {server_config['bot_directory']} && tail -n {MAX_LOG_LINES} {log_file}"
@@ -39,4 +76,141 @@ async def bot_logs_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await safe_send_message(update, f"❌ Ошибка: {result}")
     except ValueError:
-        await safe_send_message(update, "❌ ID сервера должен быть числом")
\ No newline at end of file
+        await safe_send_message(update, "❌ ID сервера должен быть числом")
+
+async def new_logs(update: Update, server_id: int, user_id: int,
+                   server_config: Dict[str, Any], args: List[str]):
+    """Строки лога, появившиеся с прошлого просмотра"""
+    log_file = args[0] if args else default_log_file(server_config)
+    
+    delta = await fetch_log_delta(server_id, user_id, log_file)
+    if not delta['ok']:
+        await safe_send_message(update, f"❌ Ошибка: {delta['error']}")
+        return
+    
+    notes = []
+    if delta['first']:
+        notes.append("ℹ️ Первый просмотр: показан конец файла")
+    if delta['rotated']:
+        notes.append("🔄 Лог был ротирован, чтение с начала нового файла")
+    if delta['skipped']:
+        notes.append(f"⏭ Пропущено {format_size(delta['skipped'])}")
+    
+    header = "\n".join([f"🆕 Новое в {log_file}:"] + notes)
+    lines = delta['data'].splitlines()
+    if not lines:
+        await safe_send_message(update, header + "\n\n🤷 Новых строк нет")
+        return
+    await safe_send_message(update, header + "\n\n" + "\n".join(lines))
+
+def parse_grep_args(args: List[str]) -> Dict[str, Any]:
+    """Разобрать: <шаблон> [--since время] [--level уровень] [-C строк] [-i] [--file лог]"""
+    options = {'pattern': [], 'since': None, 'level': None, 'context': LOG_GREP_CONTEXT,
+               'ignore_case': False, 'log_file': None}
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in ('--since', '--level', '--file', '-C'):
+            if not args:
+                raise ValueError(f"не указано значение {arg}")
+            value = args.pop(0)
+            if arg == '--since':
+                # "--since 2024-05-01 14:00" приходит двумя аргументами
+                if args and len(args[0]) in (5, 8) and args[0][2:3] == ':':
+                    value += ' ' + args.pop(0)
+                options['since'] = value
+            elif arg == '--level':
+                options['level'] = value
+            elif arg == '--file':
+                options['log_file'] = value
+            else:
+                if not value.isdigit():
+                    raise ValueError("-C должно быть числом")
+                options['context'] = min(int(value), 10)
+        elif arg == '-i':
+            options['ignore_case'] = True
+        else:
+            options['pattern'].append(arg)
+    
+    options['pattern'] = ' '.join(options['pattern'])
+    if not options['pattern'] and not options['level']:
+        raise ValueError("укажите шаблон или --level")
+    return options
+
+async def grep_logs(update: Update, server_id: int, user_id: int,
+                    server_config: Dict[str, Any], args: List[str]):
+    """Поиск по логу на сервере: передаются только найденные строки с контекстом"""
+    try:
+        options = parse_grep_args(args)
+    except ValueError as e:
+        await safe_send_message(update, f"❌ {e}\n\n/bot_logs <id> grep <шаблон> "
+                                        f"[--since время] [--level ERROR] [-C строк] [-i] [--file лог]")
+        return
+    
+    log_file = options['log_file'] or default_log_file(server_config)
+    result = await search_log(server_id, user_id, log_file, options['pattern'],
+                              since=options['since'], level=options['level'],
+                              ignore_case=options['ignore_case'], context=options['context'])
+    if not result['ok']:
+        await safe_send_message(update, f"❌ Ошибка: {result['error']}")
+        return
+    
+    filters = []
+    if options['pattern']:
+        filters.append(f"«{options['pattern']}»")
+    if options['level']:
+        filters.append(f"уровень от {options['level'].upper()}")
+    if options['since']:
+        filters.append(f"с {options['since']}")
+    header = f"🔎 {log_file}: {', '.join(filters)}"
+    
+    if not result['matches']:
+        await safe_send_message(update, header + "\n\n🤷 Совпадений нет")
+        return
+    
+    if result['shown'] < result['matches']:
+        header += f"\nПоказано {result['shown']} из {result['matches']} совпадений"
+    else:
+        header += f"\nСовпадений: {result['matches']}"
+    await safe_send_message(update, header + "\n\n" + "\n".join(result['lines']))
+
+async def follow_logs(update: Update, server_id: int, user_id: int,
+                      server_config: Dict[str, Any], args: List[str]):
+    """Слежение за логом: одно сообщение обновляется по мере появления строк"""
+    duration = LOG_FOLLOW_DEFAULT_SECONDS
+    if args and args[0].isdigit():
+        duration = max(1, min(int(args[0]), LOG_FOLLOW_MAX_SECONDS))
+        args = args[1:]
+    log_file = args[0] if args else default_log_file(server_config)
+    
+    message = await safe_send_message(update, f"📡 Подключение к {log_file}...")
+    editor = ThrottledEditor(message, LOG_FOLLOW_EDIT_INTERVAL)
+    shown_lines: List[str] = []
+    
+    async def on_lines(lines: List[str], remaining: float):
+        shown_lines[:] = lines
+        header = f"📡 {log_file} (ещё {int(remaining)} с, /cancel - остановить)"
+        await editor.update(render_log_lines(header, lines))
+    
+    try:
+        reason = await follow_log(server_id, user_id, log_file, duration, on_lines)
+    except Exception as e:
+        await editor.update(f"❌ Ошибка слежения за логом: {str(e)}")
+        await editor.flush()
+        return
+    
+    if reason == FOLLOW_CANCELLED:
+        status = "⏹ остановлено"
+    elif reason == FOLLOW_EOF:
+        status = "⏹ tail завершился"
+    else:
+        status = f"⏹ прошло {duration} с"
+    await editor.update(render_log_lines(f"📋 {log_file} ({status})", shown_lines))
+    await editor.flush()
+
+async def cancel_follow_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Остановка слежения за логом (/cancel вне диалогов)"""
+    if stop_follow(update.effective_user.id):
+        await safe_send_message(update, "⏹ Слежение за логом остановлено")
+    else:
+        await safe_send_message(update, "🤷 Нечего отменять")
\ No newline at end of file
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Обработчики для истории метрик сервера
+"""
+
+import re
+from telegram import Update
+from telegram.ext import ContextTypes
+from database import get_server_config
+from services.metrics import metrics_store, sparkline, METRICS
+from utils.helpers import safe_send_message
+
+STATS_DEFAULT_WINDOW = '1h'
+STATS_MAX_WINDOW = 365 * 86400
+
+def parse_window(text: str) -> int:
+    """Окно вида 30m, 6h, 7d в секундах"""
+    match = re.fullmatch(r'(\d+)([mhd])', text.lower())
+    if not match:
+        raise ValueError(text)
+    seconds = int(match.group(1)) * {'m': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+    if not 0 < seconds <= STATS_MAX_WINDOW:
+        raise ValueError(text)
+    return seconds
+
+async def stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Минимум, среднее, максимум и график метрик сервера за окно"""
+    user_id = update.effective_user.id
+    
+    if not context.args:
+        from help import get_help_text
+        await safe_send_message(update, get_help_text("stats"))
+        return
+    
+    try:
+        server_id = int(context.args[0])
+    except ValueError:
+        await safe_send_message(update, "❌ ID сервера должен быть числом")
+        return
+    
+    window_text = context.args[1] if len(context.args) > 1 else STATS_DEFAULT_WINDOW
+    try:
+        window = parse_window(window_text)
+    except ValueError:
+        await safe_send_message(update, "❌ Окно указывается как 30m, 6h или 7d (не больше 365d)")
+        return
+    
+    server_config = await get_server_config(server_id, user_id)
+    if not server_config:
+        await safe_send_message(update, "❌ Сервер не найден")
+        return
+    
+    series = await metrics_store.query(server_id, window)
+    
+    text = f"📊 Метрики: {server_config['name']} (за {window_text})\n"
+    if not any(series.values()):
+        await safe_send_message(update, text + "\n🤷 Данных за это окно нет. Метрики собираются фоновым мониторингом")
+        return
+    
+    for metric, (title, unit) in METRICS.items():
+        points = series.get(metric, [])
+        if not points:
+            text += f"\n{title}: нет данных\n"
+            continue
+        
+        averages = [point[1] for point in points]
+        low = min(point[2] for point in points)
+        high = max(point[3] for point in points)
+        average = sum(averages) / len(averages)
+        text += (
+            f"\n{title}: мин {low:.2f}{unit} / сред {average:.2f}{unit} / макс {high:.2f}{unit}\n"
+            f"{sparkline(averages)}\n"
+        )
+    
+    await safe_send_message(update, text)
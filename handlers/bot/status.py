@@ -3,12 +3,21 @@
 Обработчики для статуса сервера
 """
 
+from typing import Any, Dict, List
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import get_server_config
-from services.ssh_client import execute_server_command
-from services.bot_checker import check_bot_status
-from utils.helpers import safe_send_message
+import config
+from database import get_server_config, get_user_servers
+from services.fleet import fan_out, FLEET_OK, FLEET_TIMEOUT, FLEET_HOST_TIMEOUT
+from services.probes import run_probe_bundle, status_probes, describe_bot_status, describe_system_status
+from services.health_monitor import (
+    health_monitor, make_snapshot, snapshot_age, HEALTH_SNAPSHOT_MAX_AGE
+)
+from services.scheduler import command_scheduler
+from utils.helpers import safe_send_message, ThrottledEditor, format_age
+from utils.outbound import MESSAGE_MAX_LENGTH
+
+FLEET_EDIT_INTERVAL = getattr(config, 'FLEET_EDIT_INTERVAL', 1.5)
 
 async def server_status_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Статус сервера"""
@@ -19,47 +28,132 @@ async def server_status_handler(update: Update, context: ContextTypes.DEFAULT_TY
         await safe_send_message(update, get_help_text("server_status"))
         return
     
+    # Режим нескольких серверов: all или список ID через запятую
+    target = context.args[0].lower()
+    if target == 'all' or ',' in target:
+        await fleet_status_handler(update, user_id, target)
+        return
+    
     try:
         server_id = int(context.args[0])
         
         # Получаем информацию о сервере
-        server_config = get_server_config(server_id, user_id)
+        server_config = await get_server_config(server_id, user_id)
         if not server_config:
             await safe_send_message(update, "❌ Сервер не найден")
             return
         
-        # Выполняем команды для получения статуса
-        commands = {
-            "uptime": "uptime",
-            "memory": "free -h | awk '/^Mem:/ {print $3\"/\"$2}'",
-            "disk": "df -h / | awk 'NR==2 {print $4\" свободно из \"$2}'",
-            "load": "cat /proc/loadavg | awk '{print $1\", \"$2\", \"$3}'"
-        }
-        
-        results = {}
-        for key, cmd in commands.items():
-            success, result = await execute_server_command(server_id, user_id, cmd)
-            results[key] = result if success else "❌ Ошибка"
+        # Снимок фонового мониторинга отвечает сразу; refresh или устаревший снимок - живой опрос
+        refresh = len(context.args) > 1 and context.args[1].lower() == 'refresh'
+        snapshot = health_monitor.get(server_id)
+        if refresh or not snapshot or snapshot_age(snapshot) > HEALTH_SNAPSHOT_MAX_AGE:
+            snapshot = await health_monitor.refresh(server_config, user_id)
         
-        # Проверяем статус бота
-        bot_filename = server_config.get('bot_filename', 'bot.py')
-        bot_status = await check_bot_status(server_id, user_id, bot_filename)
-        
-        # Форматируем красивый вывод
-        status_message = (
-            f"📊 Статус сервера: {server_config['name']}\n"
-            f"🌐 {server_config['hostname']}:{server_config['port']}\n\n"
-            f"🤖 Статус бота: {bot_status}\n\n"
-            f"⏰ Время работы: {results.get('uptime', 'N/A')}\n"
-            f"💾 Память: {results.get('memory', 'N/A')}\n"
-            f"💿 Диск: {results.get('disk', 'N/A')}\n"
-            f"📈 Нагрузка: {results.get('load', 'N/A')}\n\n"
-            f"👤 Пользователь: {server_config['username']}\n"
-            f"📁 Директория: {server_config.get('bot_directory', '/home')}\n"
-            f"📄 Файл бота: {bot_filename}"
-        )
-        
-        await safe_send_message(update, status_message)
+        await safe_send_message(update, format_server_status(server_config, snapshot))
         
     except ValueError:
-        await safe_send_message(update, "❌ ID сервера должен быть числом")
\ No newline at end of file
+        await safe_send_message(update, "❌ ID сервера должен быть числом")
+
+def format_server_status(server_config: Dict[str, Any], snapshot: Dict[str, Any]) -> str:
+    """Подробный статус сервера по снимку"""
+    bot_filename = server_config.get('bot_filename', 'bot.py')
+    header = (
+        f"📊 Статус сервера: {server_config['name']}\n"
+        f"🌐 {server_config['hostname']}:{server_config['port']}\n"
+        f"🕒 Данные: {format_age(snapshot_age(snapshot))} (refresh - обновить)\n\n"
+    )
+    footer = (
+        f"👤 Пользователь: {server_config['username']}\n"
+        f"📁 Директория: {server_config.get('bot_directory', '/home')}\n"
+        f"📄 Файл бота: {bot_filename}"
+    )
+    
+    if not snapshot['ok']:
+        return header + f"❌ Сервер недоступен: {snapshot['error']}\n\n" + footer
+    
+    results = describe_system_status(snapshot['results'])
+    return (
+        header +
+        f"🤖 Статус бота: {describe_bot_status(snapshot['results'])}\n\n"
+        f"⏰ Время работы: {results.get('uptime', 'N/A')}\n"
+        f"💾 Память: {results.get('memory', 'N/A')}\n"
+        f"💿 Диск: {results.get('disk', 'N/A')}\n"
+        f"📈 Нагрузка: {results.get('load', 'N/A')}\n\n" +
+        footer
+    )
+
+def format_fleet_line(server: Dict[str, Any], status: str, result: Any, elapsed: float) -> str:
+    """Строка статуса одного сервера в сводке"""
+    title = f"{server['name']} (ID: {server['id']})"
+    
+    if status == FLEET_TIMEOUT:
+        return f"⏳ {title}: нет ответа за {FLEET_HOST_TIMEOUT} с"
+    if status != FLEET_OK:
+        return f"❌ {title}: {result}"
+    
+    # Все пробы с ошибкой - сервер недоступен
+    if not any(probe.get('ok') for probe in result.values()):
+        error = next(iter(result.values()), {}).get('error', 'нет ответа')
+        return f"❌ {title}: {error}"
+    
+    described = describe_system_status(result)
+    return (
+        f"🖥️ {title} ({elapsed:.1f} с)\n"
+        f"   🤖 {describe_bot_status(result)}\n"
+        f"   📈 {described['load']} | 💾 {described['memory']} | 💿 {described['disk']}"
+    )
+
+async def fleet_status_handler(update: Update, user_id: int, target: str):
+    """Статус нескольких серверов с обновлением одного сообщения"""
+    servers = await get_user_servers(user_id)
+    missing: List[str] = []
+    
+    if target != 'all':
+        try:
+            server_ids = [int(part) for part in target.split(',') if part.strip()]
+        except ValueError:
+            await safe_send_message(update, "❌ ID серверов должны быть числами")
+            return
+        
+        servers_by_id = {server['id']: server for server in servers}
+        missing = [str(server_id) for server_id in server_ids if server_id not in servers_by_id]
+        servers = [servers_by_id[server_id] for server_id in dict.fromkeys(server_ids) if server_id in servers_by_id]
+    
+    if not servers:
+        await safe_send_message(update, "❌ Серверы не найдены")
+        return
+    
+    # Опрос всех серверов - одна команда пользователя: допуск проверяется один раз
+    rejection = await command_scheduler.admit(user_id)
+    if rejection:
+        await safe_send_message(update, rejection)
+        return
+    
+    lines = {server['id']: f"⏳ {server['name']} (ID: {server['id']}): ожидание ответа" for server in servers}
+    done = 0
+    
+    def render() -> str:
+        text = f"📊 Статус серверов ({done}/{len(servers)})\n\n" + "\n".join(lines.values())
+        if missing:
+            text += f"\n\n❌ Не найдены: {', '.join(missing)}"
+        return text
+    
+    editor = ThrottledEditor(await safe_send_message(update, render()), FLEET_EDIT_INTERVAL)
+    
+    async def probe(server: Dict[str, Any]):
+        probes = status_probes(server.get('filename') or 'bot.py', server.get('service_name'))
+        return await run_probe_bundle(server['id'], user_id, probes, audit=False, admission=False)
+    
+    async for server, status, result, elapsed in fan_out(servers, probe):
+        done += 1
+        lines[server['id']] = format_fleet_line(server, status, result, elapsed)
+        # Живой опрос заодно обновляет снимок мониторинга
+        await health_monitor.record(server, make_snapshot(server['id'], status, result, elapsed))
+        await editor.update(render())
+    
+    await editor.flush()
+    
+    final = render()
+    if len(final) > MESSAGE_MAX_LENGTH:
+        # В редактируемое сообщение поместилось не все - полный отчет отдельными сообщениями
+        await safe_send_message(update, final)
\ No newline at end of file
@@ -3,13 +3,19 @@
 Обработчики для остановки бота
 """
 
-import asyncio
 from telegram import Update
 from telegram.ext import ContextTypes
 from database import get_server_config
-from services.ssh_client import execute_server_command
+from services.bot_control import stop_bot
+from services.watchdog import bot_watchdog
 from utils.helpers import safe_send_message
 
+METHOD_NAMES = {
+    'systemd': 'через systemd сервис',
+    'sigterm': 'сигналом SIGTERM',
+    'sigkill': 'принудительно (SIGKILL)'
+}
+
 async def stop_bot_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Остановка бота на сервера"""
     user_id = update.effective_user.id
@@ -24,52 +30,41 @@ async def stop_bot_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         service_name = context.args[1] if len(context.args) > 1 else "bot"
         
         # Получаем конфигурацию сервера
-        server_config = get_server_config(server_id, user_id)
+        server_config = await get_server_config(server_id, user_id)
         if not server_config:
             await safe_send_message(update, "❌ Сервер не найден")
             return
         
-        bot_filename = server_config.get('bot_filename', 'bot.py')
+        # Остановленный вручную бот не перезапускается автоматически, начатый перезапуск отменяется
+        await bot_watchdog.hold(server_id)
         
-        # Сначала проверяем, запущен ли бот
-        check_command = f"pgrep -f 'python3.*{bot_filename}'"
-        check_success, check_result = await execute_server_command(server_id, user_id, check_command)
+        # SIGTERM, ожидание и SIGKILL - одним скриптом в одной SSH сессии
+        result = await stop_bot(server_id, user_id, server_config, service_name)
         
-        if not check_success or not check_result.strip():
-            await safe_send_message(update, "✅ Бот уже остановлен")
+        if result['error']:
+            await safe_send_message(update, f"❌ Ошибка остановки: {result['error']}")
             return
         
-        # Пробуем остановить через systemd
-        systemd_command = f"systemctl stop {service_name}"
-        systemd_success, systemd_result = await execute_server_command(server_id, user_id, systemd_command)
-        
-        if systemd_success:
-            await safe_send_message(update, f"✅ Бот остановлен через systemd сервис: {service_name}")
+        if not result['was_running']:
+            await safe_send_message(update, "✅ Бот уже остановлен")
             return
         
-        # Если systemd не сработал, останавливаем процессы
-        pids = check_result.strip().split('\n')
-        stop_command = f"kill {' '.join(pids)}"
-        stop_success, stop_result = await execute_server_command(server_id, user_id, stop_command)
+        if result['ok']:
+            text = f"✅ Бот остановлен {METHOD_NAMES.get(result['method'], result['method'])}"
+            if result['stop_seconds'] is not None:
+                text += f"\n⏱ Остановлен за {result['stop_seconds']:.1f} с"
+            if result['pids']:
+                text += f"\nЗавершено процессов: {len(result['pids'])}"
+            await safe_send_message(update, text)
+            return
         
-        if stop_success:
-            # Проверяем остановились ли процессы
-            await asyncio.sleep(2)
-            check_success, check_result = await execute_server_command(server_id, user_id, check_command)
-            
-            if not check_success or not check_result.strip():
-                await safe_send_message(update, f"✅ Бот остановлен\nЗавершено процессов: {len(pids)}")
-            else:
-                # Принудительная остановка
-                force_command = f"kill -9 {' '.join(pids)}"
-                force_success, force_result = await execute_server_command(server_id, user_id, force_command)
-                
-                if force_success:
-                    await safe_send_message(update, "✅ Бот принудительно остановлен")
-                else:
-                    await safe_send_message(update, f"⚠️ Не удалось остановить все процессы: {check_result}")
+        if result['remaining']:
+            text = f"⚠️ Не удалось остановить все процессы: {', '.join(result['remaining'])}"
         else:
-            await safe_send_message(update, f"❌ Ошибка остановки: {stop_result}")
+            text = "⚠️ Не удалось остановить бота: сервис systemd остался активным"
+        for method, reason in result['failures']:
+            text += f"\n• {method}: {reason}"
+        await safe_send_message(update, text)
             
     except ValueError:
         await safe_send_message(update, "❌ ID сервера должен быть числом")
\ No newline at end of file
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Обработчики автоперезапуска бота
+"""
+
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes
+from database import get_server_config, get_user_servers, set_bot_watchdog
+from services.watchdog import bot_watchdog, WATCHDOG_CRASH_LOOP_RESTARTS, WATCHDOG_CRASH_LOOP_WINDOW
+from utils.helpers import safe_send_message
+
+def describe_watchdog(server_id: int) -> str:
+    """Состояние автоперезапуска одной строкой"""
+    status = bot_watchdog.status(server_id)
+    if status is None:
+        return "выключен"
+    if status['crash_loop_at']:
+        stopped = datetime.fromtimestamp(status['crash_loop_at']).strftime('%d.%m %H:%M')
+        return f"🛑 приостановлен с {stopped} (циклические падения)"
+    if status['held']:
+        return "⏸ бот остановлен вручную"
+    text = "✅ включен"
+    if status['restarts']:
+        text += f", перезапусков за {WATCHDOG_CRASH_LOOP_WINDOW // 60} мин.: {status['restarts']}"
+    if status['next_attempt_at']:
+        text += f", следующая попытка не раньше {datetime.fromtimestamp(status['next_attempt_at']).strftime('%H:%M:%S')}"
+    return text
+
+async def watchdog_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Автоперезапуск бота: /watchdog [<id_сервера> [on|off]]"""
+    user_id = update.effective_user.id
+    args = context.args or []
+    
+    if not args:
+        servers = await get_user_servers(user_id)
+        watched = [server for server in servers if bot_watchdog.status(server['id']) is not None]
+        if not watched:
+            from help import get_help_text
+            await safe_send_message(update, "🤷 Автоперезапуск не включен ни на одном сервере\n"
+                                            + get_help_text("watchdog"))
+            return
+        text = "🔁 Автоперезапуск бота:\n"
+        for server in watched:
+            text += f"\n{server['name']} (ID: {server['id']}): {describe_watchdog(server['id'])}"
+        await safe_send_message(update, text)
+        return
+    
+    try:
+        server_id = int(args[0])
+    except ValueError:
+        await safe_send_message(update, "❌ ID сервера должен быть числом")
+        return
+    
+    if not await get_server_config(server_id, user_id):
+        await safe_send_message(update, "❌ Сервер не найден")
+        return
+    
+    if len(args) < 2:
+        await safe_send_message(update, f"🔁 Автоперезапуск: {describe_watchdog(server_id)}")
+        return
+    
+    mode = args[1].lower()
+    if mode not in ('on', 'off'):
+        await safe_send_message(update, "❌ Режим должен быть on или off")
+        return
+    
+    success, message = await set_bot_watchdog(server_id, user_id, mode == 'on')
+    if success:
+        await bot_watchdog.reload()
+        if mode == 'on':
+            message += (f"\nБот будет перезапускаться при остановке; после {WATCHDOG_CRASH_LOOP_RESTARTS} "
+                        f"перезапусков за {WATCHDOG_CRASH_LOOP_WINDOW // 60} мин. перезапуски приостанавливаются")
+    await safe_send_message(update, message)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Обработчики для истории выполненных команд
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import ContextTypes
+import config
+from database import get_server_config, get_command_history
+from utils.helpers import safe_send_message
+
+HISTORY_PAGE_SIZE = getattr(config, 'HISTORY_PAGE_SIZE', 10)
+HISTORY_PREVIEW_CHARS = 150
+
+def parse_history_filter(args: List[str]) -> Tuple[Optional[bool], Optional[str]]:
+    """Разобрать фильтр: [ok|fail] [начало команды]"""
+    success = None
+    if args and args[0].lower() in ('ok', 'fail'):
+        success = args[0].lower() == 'ok'
+        args = args[1:]
+    prefix = ' '.join(args) or None
+    return success, prefix
+
+def format_history_page(server_config: Dict[str, Any], rows: List[Dict[str, Any]],
+                        success: Optional[bool], prefix: Optional[str]) -> str:
+    """Текст страницы истории"""
+    text = f"📜 История команд: {server_config['name']}\n"
+    if success is not None:
+        text += f"🔎 Статус: {'успешные' if success else 'с ошибкой'}\n"
+    if prefix:
+        text += f"🔎 Команда: {prefix}*\n"
+    
+    if not rows:
+        return text + "\n🤷 Записей нет"
+    
+    for row in rows:
+        icon = "✅" if row['success'] else "❌"
+        command = row['command'].splitlines()[0] if row['command'] else ''
+        if len(command) > 80:
+            command = command[:80] + "..."
+        preview = ' '.join(row['preview'].split())
+        if len(preview) > HISTORY_PREVIEW_CHARS:
+            preview = preview[:HISTORY_PREVIEW_CHARS] + "..."
+        
+        text += f"\n{icon} {row['executed_at']} UTC\n   $ {command}\n"
+        if preview:
+            text += f"   {preview}\n"
+    return text
+
+def history_keyboard(server_id: int, rows: List[Dict[str, Any]],
+                     has_newer: bool, has_older: bool) -> Optional[InlineKeyboardMarkup]:
+    """Кнопки листания: курсор - (id, executed_at) крайней записи страницы"""
+    buttons = []
+    if rows and has_newer:
+        first = rows[0]
+        buttons.append(InlineKeyboardButton(
+            "⬅️ Новее", callback_data=f"hist:{server_id}:n:{first['id']}:{first['executed_at']}"
+        ))
+    if rows and has_older:
+        last = rows[-1]
+        buttons.append(InlineKeyboardButton(
+            "Старее ➡️", callback_data=f"hist:{server_id}:o:{last['id']}:{last['executed_at']}"
+        ))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+async def history_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """История команд сервера"""
+    user_id = update.effective_user.id
+    
+    if not context.args:
+        from help import get_help_text
+        await safe_send_message(update, get_help_text("history"))
+        return
+    
+    try:
+        server_id = int(context.args[0])
+    except ValueError:
+        await safe_send_message(update, "❌ ID сервера должен быть числом")
+        return
+    
+    server_config = await get_server_config(server_id, user_id)
+    if not server_config:
+        await safe_send_message(update, "❌ Сервер не найден")
+        return
+    
+    success, prefix = parse_history_filter(context.args[1:])
+    # Фильтр запоминается для кнопок листания
+    context.user_data.setdefault('history_filters', {})[server_id] = (success, prefix)
+    
+    rows, has_older = await get_command_history(
+        server_id, success=success, command_prefix=prefix, limit=HISTORY_PAGE_SIZE
+    )
+    
+    await update.message.reply_text(
+        format_history_page(server_config, rows, success, prefix),
+        reply_markup=history_keyboard(server_id, rows, False, has_older)
+    )
+
+async def history_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание истории команд кнопками"""
+    query = update.callback_query
+    user_id = update.effective_user.id
+    await query.answer()
+    
+    try:
+        _, server_id, direction, row_id, executed_at = query.data.split(':', 4)
+        server_id = int(server_id)
+        row_id = int(row_id)
+    except ValueError:
+        return
+    
+    server_config = await get_server_config(server_id, user_id)
+    if not server_config:
+        await query.edit_message_text("❌ Сервер не найден")
+        return
+    
+    success, prefix = context.user_data.get('history_filters', {}).get(server_id, (None, None))
+    newer = direction == 'n'
+    
+    rows, has_more = await get_command_history(
+        server_id, cursor_position=(executed_at, row_id), newer=newer,
+        success=success, command_prefix=prefix, limit=HISTORY_PAGE_SIZE
+    )
+    
+    # Страница, от которой листали, существует в обратном направлении
+    has_newer, has_older = (has_more, True) if newer else (True, has_more)
+    
+    try:
+        await query.edit_message_text(
+            format_history_page(server_config, rows, success, prefix),
+            reply_markup=history_keyboard(server_id, rows, has_newer, has_older)
+        )
+    except Exception:
+        pass
@@ -222,7 +222,7 @@ async def add_server_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = server_data[user_id]
     
     # Добавляем сервер в базу
-    success, message = add_user_server(
+    success, message = await add_user_server(
         user_id=user_id,
         server_name=data['name'],
         hostname=data['hostname'],
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Обработчики для правил оповещений
+"""
+
+from datetime import datetime
+from telegram import Update
+from telegram.ext import ContextTypes
+from database import get_server_config, get_user_servers, get_alert_rules, add_alert_rule, delete_alert_rule
+from services.alerts import alert_engine, describe_rule, parse_threshold, ALERT_METRICS, ALERT_OPERATORS
+from utils.helpers import safe_send_message
+
+async def alerts_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Правила оповещений пользователя и сработавшие сейчас"""
+    user_id = update.effective_user.id
+    rules = await get_alert_rules(user_id)
+    
+    if not rules:
+        from help import get_help_text
+        await safe_send_message(update, "🤷 Правил оповещений нет\n" + get_help_text("alert_add"))
+        return
+    
+    names = {server['id']: server['name'] for server in await get_user_servers(user_id)}
+    text = "🔔 Правила оповещений:\n"
+    for rule in rules:
+        target = names.get(rule['server_id'], rule['server_id']) if rule['server_id'] else "все серверы"
+        text += f"\n#{rule['id']} [{target}] {describe_rule(rule)}"
+    
+    firing = alert_engine.firing(user_id)
+    if firing:
+        text += "\n\n🚨 Сработали:"
+        for rule, server_id, since in firing:
+            started = datetime.fromtimestamp(since).strftime('%d.%m %H:%M')
+            text += f"\n#{rule['id']} {names.get(server_id, server_id)} с {started}"
+    
+    await safe_send_message(update, text)
+
+async def alert_add_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Добавить правило: <id|all> <метрика> <оператор> <порог> [for N] [clear X]"""
+    user_id = update.effective_user.id
+    args = context.args or []
+    
+    if len(args) < 4:
+        from help import get_help_text
+        await safe_send_message(update, get_help_text("alert_add"))
+        return
+    
+    target, metric, op, threshold_text = args[:4]
+    
+    server_id = None
+    if target.lower() != 'all':
+        try:
+            server_id = int(target)
+        except ValueError:
+            await safe_send_message(update, "❌ ID сервера должен быть числом или all")
+            return
+        if not await get_server_config(server_id, user_id):
+            await safe_send_message(update, "❌ Сервер не найден")
+            return
+    
+    if metric not in ALERT_METRICS:
+        await safe_send_message(update, f"❌ Неизвестная метрика. Доступны: {', '.join(ALERT_METRICS)}")
+        return
+    if op not in ALERT_OPERATORS:
+        await safe_send_message(update, f"❌ Неизвестный оператор. Доступны: {' '.join(ALERT_OPERATORS)}")
+        return
+    
+    try:
+        threshold, per_core = parse_threshold(threshold_text)
+        options = dict(zip(args[4::2], args[5::2]))
+        for_checks = int(options.get('for', 1))
+        clear_threshold = float(options['clear']) if 'clear' in options else None
+    except ValueError:
+        await safe_send_message(update, "❌ Порог, for и clear должны быть числами (порог может быть cores*N)")
+        return
+    
+    if not 1 <= for_checks <= 100:
+        await safe_send_message(update, "❌ for - от 1 до 100 проверок")
+        return
+    
+    success, message, rule_id = await add_alert_rule(
+        user_id, server_id, metric, op, threshold, per_core, for_checks, clear_threshold
+    )
+    if success:
+        await alert_engine.reload_rules()
+        message += f": #{rule_id}"
+    await safe_send_message(update, message)
+
+async def alert_del_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Удалить правило оповещения"""
+    user_id = update.effective_user.id
+    
+    if not context.args:
+        await safe_send_message(update, "📝 Использование: /alert_del <id_правила>")
+        return
+    
+    try:
+        rule_id = int(context.args[0].lstrip('#'))
+    except ValueError:
+        await safe_send_message(update, "❌ ID правила должен быть числом")
+        return
+    
+    success, message = await delete_alert_rule(rule_id, user_id)
+    if success:
+        await alert_engine.reload_rules()
+    await safe_send_message(update, message)
@@ -6,6 +6,9 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from database import delete_user_server
+from services.health_monitor import health_monitor
+from services.metrics import metrics_store
+from services.watchdog import bot_watchdog
 from utils.helpers import safe_send_message
 
 async def delete_server_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -18,7 +21,11 @@ async def delete_server_handler(update: Update, context: ContextTypes.DEFAULT_TY
     
     try:
         server_id = int(context.args[0])
-        success, message = delete_user_server(server_id, user_id)
+        success, message = await delete_user_server(server_id, user_id)
+        if success:
+            health_monitor.forget(server_id)
+            metrics_store.forget(server_id)
+            await bot_watchdog.reload()
         await safe_send_message(update, message)
     except ValueError:
         await safe_send_message(update, "❌ ID сервера должен быть числом")
\ No newline at end of file
@@ -20,7 +20,7 @@ async def edit_server_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         server_id = int(context.args[0])
-        server_config = get_server_config(server_id, user_id)
+        server_config = await get_server_config(server_id, user_id)
         
         if not server_config:
             await safe_send_message(update, "❌ Сервер не найден")
@@ -123,7 +123,7 @@ async def edit_server_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
     
     db_field = field_mapping[field]
-    success, message = update_user_server(server_id, user_id, **{db_field: new_value})
+    success, message = await update_user_server(server_id, user_id, **{db_field: new_value})
     
     await safe_send_message(update, message)
     del edit_data[user_id]
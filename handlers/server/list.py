@@ -6,12 +6,24 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from database import get_user_servers
-from utils.helpers import safe_send_message
+from services.circuit_breaker import circuit_breaker, describe_unavailable
+from services.health_monitor import health_monitor, snapshot_age
+from services.probes import describe_bot_status
+from utils.helpers import safe_send_message, format_age
+
+def format_snapshot_line(snapshot) -> str:
+    """Краткое состояние сервера по снимку фонового мониторинга"""
+    if not snapshot:
+        return "❓ Состояние еще не проверялось"
+    age = format_age(snapshot_age(snapshot))
+    if not snapshot['ok']:
+        return f"🔴 Недоступен: {snapshot['error']} ({age})"
+    return f"🤖 {describe_bot_status(snapshot['results'])} ({age})"
 
 async def my_servers_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Список серверов пользователя"""
     user_id = update.effective_user.id
-    servers = get_user_servers(user_id)
+    servers = await get_user_servers(user_id)
     
     if not servers:
         await safe_send_message(update, 
@@ -26,6 +38,11 @@ async def my_servers_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         response += f"   🌐 {server['hostname']}:{server['port']}\n"
         response += f"   👤 {server['username']}\n"
         response += f"   📁 {server['directory']}\n"
-        response += f"   📄 {server['filename']}\n\n"
+        response += f"   📄 {server['filename']}\n"
+        breaker = circuit_breaker.state(server['id'])
+        if breaker:
+            response += f"   ⛔ {describe_unavailable(breaker)}\n\n"
+        else:
+            response += f"   {format_snapshot_line(health_monitor.get(server['id']))}\n\n"
     
     await safe_send_message(update, response)
\ No newline at end of file
@@ -14,10 +14,14 @@ HELP_TEXTS = {
 /add_server - Добавить сервер
 /my_servers - Мои серверы
 /server_status - Статус сервера
+/stats - Метрики сервера
+/alerts - Оповещения
 /start_bot - Запустить бота
 /stop_bot - Остановить бота
+/watchdog - Автоперезапуск бота
 /bot_logs - Логи бота
 /run_command - Выполнить команду
+/history - История команд
 /edit_server - Редактировать сервер
 /delete_server - Удалить сервер
 /help - Помощь
@@ -44,22 +48,78 @@ HELP_TEXTS = {
 
 Использование: /my_servers
 
-Команда покажет список всех ваших серверов с их ID, которые используются в других командах
+Команда покажет список всех ваших серверов с их ID, которые используются в других командах,
+и последнее состояние каждого сервера по фоновому мониторингу
 """,
 
 "server_status": """
 📊 Статус сервера
 
-Использование: /server_status <id_сервера>
+Использование: /server_status <id_сервера> [refresh]
+/server_status all - все серверы
+/server_status 1,2,3 - несколько серверов
 
 Параметры:
 • <id_сервера> - ID сервера из команды /my_servers
+• refresh - Опросить сервер сейчас, а не показывать последний снимок
+
+Серверы опрашиваются в фоне, команда отвечает сразу по последнему
+снимку и показывает его давность.
 
 Команда покажет:
 • Статус бота (работает/остановлен)
 • Время работы сервера (uptime)
 • Использование памяти (free)
 • Общую информацию о системе
+""",
+
+    "stats": """
+📈 История метрик сервера
+
+Использование: /stats <id_сервера> [окно]
+
+Параметры:
+• <id_сервера> - ID сервера из команды /my_servers
+• [окно] - Период: 30m, 6h, 7d и т.п. (по умолчанию 1h)
+
+Показывает минимум, среднее и максимум нагрузки, памяти и диска
+с текстовым графиком. Метрики собираются фоновым мониторингом;
+история хранится агрегатами по минутам, часам и дням
+""",
+
+    "alerts": """
+🔔 Оповещения
+
+/alerts - Список правил и сработавшие оповещения
+/alert_add - Добавить правило
+/alert_del <id_правила> - Удалить правило
+
+Правила проверяются при каждом фоновом опросе серверов.
+Уведомление приходит один раз при срабатывании и один раз при восстановлении
+""",
+
+    "alert_add": """
+🔔 Добавление правила оповещения
+
+Использование: /alert_add <id_сервера|all> <метрика> <оператор> <порог> [for N] [clear X]
+
+Метрики:
+• bot - бот запущен (1/0)
+• reachable - сервер доступен (1/0)
+• disk_free - свободно на диске, %
+• mem_free - свободно памяти, %
+• load1 - нагрузка за минуту (порог может быть cores*N)
+
+Операторы: < <= > >= == !=
+• for N - Срабатывание и сброс после N проверок подряд
+• clear X - Порог сброса (гистерезис), по умолчанию равен порогу
+
+Примеры:
+/alert_add all bot == 0 for 2
+/alert_add 1 disk_free < 10 clear 15
+/alert_add all load1 > cores*2 for 3
+
+Повторное срабатывание в течение 30 минут не уведомляется
 """,
 
     "start_bot": """
@@ -71,7 +131,9 @@ HELP_TEXTS = {
 • <id_сервера> - ID сервера из команды /my_servers
 • [service_name] - Имя systemd сервиса (по умолчанию: bot)
 
-Бот будет запущен через systemd сервис или напрямую через python
+Способы запуска пробуются по очереди: systemd сервис, screen, nohup, setsid.
+Все попытки и ожидание готовности выполняются одной SSH сессией,
+в ответе - способ запуска, PID и время до готовности
 """,
 
     "stop_bot": """
@@ -83,19 +145,51 @@ HELP_TEXTS = {
 • <id_сервера> - ID сервера из команды /my_servers
 • [service_name] - Имя systemd сервиса (по умолчанию: bot)
 
-Бот будет остановлен через systemd сервис или через kill процесса
+Бот будет остановлен через systemd сервис или сигналом SIGTERM.
+Если процессы не завершились за время ожидания, они завершаются
+принудительно (SIGKILL). В ответе - фактическое время остановки
+Остановленный вручную бот не перезапускается автоматически до /start_bot
+""",
+
+    "watchdog": """
+🔁 Автоперезапуск бота
+
+Использование: /watchdog <id_сервера> on|off
+/watchdog <id_сервера> - Состояние на сервере
+/watchdog - Серверы с автоперезапуском
+
+Бот проверяется каждые 10 секунд и при остановке запускается снова
+теми же способами, что и /start_bot. Повторные перезапуски выполняются
+с нарастающей паузой (5 с, 10 с, 20 с ... до 5 минут).
+После 5 перезапусков за 10 минут перезапуски приостанавливаются,
+в уведомлении - последние строки лога. Включите снова: /watchdog <id> on
 """,
 
     "bot_logs": """
 📋 Просмотр логов бота
 
 Использование: /bot_logs <id_сервера> [log_file]
+/bot_logs <id_сервера> follow [секунды] [log_file]
+/bot_logs <id_сервера> new [log_file]
+/bot_logs <id_сервера> grep <шаблон> [--since время] [--level ERROR] [-C строк] [-i] [--file log_file]
 
 Параметры:
 • <id_сервера> - ID сервера из команды /my_servers
 • [log_file] - Путь к файлу логов (по умолчанию: bot.log)
-
-Показывает последние 50 строк логов бота
+• follow [секунды] - Следить за новыми строками (по умолчанию 120 с)
+• new - Только строки, появившиеся с прошлого просмотра
+• grep <шаблон> - Поиск по регулярному выражению на сервере
+• --since - Записи не старше: 30m, 2h, 1d, 14:00 или 2024-05-01 14:00
+• --level - Уровень и все более важные (ERROR найдет ERROR и CRITICAL)
+• -C - Строк контекста вокруг совпадения (по умолчанию 2), -i - без учета регистра
+
+Показывает последние 50 строк логов бота.
+В режиме follow одно сообщение обновляется по мере появления строк,
+остановить можно командой /cancel
+В режиме new передаются только новые байты файла; ротация лога
+определяется автоматически
+В режиме grep фильтрация выполняется на сервере, передаются только
+найденные строки с номерами
 """,
 
     "run_command": """
@@ -112,7 +206,27 @@ HELP_TEXTS = {
 /run_command 2 "systemctl status bot"
 /run_command 3 "cd /home/bot && git pull"
 
-⚠️ Команды проверяются на безопасность
+⚠️ Команды проверяются на безопасность: каждая команда в цепочке
+(;, &&, ||, |) должна быть разрешена, подстановка $(...) и запись
+в файлы через > запрещены
+""",
+
+    "history": """
+📜 История выполненных команд
+
+Использование: /history <id_сервера> [ok|fail] [начало_команды]
+
+Параметры:
+• <id_сервера> - ID сервера из команды /my_servers
+• [ok|fail] - Только успешные или только с ошибкой
+• [начало_команды] - Только команды, начинающиеся с текста
+
+Примеры:
+/history 1
+/history 1 fail
+/history 1 ok systemctl
+
+Показывает по 10 записей с кратким выводом, листание кнопками
 """,
 
     "edit_server": """
@@ -150,10 +264,14 @@ HELP_TEXTS = {
 /add_server - Добавить SSH сервер
 /my_servers - Список серверов
 /server_status - Статус сервера
+/stats - Метрики сервера
+/alerts - Оповещения
 /start_bot - Запустить бота
 /stop_bot - Остановить бота
+/watchdog - Автоперезапуск бота
 /bot_logs - Показать логи бота
 /run_command - Выполнить команду
+/history - История команд
 /edit_server - Редактировать сервер
 /delete_server - Удалить сервер
 /help <команда> - Подробная справка по команде
@@ -203,10 +321,14 @@ def get_all_commands() -> List[str]:
         "/add_server - Добавить SSH сервер",
         "/my_servers - Список серверов",
         "/server_status - Статус сервера", 
+        "/stats - Метрики сервера",
+        "/alerts - Оповещения",
         "/start_bot - Запустить бота",
         "/stop_bot - Остановить бота",
+        "/watchdog - Автоперезапуск бота",
         "/bot_logs - Логи бота",
         "/run_command - Выполнить команду",
+        "/history - История команд",
         "/edit_server - Редактировать сервер",
         "/delete_server - Удалить сервер",
         "/help - Помощь"
@@ -7,7 +7,7 @@ import asyncio
 import fcntl
 import sys
 
-from telegram.ext import ApplicationBuilder, CommandHandler, ConversationHandler, MessageHandler, filters
+from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler, ConversationHandler, MessageHandler, filters
 
 # Импортируем конфигурацию
 try:
@@ -17,13 +17,23 @@ try:
         start_handler, my_servers_handler,
         server_status_handler, start_bot_handler, stop_bot_handler,
         bot_logs_handler, run_command_handler, delete_server_handler, help_handler,
+        history_handler, history_callback_handler, cancel_follow_handler, stats_handler,
+        alerts_handler, alert_add_handler, alert_del_handler, watchdog_handler,
         add_server_start, add_server_name, add_server_hostname, add_server_username,
         add_server_password, add_server_port, add_server_directory, add_server_filename, add_server_cancel,
         edit_server_start, edit_server_choose, edit_server_value, edit_server_cancel
     )
     # ИСПРАВЛЕНО: импорт состояний из states.py, а не storage.py
     from conversation.states import NAME, HOSTNAME, USERNAME, PASSWORD, PORT, DIRECTORY, FILENAME, EDIT_CHOOSE, EDIT_VALUE
-    from database import init_database
+    from database import init_database, close_database
+    from services.ssh_pool import ssh_pool
+    from services.circuit_breaker import circuit_breaker
+    from services.audit import audit_writer
+    from services.retention import retention_task
+    from services.health_monitor import health_monitor
+    from services.metrics import metrics_store
+    from services.alerts import alert_engine
+    from services.watchdog import bot_watchdog
 except ImportError as e:
     print(f"Ошибка импорта: {e}")
     sys.exit(1)
@@ -55,6 +65,8 @@ async def main():
     try:
         # Инициализация базы данных
         init_database()
+        audit_writer.start()
+        retention_task.start()
         
         application = ApplicationBuilder()\
             .token(BOT_TOKEN)\
@@ -93,10 +105,18 @@ async def main():
             CommandHandler("start", start_handler),
             CommandHandler("my_servers", my_servers_handler),
             CommandHandler("server_status", server_status_handler),
+            CommandHandler("stats", stats_handler),
+            CommandHandler("alerts", alerts_handler),
+            CommandHandler("alert_add", alert_add_handler),
+            CommandHandler("alert_del", alert_del_handler),
+            CommandHandler("watchdog", watchdog_handler),
             CommandHandler("start_bot", start_bot_handler),
             CommandHandler("stop_bot", stop_bot_handler),
             CommandHandler("bot_logs", bot_logs_handler),
+            CommandHandler("cancel", cancel_follow_handler),
             CommandHandler("run_command", run_command_handler),
+            CommandHandler("history", history_handler),
+            CallbackQueryHandler(history_callback_handler, pattern=r'^hist:'),
             CommandHandler("delete_server", delete_server_handler),
             CommandHandler("help", help_handler),
         ]
@@ -109,6 +129,15 @@ async def main():
         logger.info("Запуск SSH админ-бота...")
         await application.initialize()
         await application.start()
+        
+        # Фоновый мониторинг: снимки состояния питают метрики и оповещения
+        await alert_engine.start(application.bot)
+        health_monitor.add_listener(metrics_store.on_snapshot)
+        health_monitor.add_listener(alert_engine.on_snapshot)
+        health_monitor.add_listener(bot_watchdog.on_snapshot)
+        await bot_watchdog.start(application.bot)
+        await health_monitor.start()
+        
         await application.updater.start_polling(
             drop_pending_updates=True,
             timeout=30,
@@ -125,10 +154,18 @@ async def main():
         raise
     finally:
         logger.info("Завершение работы админ-бота...")
+        await bot_watchdog.stop()
+        await health_monitor.stop()
         if 'application' in locals():
             await application.updater.stop()
             await application.stop()
             await application.shutdown()
+        await metrics_store.flush()
+        await retention_task.stop()
+        await circuit_breaker.stop()
+        await ssh_pool.close_all()
+        await audit_writer.stop()
+        close_database()
         try:
             fcntl.flock(lock_file, fcntl.LOCK_UN)
             lock_file.close()
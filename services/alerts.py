@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Оповещения по правилам: проверка каждого нового снимка состояния сервера
+"""
+
+import logging
+import operator
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+from database import get_alert_rules, load_alert_states, save_alert_state
+from utils.outbound import outbound
+
+# Повторное срабатывание того же правила на том же сервере в течение окна не уведомляется
+ALERT_DEDUP_SECONDS = getattr(config, 'ALERT_DEDUP_SECONDS', 1800)
+
+logger = logging.getLogger(__name__)
+
+def _bot_running(snapshot: Dict[str, Any]) -> Optional[float]:
+    probe = snapshot['results'].get('bot_pids', {})
+    return float(bool(probe['value']['pids'])) if probe.get('ok') else None
+
+def _disk_free(snapshot: Dict[str, Any]) -> Optional[float]:
+    probe = snapshot['results'].get('statvfs', {})
+    if not probe.get('ok'):
+        return None
+    value = probe['value']
+    capacity = value['total'] - value['free'] + value['available']
+    return 100.0 * value['available'] / capacity if capacity else None
+
+def _mem_free(snapshot: Dict[str, Any]) -> Optional[float]:
+    probe = snapshot['results'].get('meminfo', {})
+    if not probe.get('ok') or not probe['value']['total']:
+        return None
+    return 100.0 * probe['value']['available'] / probe['value']['total']
+
+def _load1(snapshot: Dict[str, Any]) -> Optional[float]:
+    probe = snapshot['results'].get('loadavg', {})
+    return probe['value']['load1'] if probe.get('ok') else None
+
+# Метрики правил: имя -> (описание, единица, функция снимка)
+ALERT_METRICS: Dict[str, Tuple[str, str, Callable[[Dict[str, Any]], Optional[float]]]] = {
+    'reachable': ('сервер доступен', '', lambda snapshot: float(snapshot['ok'])),
+    'bot': ('бот запущен', '', _bot_running),
+    'disk_free': ('свободно на диске', '%', _disk_free),
+    'mem_free': ('свободно памяти', '%', _mem_free),
+    'load1': ('нагрузка', '', _load1)
+}
+
+ALERT_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+def parse_threshold(text: str) -> Tuple[float, bool]:
+    """Порог: число или число ядер с множителем (cores*2, 2*cores, cores)"""
+    text = text.lower().replace(' ', '')
+    match = re.fullmatch(r'cores(?:\*([\d.]+))?|([\d.]+)\*cores', text)
+    if match:
+        return float(match.group(1) or match.group(2) or 1), True
+    return float(text), False
+
+def describe_rule(rule: Dict[str, Any]) -> str:
+    """Текст правила: 'disk_free < 10% 2 проверки'"""
+    unit = ALERT_METRICS.get(rule['metric'], ('', '', None))[1]
+    threshold = f"cores*{rule['threshold']:g}" if rule['per_core'] else f"{rule['threshold']:g}{unit}"
+    text = f"{rule['metric']} {rule['operator']} {threshold}"
+    if rule['for_checks'] > 1:
+        text += f", {rule['for_checks']} проверки подряд"
+    if rule['clear_threshold'] is not None:
+        text += f", сброс при {rule['clear_threshold']:g}{unit}"
+    return text
+
+class AlertEngine:
+    """
+    Проверка правил по мере поступления снимков
+
+    Для каждой пары (правило, сервер) хранится только счетчик подряд идущих
+    проверок и текущее состояние - история снимков не перечитывается.
+    """
+    
+    def __init__(self, dedup_seconds: float = ALERT_DEDUP_SECONDS):
+        self.dedup_seconds = dedup_seconds
+        self.bot = None
+        self._rules_by_user: Dict[int, List[Dict[str, Any]]] = {}
+        self._states: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self.notifications = 0
+        self.suppressed = 0
+    
+    async def start(self, bot) -> None:
+        """Загрузить правила и сохраненные состояния; bot - для отправки уведомлений"""
+        self.bot = bot
+        await self.reload_rules()
+        for rule_id, server_id, firing, changed_at, notified_at in await load_alert_states():
+            self._states[(rule_id, server_id)] = {
+                'firing': bool(firing), 'count': 0, 'changed_at': changed_at,
+                'notified_at': notified_at, 'notified': bool(firing)
+            }
+    
+    async def reload_rules(self) -> None:
+        """Перечитать правила (после добавления или удаления)"""
+        rules_by_user: Dict[int, List[Dict[str, Any]]] = {}
+        for rule in await get_alert_rules():
+            rules_by_user.setdefault(rule['user_id'], []).append(rule)
+        self._rules_by_user = rules_by_user
+        
+        rule_ids = {rule['id'] for rules in rules_by_user.values() for rule in rules}
+        for key in [key for key in self._states if key[0] not in rule_ids]:
+            del self._states[key]
+    
+    def firing(self, user_id: int) -> List[Tuple[Dict[str, Any], int, float]]:
+        """Сработавшие сейчас оповещения пользователя: (правило, server_id, с какого времени)"""
+        active = []
+        for rule in self._rules_by_user.get(user_id, []):
+            for (rule_id, server_id), state in self._states.items():
+                if rule_id == rule['id'] and state['firing']:
+                    active.append((rule, server_id, state['changed_at']))
+        return active
+    
+    async def on_snapshot(self, server: Dict[str, Any], snapshot: Dict[str, Any],
+                          previous: Optional[Dict[str, Any]]) -> None:
+        """Подписчик монитора состояния: проверить правила владельца сервера"""
+        user_id = server.get('user_id')
+        for rule in self._rules_by_user.get(user_id, []):
+            if rule['server_id'] is not None and rule['server_id'] != server['id']:
+                continue
+            await self._evaluate(rule, server, snapshot)
+    
+    async def _evaluate(self, rule: Dict[str, Any], server: Dict[str, Any], snapshot: Dict[str, Any]) -> None:
+        metric = ALERT_METRICS.get(rule['metric'])
+        if not metric:
+            return
+        value = metric[2](snapshot)
+        if value is None:
+            # Нет данных (сервер недоступен) - состояние правила не меняется
+            return
+        
+        threshold = rule['threshold']
+        clear_threshold = rule['clear_threshold'] if rule['clear_threshold'] is not None else threshold
+        if rule['per_core']:
+            cores = snapshot['results'].get('cpu_count', {})
+            if not cores.get('ok'):
+                return
+            threshold *= cores['value']['cores']
+            clear_threshold *= cores['value']['cores']
+        
+        compare = ALERT_OPERATORS[rule['operator']]
+        key = (rule['id'], server['id'])
+        state = self._states.setdefault(key, {
+            'firing': False, 'count': 0, 'changed_at': snapshot['checked_at'],
+            'notified_at': None, 'notified': False
+        })
+        
+        # Гистерезис: срабатывание по порогу, сброс - по порогу сброса, оба после for_checks проверок подряд
+        if state['firing']:
+            matched = not compare(value, clear_threshold)
+        else:
+            matched = compare(value, threshold)
+        state['count'] = state['count'] + 1 if matched else 0
+        if state['count'] < rule['for_checks']:
+            return
+        
+        state['firing'] = not state['firing']
+        state['count'] = 0
+        state['changed_at'] = snapshot['checked_at']
+        await self._notify(rule, server, state, value, threshold)
+        try:
+            await save_alert_state(rule['id'], server['id'], state['firing'],
+                                   state['changed_at'], state['notified_at'])
+        except Exception as e:
+            logger.error(f"Не удалось сохранить состояние оповещения {rule['id']}: {e}")
+    
+    async def _notify(self, rule: Dict[str, Any], server: Dict[str, Any], state: Dict[str, Any],
+                      value: float, threshold: float) -> None:
+        now = time.time()
+        if state['firing']:
+            if state['notified_at'] and now - state['notified_at'] < self.dedup_seconds:
+                # Повтор в окне дедупликации: не уведомляем ни о срабатывании, ни о сбросе
+                state['notified'] = False
+                self.suppressed += 1
+                return
+            state['notified'] = True
+            state['notified_at'] = now
+        elif not state['notified']:
+            self.suppressed += 1
+            return
+        
+        title, unit, _ = ALERT_METRICS[rule['metric']]
+        if state['firing']:
+            text = (f"🚨 {server['name']} (ID: {server['id']}): {title} = {value:g}{unit}\n"
+                    f"Правило #{rule['id']}: {describe_rule(rule)} (порог {threshold:g}{unit})")
+        else:
+            text = (f"✅ {server['name']} (ID: {server['id']}): восстановлено, {title} = {value:g}{unit}\n"
+                    f"Правило #{rule['id']}: {describe_rule(rule)}")
+        
+        if not self.bot:
+            logger.warning(f"Оповещение не отправлено (бот не подключен): {text}")
+            return
+        self.notifications += 1
+        await outbound.send_to_chat(self.bot, server['user_id'], text)
+
+alert_engine = AlertEngine()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Фоновая пакетная запись журнала выполненных команд
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+AUDIT_QUEUE_SIZE = getattr(config, 'AUDIT_QUEUE_SIZE', 10000)
+AUDIT_BATCH_SIZE = getattr(config, 'AUDIT_BATCH_SIZE', 200)
+AUDIT_FLUSH_INTERVAL_MS = getattr(config, 'AUDIT_FLUSH_INTERVAL_MS', 500)
+AUDIT_ENQUEUE_TIMEOUT = getattr(config, 'AUDIT_ENQUEUE_TIMEOUT', 1.0)
+
+logger = logging.getLogger(__name__)
+
+AuditRow = Tuple[int, str, str, bool, str]
+
+class AuditWriter:
+    """Очередь записей server_commands, сбрасываемая в базу пакетами"""
+    
+    def __init__(self, queue_size: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval: float = AUDIT_FLUSH_INTERVAL_MS / 1000):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.dropped = 0
+        self.backpressure = 0
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self) -> None:
+        """Запустить фоновую запись"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+    
+    async def record(self, server_id: int, command: str, result: str, success: bool) -> None:
+        """Поставить запись в очередь"""
+        executed_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        row = (server_id, command, result, success, executed_at)
+        
+        if not self.running:
+            # Запись до запуска или после остановки - пишем сразу
+            await self._flush([row])
+            return
+        
+        try:
+            self._queue.put_nowait(row)
+            return
+        except asyncio.QueueFull:
+            self.backpressure += 1
+            if self.backpressure == 1 or self.backpressure % 100 == 0:
+                logger.warning(f"Очередь журнала команд заполнена ({self.queue_size}), "
+                               f"ожидание записи: {self.backpressure}")
+        
+        try:
+            await asyncio.wait_for(self._queue.put(row), AUDIT_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            logger.error(f"Запись журнала команд отброшена (сервер {server_id}), всего отброшено: {self.dropped}")
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._queue.get()
+            if row is None:
+                return
+            
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+            
+            await self._flush(batch)
+            if stop:
+                return
+    
+    async def _flush(self, batch: List[AuditRow]) -> None:
+        from database import log_server_commands
+        try:
+            await log_server_commands(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Ошибка записи журнала команд ({len(batch)} записей): {e}")
+    
+    async def stop(self) -> None:
+        """Записать оставшиеся записи и остановить фоновую запись"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        
+        # Записи, добавленные после метки остановки
+        pending = []
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not None:
+                pending.append(row)
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size])
+    
+    def stats(self) -> Dict[str, int]:
+        """Счетчики журнала"""
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'written': self.written,
+            'batches': self.batches,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'backpressure': self.backpressure
+        }
+
+audit_writer = AuditWriter()
@@ -3,30 +3,16 @@
 Модуль для проверки статуса бота
 """
 
-import asyncio
-from services.ssh_client import execute_server_command
+from typing import Optional
+from services.probes import run_probe_bundle, bot_probes, describe_bot_status
 
-async def check_bot_status(server_id: int, user_id: int, bot_filename: str) -> str:
+async def check_bot_status(server_id: int, user_id: int, bot_filename: str,
+                           service_name: Optional[str] = None) -> str:
     """Проверка статуса бота на сервере"""
     try:
-        # Команда для проверки процессов бота
-        check_command = f"pgrep -f 'python3.*{bot_filename}'"
-        success, result = await execute_server_command(server_id, user_id, check_command)
-        
-        if success and result.strip():
-            pids = result.strip().split('\n')
-            pid_count = len(pids)
-            
-            # Дополнительная проверка через systemctl если возможно
-            service_check = f"systemctl is-active bot 2>/dev/null || echo 'inactive'"
-            service_success, service_result = await execute_server_command(server_id, user_id, service_check)
-            
-            if service_success and 'active' in service_result:
-                return f"✅ Запущен (systemd, {pid_count} процессов)"
-            else:
-                return f"✅ Запущен ({pid_count} процессов)"
-        else:
-            return "❌ Остановлен"
+        # pgrep и systemctl выполняются одним SSH вызовом
+        results = await run_probe_bundle(server_id, user_id, bot_probes(bot_filename, service_name))
+        return describe_bot_status(results)
             
     except Exception:
         return "❓ Неизвестно (ошибка проверки)"
\ No newline at end of file
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Запуск и остановка бота одним скриптом на сервере
+"""
+
+import shlex
+from typing import Any, Dict, List, Optional
+
+import config
+from services.probes import bot_process_pattern
+from services.scheduler import PRIORITY_INTERACTIVE
+from services.ssh_client import execute_server_command
+
+BOT_START_TIMEOUT = getattr(config, 'BOT_START_TIMEOUT', 25)
+BOT_START_READY_TIMEOUT = getattr(config, 'BOT_START_READY_TIMEOUT', 8)
+# Процесс должен прожить столько после появления, чтобы считаться запущенным
+BOT_START_SETTLE_SECONDS = getattr(config, 'BOT_START_SETTLE_SECONDS', 1.0)
+BOT_START_LOG_LINES = 20
+# Сколько ждать завершения после SIGTERM, прежде чем отправить SIGKILL
+BOT_STOP_GRACE_SECONDS = getattr(config, 'BOT_STOP_GRACE_SECONDS', 10)
+BOT_STOP_KILL_WAIT_SECONDS = 3
+# Таймаут SSH сессии остановки: ожидание скрипта плюс запас на проверки и подключение
+BOT_STOP_TIMEOUT = BOT_STOP_GRACE_SECONDS + BOT_STOP_KILL_WAIT_SECONDS + 10
+# Повторять systemctl через sudo -n при отказе в правах (по умолчанию выключено)
+BOT_CONTROL_SUDO = getattr(config, 'BOT_CONTROL_SUDO', False)
+
+MARKER = '@@'
+
+# Способы запуска в порядке попыток
+START_METHODS = ('systemd', 'screen', 'nohup', 'setsid')
+
+def _script_prelude(bot_filename: str, service_name: Optional[str], sudo: bool = BOT_CONTROL_SUDO) -> List[str]:
+    """Общие переменные и функции скриптов запуска и остановки"""
+    return [
+        f"file={shlex.quote(bot_filename)}",
+        f"svc={shlex.quote(service_name or '')}",
+        f"pattern={shlex.quote(bot_process_pattern(bot_filename))}",
+        "now_ms() { echo $(( $(date +%s%N) / 1000000 )); }",
+        # Только процессы python: командную строку screen и самого скрипта не считаем
+        "pids() { for p in $(pgrep -f \"$pattern\"); do "
+        "case $(cat /proc/$p/comm 2>/dev/null) in python*) printf '%s ' \"$p\";; esac; done; }",
+        "sleep_ms() { sleep $(( $1 / 1000 )).$(printf '%03d' $(( $1 % 1000 ))); }",
+        "unit_exists() { [ -n \"$svc\" ] && systemctl cat \"$svc.service\" >/dev/null 2>&1; }",
+        ("sysctl() { systemctl \"$@\" 2>&1 || sudo -n systemctl \"$@\" 2>&1; }" if sudo
+         else "sysctl() { systemctl \"$@\" 2>&1; }"),
+        f"emit() {{ echo \"{MARKER}$*\"; }}",
+        "t0=$(now_ms)",
+    ]
+
+def build_start_script(bot_filename: str, service_name: Optional[str], log_file: str,
+                       budget: float = BOT_START_TIMEOUT, ready_timeout: float = BOT_START_READY_TIMEOUT,
+                       settle: float = BOT_START_SETTLE_SECONDS) -> str:
+    """
+    Скрипт запуска: способы пробуются по очереди в одной сессии
+
+    Готовность проверяется опросом с экспоненциальной паузой (50 мс .. 1 с);
+    упавший юнит systemd или завершившийся процесс прекращают ожидание сразу.
+    """
+    lines = _script_prelude(bot_filename, service_name) + [
+        f"log={shlex.quote(log_file)}",
+        f"deadline=$(( t0 + {int(budget * 1000)} ))",
+        "running=$(pids)",
+        "if [ -n \"$running\" ]; then emit already $running; exit 0; fi",
+        "wait_ready() {",
+        f"  until=$(( $(now_ms) + {int(ready_timeout * 1000)} ))",
+        "  [ $until -gt $deadline ] && until=$deadline",
+        "  delay=50",
+        "  while [ $(now_ms) -lt $until ]; do",
+        "    if [ -n \"$(pids)\" ]; then",
+        "      ready=$(now_ms)",
+        f"      sleep_ms {int(settle * 1000)}",
+        "      found=$(pids)",
+        "      [ -n \"$found\" ] && return 0",
+        "    fi",
+        "    if [ \"$1\" = systemd ] && systemctl is-failed --quiet \"$svc\" 2>/dev/null; then return 1; fi",
+        # Запущенный скриптом процесс уже завершился - ждать дальше нечего
+        "    if [ -n \"$launched\" ] && ! kill -0 $launched 2>/dev/null; then return 1; fi",
+        "    sleep_ms $delay",
+        "    delay=$(( delay * 2 )); [ $delay -gt 1000 ] && delay=1000",
+        "  done",
+        "  return 1",
+        "}",
+        "attempt() {",
+        "  method=$1; launched=",
+        "  case $method in",
+        "    systemd) unit_exists || { emit skip systemd no unit; return 1; }",
+        "             out=$(sysctl start \"$svc\") || { emit fail systemd $out; return 1; } ;;",
+        "    screen) command -v screen >/dev/null || { emit skip screen not installed; return 1; }",
+        "            screen -dmS \"bot_$file\" python3 \"$file\" ;;",
+        "    nohup) nohup python3 \"$file\" >> \"$log\" 2>&1 < /dev/null & launched=$! ;;",
+        "    setsid) setsid python3 \"$file\" >> \"$log\" 2>&1 < /dev/null & launched=$! ;;",
+        "  esac",
+        "  if wait_ready $method; then emit started $method $(( ready - t0 )) $found; exit 0; fi",
+        "  emit fail $method not running",
+        "  return 1",
+        "}",
+    ]
+    for method in START_METHODS:
+        lines.append(f"[ $(now_ms) -lt $deadline ] && attempt {method}")
+    lines += [
+        "emit log",
+        f"tail -n {BOT_START_LOG_LINES} \"$log\" 2>/dev/null",
+        "exit 0",
+    ]
+    return '\n'.join(lines)
+
+def build_stop_script(bot_filename: str, service_name: Optional[str],
+                      grace: float = BOT_STOP_GRACE_SECONDS,
+                      kill_wait: float = BOT_STOP_KILL_WAIT_SECONDS,
+                      sudo: bool = BOT_CONTROL_SUDO) -> str:
+    """
+    Скрипт остановки: systemd stop или SIGTERM, ожидание, затем SIGKILL
+
+    Исчезновение процессов проверяется опросом с экспоненциальной паузой
+    (20 мс .. 500 мс), поэтому быстро завершающийся бот не ждет лишнего.
+    systemctl stop ставится в очередь без ожидания (--no-block): время остановки
+    ограничено grace и kill_wait, а не TimeoutStopSec юнита.
+    """
+    kill = "out=$(kill -$1 $2 2>&1)"
+    if sudo:
+        kill += " || out=$(sudo -n kill -$1 $2 2>&1)"
+    return '\n'.join(_script_prelude(bot_filename, service_name, sudo) + [
+        "active() { unit_exists && systemctl is-active --quiet \"$svc\"; }",
+        f"signal() {{ {kill} || emit fail $1 $out; }}",
+        "wait_gone() {",
+        "  until=$(( $(now_ms) + $1 ))",
+        "  delay=20",
+        "  while [ -n \"$(pids)\" ]; do",
+        "    [ $(now_ms) -ge $until ] && return 1",
+        "    sleep_ms $delay",
+        "    delay=$(( delay * 2 )); [ $delay -gt 500 ] && delay=500",
+        "  done",
+        "  return 0",
+        "}",
+        "running=$(pids)",
+        "if [ -z \"$running\" ] && ! active; then emit notrunning; exit 0; fi",
+        "method=",
+        "if active; then",
+        "  if out=$(sysctl stop --no-block \"$svc\"); then method=systemd; else emit fail systemd $out; fi",
+        "fi",
+        "if [ -n \"$(pids)\" ]; then",
+        # После systemctl stop SIGTERM уже отправлен самим systemd
+        "  if [ \"$method\" != systemd ]; then method=sigterm; signal TERM \"$(pids)\"; fi",
+        f"  if ! wait_gone {int(grace * 1000)}; then",
+        "    method=sigkill",
+        "    signal KILL \"$(pids)\"",
+        f"    wait_gone {int(kill_wait * 1000)}",
+        "  fi",
+        "fi",
+        "left=$(pids)",
+        "if [ -n \"$left\" ]; then emit alive $left; exit 0; fi",
+        # Юнит активен, а systemctl stop отказал - бот не остановлен
+        "if [ -z \"$method\" ]; then emit alive; exit 0; fi",
+        "emit stopped $method $(( $(now_ms) - t0 )) $running",
+    ])
+
+def _event_seconds(event: List[str], index: int) -> Optional[float]:
+    """Поле маркера в миллисекундах как секунды; None, если поля нет или оно не число"""
+    try:
+        return int(event[index]) / 1000
+    except (IndexError, ValueError):
+        return None
+
+def parse_control_output(output: str) -> Dict[str, Any]:
+    """Разобрать маркеры скрипта: события по порядку и хвост лога после маркера log"""
+    events = []
+    log_lines = []
+    in_log = False
+    for line in output.splitlines():
+        if in_log:
+            log_lines.append(line)
+        elif line.startswith(MARKER):
+            fields = line[len(MARKER):].split()
+            if fields == ['log']:
+                in_log = True
+            elif fields:
+                events.append(fields)
+    return {'events': events, 'log_tail': '\n'.join(log_lines)}
+
+async def start_bot(server_id: int, user_id: int, server_config: Dict[str, Any],
+                    service_name: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE,
+                    admission: bool = True) -> Dict[str, Any]:
+    """
+    Запустить бота первым сработавшим способом (systemd, screen, nohup, setsid)
+
+    priority и admission передаются в execute_server_command (автоперезапуск - фоновый,
+    без допуска по частоте команд пользователя). error - скрипт не выполнился.
+
+    Returns:
+        Dict: ok, error, already_running, method, pids, ready_seconds (время до готовности),
+        attempts (неудачные способы с причиной), log_tail
+    """
+    bot_filename = server_config.get('bot_filename') or 'bot.py'
+    service_name = server_config.get('service_name') or service_name
+    log_file = bot_filename.replace('.py', '.log')
+    
+    script = build_start_script(bot_filename, service_name, log_file)
+    success, output = await execute_server_command(server_id, user_id, script, trusted=True,
+                                                   timeout=BOT_START_TIMEOUT + 10, priority=priority,
+                                                   admission=admission)
+    if not success:
+        return {'ok': False, 'error': output}
+    
+    parsed = parse_control_output(output)
+    result = {'ok': False, 'error': None, 'already_running': False, 'method': None, 'pids': [],
+              'ready_seconds': None, 'attempts': [], 'log_tail': parsed['log_tail']}
+    
+    for event in parsed['events']:
+        kind = event[0]
+        if kind == 'already':
+            result.update(ok=True, already_running=True, pids=event[1:])
+        elif kind == 'started':
+            result.update(ok=True, method=event[1], ready_seconds=int(event[2]) / 1000, pids=event[3:])
+        elif kind in ('fail', 'skip') and len(event) > 1:
+            result['attempts'].append((event[1], ' '.join(event[2:])))
+    
+    return result
+
+
+async def stop_bot(server_id: int, user_id: int, server_config: Dict[str, Any],
+                   service_name: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE,
+                   admission: bool = True) -> Dict[str, Any]:
+    """
+    Остановить бота: systemd stop или SIGTERM с ожиданием до BOT_STOP_GRACE_SECONDS, затем SIGKILL
+
+    Returns:
+        Dict: ok, error, was_running, method (systemd, sigterm, sigkill), pids (остановленные),
+        stop_seconds (фактическое время остановки), remaining (не остановленные PID), failures
+    """
+    bot_filename = server_config.get('bot_filename') or 'bot.py'
+    service_name = server_config.get('service_name') or service_name
+    
+    script = build_stop_script(bot_filename, service_name)
+    success, output = await execute_server_command(server_id, user_id, script, trusted=True,
+                                                   timeout=BOT_STOP_TIMEOUT, priority=priority,
+                                                   admission=admission)
+    if not success:
+        return {'ok': False, 'error': output}
+    
+    result = {'ok': False, 'error': None, 'was_running': True, 'method': None, 'pids': [],
+              'stop_seconds': None, 'remaining': [], 'failures': []}
+    
+    for event in parse_control_output(output)['events']:
+        kind = event[0]
+        if kind == 'notrunning':
+            result.update(ok=True, was_running=False)
+        elif kind == 'stopped' and len(event) > 1:
+            result.update(ok=True, method=event[1], stop_seconds=_event_seconds(event, 2), pids=event[3:])
+        elif kind == 'alive':
+            result['remaining'] = event[1:]
+        elif kind == 'fail' and len(event) > 1:
+            result['failures'].append((event[1], ' '.join(event[2:])))
+    
+    return result
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Размыкатель для недоступных серверов: быстрый отказ вместо ожидания таймаута подключения
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import config
+
+# Столько неудачных подключений подряд размыкают цепь
+BREAKER_FAILURE_THRESHOLD = getattr(config, 'BREAKER_FAILURE_THRESHOLD', 3)
+# Пауза до пробного подключения: удваивается после каждой неудачной пробы
+BREAKER_BASE_DELAY = getattr(config, 'BREAKER_BASE_DELAY', 15)
+BREAKER_MAX_DELAY = getattr(config, 'BREAKER_MAX_DELAY', 600)
+
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half_open'
+
+logger = logging.getLogger(__name__)
+
+Probe = Callable[[], Awaitable[Any]]
+
+class ServerUnavailable(Exception):
+    """Сервер недоступен, подключение не выполняется до пробы"""
+
+class CircuitBreaker:
+    """
+    Состояние доступности серверов
+
+    После threshold неудачных подключений подряд цепь размыкается: подключения
+    отклоняются сразу. Фоновая проба после паузы (полуоткрытое состояние)
+    замыкает цепь при успехе или удваивает паузу при неудаче.
+    """
+    
+    def __init__(self, threshold: int = BREAKER_FAILURE_THRESHOLD, base_delay: float = BREAKER_BASE_DELAY,
+                 max_delay: float = BREAKER_MAX_DELAY):
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._states: Dict[int, Dict[str, Any]] = {}
+        self._probes: Dict[int, asyncio.Task] = {}
+        self.rejected = 0
+    
+    def check(self, server_id: int) -> None:
+        """Разрешить подключение или выбросить ServerUnavailable"""
+        state = self._states.get(server_id)
+        if state and state['state'] != BREAKER_CLOSED:
+            self.rejected += 1
+            raise ServerUnavailable(describe_unavailable(state))
+    
+    def record_success(self, server_id: int) -> None:
+        state = self._states.pop(server_id, None)
+        if state and state['state'] != BREAKER_CLOSED:
+            logger.info(f"Сервер {server_id} снова доступен")
+    
+    def record_failure(self, server_id: int, error: Exception, probe: Probe) -> None:
+        """Учесть неудачное подключение; probe - пробное подключение для полуоткрытого состояния"""
+        state = self._states.setdefault(server_id, {
+            'state': BREAKER_CLOSED, 'failures': 0, 'since': time.time(), 'error': '', 'retry_at': None,
+            'delay': self.base_delay
+        })
+        state['failures'] += 1
+        state['error'] = str(error) or type(error).__name__
+        if state['state'] == BREAKER_CLOSED and state['failures'] >= self.threshold:
+            state['state'] = BREAKER_OPEN
+            state['retry_at'] = time.time() + state['delay']
+            logger.warning(f"Сервер {server_id} недоступен ({state['error']}), "
+                           f"подключения приостановлены на {state['delay']:.0f} с")
+            if server_id not in self._probes:
+                self._probes[server_id] = asyncio.create_task(self._probe_loop(server_id, probe))
+    
+    async def _probe_loop(self, server_id: int, probe: Probe) -> None:
+        try:
+            while True:
+                state = self._states.get(server_id)
+                if not state or state['state'] == BREAKER_CLOSED:
+                    return
+                await asyncio.sleep(max(0.0, state['retry_at'] - time.time()))
+                if self._states.get(server_id) is not state:
+                    return
+                
+                state['state'] = BREAKER_HALF_OPEN
+                try:
+                    await probe()
+                except Exception as e:
+                    state['state'] = BREAKER_OPEN
+                    state['error'] = str(e) or type(e).__name__
+                    state['delay'] = min(self.max_delay, state['delay'] * 2)
+                    state['retry_at'] = time.time() + state['delay']
+                    continue
+                self.record_success(server_id)
+                return
+        finally:
+            self._probes.pop(server_id, None)
+    
+    def state(self, server_id: int) -> Optional[Dict[str, Any]]:
+        """Состояние разомкнутой цепи сервера или None, если сервер доступен"""
+        state = self._states.get(server_id)
+        if not state or state['state'] == BREAKER_CLOSED:
+            return None
+        return dict(state)
+    
+    def reset(self, server_id: int) -> None:
+        """Забыть состояние (изменены параметры подключения или сервер удален)"""
+        self._states.pop(server_id, None)
+        task = self._probes.pop(server_id, None)
+        if task:
+            task.cancel()
+    
+    async def stop(self) -> None:
+        tasks = list(self._probes.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def describe_unavailable(state: Dict[str, Any]) -> str:
+    """Текст отказа: с какого времени недоступен и когда следующая проверка"""
+    since = datetime.fromtimestamp(state['since']).strftime('%H:%M')
+    if state['state'] == BREAKER_HALF_OPEN:
+        return f"Сервер недоступен с {since} ({state['error']}), идет проверка подключения"
+    retry = max(0, int(state['retry_at'] - time.time()))
+    return f"Сервер недоступен с {since} ({state['error']}), следующая проверка через {retry} с"
+
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Объединение одинаковых команд и кэш результатов команд только для чтения
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import config
+from services.command_policy import command_segments
+from utils.cache import LRUCache
+
+COMMAND_CACHE_SIZE = getattr(config, 'COMMAND_CACHE_SIZE', 1024)
+# Время жизни результата по классу команды, секунды (0 - только объединение одновременных вызовов)
+COMMAND_CACHE_TTLS = getattr(config, 'COMMAND_CACHE_TTLS', {
+    'pgrep': 5, 'ps': 5, 'uptime': 10, 'free': 10, 'cat': 5, 'tail': 2, 'head': 5,
+    'grep': 5, 'ls': 5, 'stat': 10, 'df': 60, 'nproc': 3600, 'whoami': 300, 'pwd': 300,
+    'journalctl': 5, 'systemctl': 5, 'date': 0, 'echo': 0
+})
+# Подкоманды systemctl, которые ничего не меняют
+SYSTEMCTL_READ_ONLY = frozenset({
+    'status', 'is-active', 'is-enabled', 'is-failed', 'show', 'cat',
+    'list-units', 'list-unit-files', 'list-timers'
+})
+# Не влияют на результат, но и не кэшируются сами по себе
+NEUTRAL_COMMANDS = frozenset({'cd'})
+
+CommandResult = Tuple[bool, str]
+
+def command_ttl(command: str) -> Optional[float]:
+    """
+    Время жизни результата команды или None, если команда может что-то изменить
+
+    Для цепочки команд берется наименьшее время; неизвестная программа,
+    перенаправление вывода или systemctl start/stop делают команду изменяющей.
+    """
+    try:
+        segments = command_segments(command)
+    except ValueError:
+        return None
+    
+    ttl: Optional[float] = None
+    for segment in segments:
+        name = segment[0].lower()
+        if name in NEUTRAL_COMMANDS:
+            continue
+        if name not in COMMAND_CACHE_TTLS or any(token.startswith('>') for token in segment):
+            return None
+        if name == 'systemctl':
+            action = next((token for token in segment[1:] if not token.startswith('-')), 'list-units')
+            if action not in SYSTEMCTL_READ_ONLY:
+                return None
+        segment_ttl = COMMAND_CACHE_TTLS[name]
+        ttl = segment_ttl if ttl is None else min(ttl, segment_ttl)
+    return ttl
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # Все ожидающие могли уйти по таймауту - ошибку тогда некому прочитать
+    if not task.cancelled():
+        task.exception()
+
+class CommandCache:
+    """
+    Результаты команд по серверам
+
+    Одновременные одинаковые вызовы ждут одно выполнение (single-flight);
+    успешный результат хранится TTL своего класса. Изменяющая команда сбрасывает
+    кэш сервера, а результат чтения, начатого до сброса, не сохраняется.
+    Отмена одного ожидающего не прерывает общее выполнение.
+    """
+    
+    def __init__(self, maxsize: int = COMMAND_CACHE_SIZE):
+        self.cache = LRUCache(maxsize=maxsize)
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._generations: Dict[int, int] = {}
+        self.coalesced = 0
+    
+    async def run(self, server_id: int, command: str, ttl: Optional[float],
+                  execute: Callable[[], Awaitable[CommandResult]]) -> CommandResult:
+        """Выполнить команду через кэш; ttl None - изменяющая команда"""
+        if ttl is None:
+            self.invalidate(server_id)
+            try:
+                return await execute()
+            finally:
+                # Чтения, завершившиеся во время выполнения, тоже могут быть устаревшими
+                self.invalidate(server_id)
+        
+        key = (server_id, command)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # Выполнение - отдельная задача: отмена одного из ожидающих (таймаут опроса)
+            # не прерывает команду и не передает отмену остальным
+            generation = self._generations.get(server_id, 0)
+            task = asyncio.create_task(self._fill(key, ttl, generation, execute))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+    
+    async def _fill(self, key: Tuple[int, str], ttl: float, generation: int,
+                    execute: Callable[[], Awaitable[CommandResult]]) -> CommandResult:
+        server_id = key[0]
+        try:
+            result = await execute()
+        finally:
+            del self._inflight[key]
+        
+        if ttl > 0 and result[0] and self._generations.get(server_id, 0) == generation:
+            self.cache.set(key, result, ttl=ttl)
+        return result
+    
+    def invalidate(self, server_id: int) -> None:
+        """Сбросить кэш сервера"""
+        self._generations[server_id] = self._generations.get(server_id, 0) + 1
+        self.cache.invalidate_where(lambda key: key[0] == server_id)
+    
+    def stats(self) -> Dict[str, int]:
+        stats = self.cache.stats()
+        stats['coalesced'] = self.coalesced
+        stats['inflight'] = len(self._inflight)
+        return stats
+
+command_cache = CommandCache()
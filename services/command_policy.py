@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Политика безопасности команд: разбор с учетом синтаксиса shell и проверка каждого сегмента
+"""
+
+import re
+import shlex
+import time
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Tuple
+
+import config
+from config import ALLOWED_SSH_COMMANDS
+from utils.cache import LRUCache
+
+# Дополнительные разрешения и запреты пользователей:
+# {user_id: {'allow': ['docker'], 'deny': ['systemctl']}}
+USER_COMMAND_POLICIES = getattr(config, 'USER_COMMAND_POLICIES', {})
+COMMAND_POLICY_CACHE_SIZE = getattr(config, 'COMMAND_POLICY_CACHE_SIZE', 4096)
+
+# Разделители сегментов: каждая команда конвейера и списка проверяется отдельно
+SEGMENT_SEPARATORS = frozenset({';', '&', '&&', '||', '|', '|&'})
+# Символы операторов shell; перевод строки вне кавычек разделяет команды, как ;
+PUNCTUATION_CHARS = '();<>|&'
+OUTPUT_REDIRECTS = frozenset({'>', '>>', '&>', '>|', '&>>'})
+# Чтение из файла безопасно
+INPUT_REDIRECTS = frozenset({'<'})
+# Дублирование дескриптора (2>&1, >&-) безопасно; с именем файла >& пишет в файл
+DUP_REDIRECTS = frozenset({'>&', '<&'})
+# Вывод разрешено перенаправлять только в /dev/null и в другой дескриптор (2>&1)
+SAFE_REDIRECT_TARGETS = frozenset({'/dev/null'})
+# Подстановка команд и процессов не разбирается - запрещается целиком
+SUBSTITUTION_PATTERN = re.compile(r'\$\(|`|<\(|>\(')
+
+# Разрешенные программы: имя -> шаблон аргументов (None - любые аргументы)
+BASE_ALLOWED_COMMANDS: Dict[str, Optional[str]] = {
+    'uptime': None, 'whoami': None, 'pwd': None, 'free': None, 'df': None,
+    'ps': None, 'pgrep': None, 'kill': None, 'pkill': r'-f\b.*',
+    'systemctl': None, 'journalctl': None, 'tail': None, 'cd': None, 'ls': None, 'cat': None,
+    'screen': None, 'python': None, 'python3': None
+}
+# Обертки, после которых проверяется вложенная команда
+COMMAND_WRAPPERS = frozenset({'sudo', 'nohup'})
+
+# Запрещенные конструкции в тексте сегмента
+DENY_PATTERNS = (
+    r'\brm\s+-\w*[rf]', r'\bdd\s+if=', r'\bmkfs', r'\bshutdown\b', r'\breboot\b',
+    r'\bhalt\b', r'\bpoweroff\b', r'\bchmod\s+777\b', r'\bkillall\b',
+    r'\b(?:bash|sh|zsh|dash)\s+-c\b', r'\bwget\b', r'\bcurl\b',
+    # Сигнал KILL для kill и pkill: -9, -KILL, -s KILL, -n 9, --signal=KILL
+    r'^(?:kill|pkill)\b.*\s(?:-[sn]?\s*|--signal[=\s]\s*)(?:sig)?(?:9|kill)\b', r'/dev/[sh]d[a-z]'
+)
+
+Decision = Tuple[bool, str]
+
+class CommandPolicy:
+    """
+    Скомпилированная политика: таблица программ и одно регулярное выражение запретов
+
+    Таблицы строятся один раз; проверка команды - разбор shlex, поиск программы
+    в словаре и один проход регулярного выражения по каждому сегменту.
+    """
+    
+    def __init__(self, allowed: Dict[str, Optional[str]], deny_patterns: Iterable[str] = DENY_PATTERNS,
+                 denied_commands: Iterable[str] = ()):
+        self.allowed: Dict[str, Optional[Pattern]] = {
+            name: re.compile(args, re.DOTALL) if args else None for name, args in allowed.items()
+        }
+        self.denied_commands: FrozenSet[str] = frozenset(denied_commands)
+        self.deny = re.compile('|'.join(f'(?:{pattern})' for pattern in deny_patterns), re.IGNORECASE)
+    
+    @classmethod
+    def build(cls, extra_allowed: Iterable[str] = (), denied_commands: Iterable[str] = ()) -> 'CommandPolicy':
+        """Политика из базовой таблицы, ALLOWED_SSH_COMMANDS и дополнений"""
+        allowed = dict(BASE_ALLOWED_COMMANDS)
+        for name in list(ALLOWED_SSH_COMMANDS) + list(extra_allowed):
+            allowed.setdefault(name.lower(), None)
+        return cls(allowed, denied_commands=denied_commands)
+    
+    def check(self, command: str) -> Decision:
+        """Проверить команду: (разрешена, причина отказа)"""
+        command = command.strip()
+        if not command:
+            return False, "пустая команда"
+        if SUBSTITUTION_PATTERN.search(command):
+            return False, "подстановка команд запрещена"
+        
+        try:
+            segments = command_segments(command)
+        except ValueError as e:
+            return False, f"ошибка разбора: {e}"
+        
+        for segment in segments:
+            allowed, reason = self._check_segment(segment)
+            if not allowed:
+                return False, reason
+        return True, ''
+    
+    def _check_segment(self, segment: List[str]) -> Decision:
+        words = []
+        index = 0
+        while index < len(segment):
+            token = segment[index]
+            if token in OUTPUT_REDIRECTS or token in INPUT_REDIRECTS or token in DUP_REDIRECTS:
+                # Номер дескриптора перед перенаправлением (2>/dev/null) не является аргументом
+                if words and words[-1].isdigit():
+                    words.pop()
+            if token in OUTPUT_REDIRECTS or token in DUP_REDIRECTS:
+                target = segment[index + 1] if index + 1 < len(segment) else ''
+                duplicate = token in DUP_REDIRECTS and (target.isdigit() or target == '-')
+                if not duplicate and target not in SAFE_REDIRECT_TARGETS:
+                    return False, f"запись в файл запрещена: {target or token}"
+                index += 2
+                continue
+            if token in INPUT_REDIRECTS:
+                index += 2
+                continue
+            words.append(token)
+            index += 1
+        
+        while words and words[0].lower() in COMMAND_WRAPPERS:
+            words = words[1:]
+            while words and words[0].startswith('-'):
+                words.pop(0)
+        if not words:
+            return False, "пустая команда"
+        
+        name = words[0].lower()
+        if name in self.denied_commands or name not in self.allowed:
+            return False, f"программа не разрешена: {words[0]}"
+        
+        text = ' '.join(words)
+        if self.deny.search(text):
+            return False, f"запрещенная конструкция: {text}"
+        
+        args_pattern = self.allowed[name]
+        if args_pattern is not None and not args_pattern.fullmatch(' '.join(words[1:])):
+            return False, f"недопустимые аргументы {words[0]}"
+        return True, ''
+
+def command_segments(command: str) -> List[List[str]]:
+    """Токены команды по сегментам; ValueError - незакрытые кавычки"""
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=PUNCTUATION_CHARS + '\n')
+    lexer.whitespace = ' \t\r'
+    lexer.whitespace_split = True
+    return split_segments(list(lexer))
+
+def split_segments(tokens: List[str]) -> List[List[str]]:
+    """Разбить токены на сегменты по ; & && || | и переводу строки"""
+    segments: List[List[str]] = [[]]
+    for token in tokens:
+        if '\n' in token and not token.strip(PUNCTUATION_CHARS + '\n'):
+            # Оператор вместе с переводом строки: оператор без пары (>) остается в сегменте
+            operator = token.replace('\n', '')
+            if operator and operator not in SEGMENT_SEPARATORS:
+                segments[-1].append(operator)
+            segments.append([])
+        elif token in SEGMENT_SEPARATORS:
+            segments.append([])
+        else:
+            segments[-1].append(token)
+    return [segment for segment in segments if segment]
+
+class PolicyEngine:
+    """Политики пользователей и LRU кэш решений"""
+    
+    def __init__(self, user_policies: Dict[int, Dict[str, List[str]]] = USER_COMMAND_POLICIES,
+                 cache_size: int = COMMAND_POLICY_CACHE_SIZE):
+        self.default = CommandPolicy.build()
+        self.policies: Dict[int, CommandPolicy] = {
+            user_id: CommandPolicy.build(rules.get('allow', ()), rules.get('deny', ()))
+            for user_id, rules in user_policies.items()
+        }
+        self.cache = LRUCache(maxsize=cache_size)
+    
+    def policy_for(self, user_id: Optional[int]) -> CommandPolicy:
+        return self.policies.get(user_id, self.default)
+    
+    def check(self, command: str, user_id: Optional[int] = None) -> Decision:
+        """Решение по команде с учетом политики пользователя"""
+        key = (user_id if user_id in self.policies else None, command)
+        decision = self.cache.get(key)
+        if decision is None:
+            decision = self.policy_for(user_id).check(command)
+            self.cache.set(key, decision)
+        return decision
+
+command_policy = PolicyEngine()
+
+def is_safe_command(command: str, user_id: Optional[int] = None) -> bool:
+    """Проверка безопасности команды"""
+    return command_policy.check(command, user_id)[0]
+
+def _benchmark(iterations: int = 20000) -> None:
+    """Стоимость проверки: разбор без кэша и повторная проверка из кэша"""
+    commands = [
+        'uptime', 'df -h', 'ps aux | grep python', 'tail -n 50 bot.log 2>&1',
+        'cd /opt/bot && tail -n 100 bot.log', 'ls; rm -rf /', 'systemctl status bot',
+        'pkill -f bot.py', 'kill -9 1234', 'cat /etc/passwd > /tmp/x', 'echo $(id)'
+    ]
+    for command in commands:
+        print(f"{'+' if is_safe_command(command) else '-'} {command}")
+    
+    policy = command_policy.default
+    started = time.perf_counter()
+    for index in range(iterations):
+        policy.check(commands[index % len(commands)])
+    cold = (time.perf_counter() - started) / iterations
+    
+    started = time.perf_counter()
+    for index in range(iterations):
+        is_safe_command(commands[index % len(commands)])
+    warm = (time.perf_counter() - started) / iterations
+    
+    print(f"\nБез кэша: {cold * 1e6:.1f} мкс на вызов")
+    print(f"Из кэша: {warm * 1e6:.2f} мкс на вызов")
+
+if __name__ == '__main__':
+    _benchmark()
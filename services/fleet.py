@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Параллельное выполнение операций на группе серверов
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Tuple
+
+import config
+from config import SSH_TIMEOUT
+
+FLEET_CONCURRENCY = getattr(config, 'FLEET_CONCURRENCY', 50)
+FLEET_HOST_TIMEOUT = getattr(config, 'FLEET_HOST_TIMEOUT', SSH_TIMEOUT)
+
+# Статусы результата для одного сервера
+FLEET_OK = 'ok'
+FLEET_TIMEOUT = 'timeout'
+FLEET_ERROR = 'error'
+
+async def fan_out(servers: Iterable[Dict[str, Any]],
+                  worker: Callable[[Dict[str, Any]], Awaitable[Any]],
+                  concurrency: int = FLEET_CONCURRENCY,
+                  timeout: float = FLEET_HOST_TIMEOUT) -> AsyncIterator[Tuple[Dict[str, Any], str, Any, float]]:
+    """
+    Выполнить worker для каждого сервера с ограничением параллельности
+
+    Результаты отдаются по мере готовности: (сервер, статус, результат, время в секундах)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run(server: Dict[str, Any]):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(worker(server), timeout)
+                return server, FLEET_OK, result, time.monotonic() - started
+            except asyncio.TimeoutError:
+                return server, FLEET_TIMEOUT, None, time.monotonic() - started
+            except Exception as e:
+                return server, FLEET_ERROR, str(e), time.monotonic() - started
+    
+    tasks = [asyncio.create_task(run(server)) for server in servers]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
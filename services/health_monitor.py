@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Фоновый опрос серверов и кэш последних снимков состояния
+"""
+
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import config
+from database import get_monitored_servers, save_status_snapshots, load_status_snapshots
+from services.fleet import fan_out, FLEET_OK, FLEET_TIMEOUT, FLEET_HOST_TIMEOUT
+from services.probes import run_probe_bundle, status_probes
+from services.scheduler import command_scheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from utils.tasks import PeriodicTask
+
+HEALTH_CHECK_INTERVAL = getattr(config, 'HEALTH_CHECK_INTERVAL', 60)
+HEALTH_CHECK_JITTER = getattr(config, 'HEALTH_CHECK_JITTER', 10)
+HEALTH_CHECK_CONCURRENCY = getattr(config, 'HEALTH_CHECK_CONCURRENCY', 20)
+# Снимок старше этого не показывается как текущий - выполняется живой опрос
+HEALTH_SNAPSHOT_MAX_AGE = getattr(config, 'HEALTH_SNAPSHOT_MAX_AGE', 3 * HEALTH_CHECK_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+Snapshot = Dict[str, Any]
+SnapshotListener = Callable[[Dict[str, Any], Snapshot, Optional[Snapshot]], Awaitable[None]]
+
+def make_snapshot(server_id: int, status: str, result: Any, elapsed: float,
+                  checked_at: Optional[float] = None) -> Snapshot:
+    """
+    Снимок состояния сервера по результату пакета проб
+
+    ok - сервер ответил хотя бы на одну пробу; results - результаты проб без сырого вывода
+    """
+    snapshot = {
+        'server_id': server_id,
+        'checked_at': checked_at or time.time(),
+        'elapsed': elapsed,
+        'ok': False,
+        'error': None,
+        'results': {}
+    }
+    if status == FLEET_TIMEOUT:
+        snapshot['error'] = f"нет ответа за {FLEET_HOST_TIMEOUT} с"
+    elif status != FLEET_OK:
+        snapshot['error'] = str(result)
+    else:
+        snapshot['results'] = {
+            name: {key: value for key, value in probe.items() if key != 'output'}
+            for name, probe in result.items()
+        }
+        snapshot['ok'] = any(probe.get('ok') for probe in result.values())
+        if not snapshot['ok']:
+            snapshot['error'] = next(iter(result.values()), {}).get('error', 'нет ответа')
+    return snapshot
+
+def snapshot_age(snapshot: Snapshot) -> float:
+    """Возраст снимка в секундах"""
+    return max(0.0, time.time() - snapshot['checked_at'])
+
+class HealthMonitor:
+    """Периодический опрос всех серверов; последние снимки в памяти и в SQLite"""
+    
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL, jitter: float = HEALTH_CHECK_JITTER,
+                 concurrency: int = HEALTH_CHECK_CONCURRENCY):
+        self.concurrency = concurrency
+        self.task = PeriodicTask('health_monitor', interval, self.poll_all, jitter=jitter, initial_delay=5)
+        self._snapshots: Dict[int, Snapshot] = {}
+        self._listeners: List[SnapshotListener] = []
+        self.cycles = 0
+        self.last_cycle_seconds = 0.0
+    
+    async def start(self) -> None:
+        """Загрузить сохраненные снимки и запустить опрос"""
+        try:
+            for server_id, checked_at, ok, elapsed, error, results in await load_status_snapshots():
+                self._snapshots[server_id] = {
+                    'server_id': server_id,
+                    'checked_at': checked_at,
+                    'elapsed': elapsed,
+                    'ok': bool(ok),
+                    'error': error,
+                    'results': json.loads(results) if results else {}
+                }
+        except Exception as e:
+            logger.error(f"Не удалось загрузить снимки состояния: {e}")
+        self.task.start()
+    
+    async def stop(self) -> None:
+        await self.task.stop()
+    
+    def add_listener(self, listener: SnapshotListener) -> None:
+        """Вызывать listener(server, snapshot, previous) для каждого нового снимка"""
+        self._listeners.append(listener)
+    
+    def get(self, server_id: int) -> Optional[Snapshot]:
+        """Последний снимок сервера или None"""
+        return self._snapshots.get(server_id)
+    
+    def forget(self, server_id: int) -> None:
+        """Удалить снимок (сервер удален)"""
+        self._snapshots.pop(server_id, None)
+    
+    async def record(self, server: Dict[str, Any], snapshot: Snapshot) -> None:
+        """Запомнить снимок и уведомить подписчиков"""
+        await self._store([(server, snapshot)])
+    
+    async def _store(self, items: List[Tuple[Dict[str, Any], Snapshot]]) -> None:
+        for server, snapshot in items:
+            previous = self._snapshots.get(snapshot['server_id'])
+            self._snapshots[snapshot['server_id']] = snapshot
+            for listener in self._listeners:
+                try:
+                    await listener(server, snapshot, previous)
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика снимка сервера {snapshot['server_id']}: {e}")
+        
+        try:
+            await save_status_snapshots([
+                (snapshot['server_id'], snapshot['checked_at'], snapshot['ok'], snapshot['elapsed'],
+                 snapshot['error'], json.dumps(snapshot['results']))
+                for _, snapshot in items
+            ])
+        except Exception as e:
+            logger.error(f"Не удалось сохранить снимки состояния: {e}")
+    
+    async def refresh(self, server: Dict[str, Any], user_id: int) -> Snapshot:
+        """Живой опрос одного сервера (команда с refresh или устаревший снимок)"""
+        async for _, status, result, elapsed in fan_out([server], self._probe(user_id), concurrency=1):
+            snapshot = make_snapshot(server['id'], status, result, elapsed)
+        await self.record(server, snapshot)
+        return snapshot
+    
+    @staticmethod
+    def _probe(user_id: Optional[int] = None):
+        async def probe(server: Dict[str, Any]):
+            probes = status_probes(server.get('filename') or server.get('bot_filename') or 'bot.py',
+                                   server.get('service_name'))
+            # Фоновый опрос уступает очередь командам пользователей и не пишется в журнал
+            priority = PRIORITY_INTERACTIVE if user_id else PRIORITY_BACKGROUND
+            return await run_probe_bundle(server['id'], user_id or server['user_id'], probes, priority,
+                                          audit=False)
+        return probe
+    
+    async def poll_all(self) -> None:
+        """Один цикл опроса всех серверов"""
+        started = time.monotonic()
+        servers = await get_monitored_servers()
+        items = []
+        async for server, status, result, elapsed in fan_out(servers, self._probe(),
+                                                            concurrency=self.concurrency):
+            items.append((server, make_snapshot(server['id'], status, result, elapsed)))
+        
+        known = {server['id'] for server in servers}
+        for server_id in list(self._snapshots):
+            if server_id not in known:
+                del self._snapshots[server_id]
+        
+        if items:
+            await self._store(items)
+        
+        self.cycles += 1
+        self.last_cycle_seconds = time.monotonic() - started
+        queue = command_scheduler.stats()
+        logger.info(f"Опрос серверов: {len(items)} за {self.last_cycle_seconds:.1f} с; "
+                    f"в очереди команд: {queue['queued']}, "
+                    f"ожидание фоновых: {queue['waits']['background']['avg']:.2f} с в среднем")
+
+health_monitor = HealthMonitor()
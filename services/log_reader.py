@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Инкрементальное чтение логов: только байты, появившиеся с прошлого чтения
+"""
+
+import shlex
+from typing import Any, Dict, Optional
+
+import config
+from database import get_log_cursor, save_log_cursor
+from services.ssh_client import execute_server_command
+
+LOG_DELTA_MAX_BYTES = getattr(config, 'LOG_DELTA_MAX_BYTES', 16384)
+
+LOG_MARKER = '@@log'
+LOG_ROTATED = '@@rotated'
+LOG_SKIPPED = '@@skipped'
+LOG_DATA = '@@data'
+
+def build_delta_script(log_file: str, inode: int, offset: int, max_bytes: int) -> str:
+    """
+    Скрипт чтения лога с позиции offset
+
+    Смена inode или уменьшение размера файла считается ротацией - чтение
+    начинается с начала нового файла. Передается не больше max_bytes последних байт.
+    offset < 0 означает первое чтение (позиция не сохранена).
+    """
+    return '\n'.join([
+        f"f={shlex.quote(log_file)}",
+        "st=$(stat -L -c '%i %s' -- \"$f\") || exit 1",
+        "set -- $st",
+        "inode=$1; size=$2",
+        f"start={offset}",
+        f'echo "{LOG_MARKER} $inode $size"',
+        "if [ \"$start\" -lt 0 ]; then start=0",
+        f"elif [ \"$inode\" != \"{inode}\" ] || [ \"$size\" -lt \"$start\" ]; then echo '{LOG_ROTATED}'; start=0",
+        "fi",
+        f"if [ $((size - start)) -gt {max_bytes} ]; then",
+        f"  echo \"{LOG_SKIPPED} $((size - start - {max_bytes}))\"; start=$((size - {max_bytes}))",
+        "fi",
+        f'echo "{LOG_DATA} $start"',
+        "if [ \"$size\" -gt \"$start\" ]; then tail -c +$((start + 1)) -- \"$f\" | head -c $((size - start)); fi",
+    ])
+
+def parse_delta_output(output: str) -> Dict[str, Any]:
+    """Разобрать вывод скрипта: заголовки до маркера данных, затем сами данные"""
+    delta = {'inode': None, 'size': 0, 'rotated': False, 'skipped': 0, 'data': ''}
+    
+    head, marker, data = output.partition(f"\n{LOG_DATA} ")
+    if not marker:
+        raise ValueError("нет маркера данных")
+    delta['data'] = data.partition('\n')[2]
+    
+    for line in head.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == LOG_MARKER:
+            delta['inode'] = int(parts[1])
+            delta['size'] = int(parts[2])
+        elif parts[0] == LOG_ROTATED:
+            delta['rotated'] = True
+        elif parts[0] == LOG_SKIPPED:
+            delta['skipped'] = int(parts[1])
+    
+    if delta['inode'] is None:
+        raise ValueError("нет данных о файле")
+    return delta
+
+async def fetch_log_delta(server_id: int, user_id: int, log_file: str) -> Dict[str, Any]:
+    """
+    Прочитать новые байты лога с прошлого вызова
+
+    Returns:
+        Dict: ok, error, first (позиция не была сохранена), rotated, skipped (пропущено байт),
+        data (новые строки)
+    """
+    cursor = await get_log_cursor(server_id, log_file)
+    inode, offset = cursor if cursor else (-1, -1)
+    
+    script = build_delta_script(log_file, inode, offset, LOG_DELTA_MAX_BYTES)
+    success, output = await execute_server_command(server_id, user_id, script, trusted=True)
+    if not success:
+        return {'ok': False, 'error': output}
+    
+    try:
+        delta = parse_delta_output(output)
+    except (ValueError, IndexError) as e:
+        return {'ok': False, 'error': f"❌ Не удалось разобрать ответ сервера: {e}"}
+    
+    await save_log_cursor(server_id, log_file, delta['inode'], delta['size'])
+    
+    if delta['skipped'] and '\n' in delta['data']:
+        # Первая строка после пропуска обрезана - не показываем ее
+        delta['data'] = delta['data'].split('\n', 1)[1]
+    
+    delta['ok'] = True
+    delta['first'] = cursor is None
+    return delta
+
+LOG_GREP_MAX_MATCHES = getattr(config, 'LOG_GREP_MAX_MATCHES', 30)
+LOG_GREP_CONTEXT = getattr(config, 'LOG_GREP_CONTEXT', 2)
+LOG_GREP_LINE_CHARS = getattr(config, 'LOG_GREP_LINE_CHARS', 300)
+
+LOG_MATCHES = '@@matches'
+
+# Уровни logging по возрастанию важности: --level ERROR находит ERROR и CRITICAL
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+# Фильтрация на сервере: номера строк, контекст, ограничение вывода.
+# Шаблон и уровень передаются через окружение, чтобы awk не обрабатывал в них escape-последовательности.
+# Строки без отметки времени (traceback) относятся к последней найденной отметке.
+GREP_AWK = r'''
+BEGIN {
+    pat = ENVIRON["LOG_GREP_PATTERN"]; lvl = ENVIRON["LOG_GREP_LEVEL"]
+    since = ENVIRON["LOG_GREP_SINCE"]; icase = ENVIRON["LOG_GREP_ICASE"] != ""
+    if (icase) pat = tolower(pat)
+    if (lvl != "") lvl = "(^|[^A-Za-z])(" lvl ")([^A-Za-z]|$)"
+}
+{
+    line = $0
+    if (since != "") {
+        if (match(line, /^[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9][ T][0-9][0-9]:[0-9][0-9]:[0-9][0-9]/)) {
+            ts = substr(line, 1, 19); sub(/T/, " ", ts)
+        }
+        if (ts == "" || ts < since) next
+    }
+    hit = (lvl == "" || line ~ lvl)
+    if (hit && pat != "") hit = ((icase ? tolower(line) : line) ~ pat)
+    if (hit) {
+        matches++
+        if (matches <= max) {
+            start = NR - ctx
+            if (start <= last) start = last + 1
+            if (last && start > last + 1) print "--"
+            for (i = start; i < NR; i++) if (i in buf) print i "-" substr(buf[i], 1, width)
+            print NR ":" substr(line, 1, width)
+            last = NR; after = ctx
+        }
+    } else if (after > 0) {
+        print NR "-" substr(line, 1, width)
+        last = NR; after--
+    }
+    buf[NR] = line; delete buf[NR - ctx]
+}
+END { print "@@matches " matches + 0 }
+'''
+
+def since_expression(since: str) -> str:
+    """Перевести 30m / 2h / 1d / 14:00 в выражение для date -d; остальное передается как есть"""
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+    if since[:-1].isdigit() and since[-1:].lower() in units:
+        return f"{since[:-1]} {units[since[-1].lower()]} ago"
+    if len(since) == 5 and since[2] == ':' and since.replace(':', '').isdigit():
+        return f"today {since}"
+    return since
+
+def level_pattern(level: str) -> str:
+    """Регулярное выражение для уровня и всех более важных"""
+    level = level.upper()
+    if level == 'WARN':
+        level = 'WARNING'
+    if level not in LOG_LEVELS:
+        raise ValueError(f"неизвестный уровень {level}, допустимы: {', '.join(LOG_LEVELS)}")
+    levels = list(LOG_LEVELS[LOG_LEVELS.index(level):])
+    if 'WARNING' in levels:
+        levels.append('WARN')
+    return '|'.join(levels)
+
+def build_grep_script(log_file: str, pattern: str = '', since: Optional[str] = None,
+                      level: Optional[str] = None, ignore_case: bool = False,
+                      context: int = LOG_GREP_CONTEXT, max_matches: int = LOG_GREP_MAX_MATCHES,
+                      width: int = LOG_GREP_LINE_CHARS) -> str:
+    """Скрипт поиска по логу на сервере"""
+    lines = [f"f={shlex.quote(log_file)}"]
+    if since:
+        # Время считается часами сервера - в том же поясе, что и записи лога
+        lines.append(f"LOG_GREP_SINCE=$(date -d {shlex.quote(since_expression(since))} "
+                     f"'+%Y-%m-%d %H:%M:%S') || exit 1")
+        lines.append("export LOG_GREP_SINCE")
+    env = [
+        f"LOG_GREP_PATTERN={shlex.quote(pattern)}",
+        f"LOG_GREP_LEVEL={shlex.quote(level_pattern(level) if level else '')}",
+        f"LOG_GREP_ICASE={'1' if ignore_case else ''}"
+    ]
+    lines.append(f"{' '.join(env)} awk -v ctx={int(context)} -v max={int(max_matches)} "
+                 f"-v width={int(width)} {shlex.quote(GREP_AWK)} < \"$f\"")
+    return '\n'.join(lines)
+
+async def search_log(server_id: int, user_id: int, log_file: str, pattern: str = '',
+                     since: Optional[str] = None, level: Optional[str] = None,
+                     ignore_case: bool = False, context: int = LOG_GREP_CONTEXT) -> Dict[str, Any]:
+    """
+    Найти строки лога на сервере и получить только их с контекстом
+
+    Returns:
+        Dict: ok, error, lines (строки вида "N:текст", контекст "N-текст"),
+        matches (всего совпадений), shown (показано совпадений)
+    """
+    try:
+        script = build_grep_script(log_file, pattern, since, level, ignore_case, context)
+    except ValueError as e:
+        return {'ok': False, 'error': f"❌ {e}"}
+    
+    success, output = await execute_server_command(server_id, user_id, script, trusted=True)
+    if not success or LOG_MATCHES not in output:
+        return {'ok': False, 'error': output}
+    
+    body, _, tail = output.rpartition(LOG_MATCHES)
+    try:
+        matches = int(tail.split()[0])
+    except (ValueError, IndexError):
+        return {'ok': False, 'error': "❌ Не удалось разобрать ответ сервера"}
+    
+    return {
+        'ok': True,
+        'lines': body.rstrip('\n').splitlines(),
+        'matches': matches,
+        'shown': min(matches, LOG_GREP_MAX_MATCHES)
+    }
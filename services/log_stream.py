@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Слежение за логом бота в реальном времени
+"""
+
+import asyncio
+import logging
+import shlex
+from collections import deque
+from typing import Awaitable, Callable, Dict, List
+
+import config
+from services.ssh_client import open_server_process
+
+LOG_FOLLOW_DEFAULT_SECONDS = getattr(config, 'LOG_FOLLOW_DEFAULT_SECONDS', 120)
+LOG_FOLLOW_MAX_SECONDS = getattr(config, 'LOG_FOLLOW_MAX_SECONDS', 600)
+LOG_FOLLOW_INITIAL_LINES = getattr(config, 'LOG_FOLLOW_INITIAL_LINES', 20)
+LOG_FOLLOW_BUFFER_LINES = 200
+
+logger = logging.getLogger(__name__)
+
+# Причины завершения слежения
+FOLLOW_TIMEOUT = 'timeout'
+FOLLOW_CANCELLED = 'cancelled'
+FOLLOW_EOF = 'eof'
+
+# Активные слежения: user_id -> событие остановки
+_followers: Dict[int, asyncio.Event] = {}
+
+def stop_follow(user_id: int) -> bool:
+    """Остановить слежение пользователя; False - если его нет"""
+    stop_event = _followers.get(user_id)
+    if not stop_event:
+        return False
+    stop_event.set()
+    return True
+
+async def follow_log(server_id: int, user_id: int, log_file: str, duration: int,
+                     on_lines: Callable[[List[str], float], Awaitable[None]]) -> str:
+    """
+    Читать новые строки лога через один SSH канал (tail -F)
+
+    on_lines вызывается с буфером последних строк и оставшимся временем в отдельной
+    задаче: пока он ждет (лимит отправки Telegram), чтение продолжается, а строки,
+    пришедшие за это время, попадают в следующий вызов. Частоту обновления
+    сообщения ограничивает вызывающий код.
+
+    Returns:
+        str: Причина завершения (FOLLOW_TIMEOUT, FOLLOW_CANCELLED, FOLLOW_EOF)
+    """
+    # У пользователя одно слежение: новое останавливает предыдущее
+    stop_follow(user_id)
+    stop_event = asyncio.Event()
+    _followers[user_id] = stop_event
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    lines = deque(maxlen=LOG_FOLLOW_BUFFER_LINES)
+    # timeout на сервере гарантирует завершение tail, даже если канал не закроется
+    command = (f"timeout {duration + 5} tail -n {LOG_FOLLOW_INITIAL_LINES} "
+               f"-F {shlex.quote(log_file)}")
+    reason = FOLLOW_TIMEOUT
+    changed = asyncio.Event()
+    
+    async def render() -> None:
+        while True:
+            await changed.wait()
+            changed.clear()
+            try:
+                await on_lines(list(lines), deadline - loop.time())
+            except Exception as e:
+                logger.error(f"Ошибка обновления слежения за логом: {e}")
+    
+    renderer = asyncio.create_task(render())
+    try:
+        async with open_server_process(server_id, user_id, command) as process:
+            stopped = asyncio.create_task(stop_event.wait())
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    
+                    read = asyncio.create_task(process.stdout.readline())
+                    done, _ = await asyncio.wait({read, stopped}, timeout=remaining,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if read not in done:
+                        read.cancel()
+                        if stopped in done:
+                            reason = FOLLOW_CANCELLED
+                        break
+                    
+                    line = read.result()
+                    if not line:
+                        reason = FOLLOW_EOF
+                        break
+                    
+                    lines.append(line.rstrip('\n'))
+                    changed.set()
+            finally:
+                stopped.cancel()
+    finally:
+        renderer.cancel()
+        await asyncio.gather(renderer, return_exceptions=True)
+        if _followers.get(user_id) is stop_event:
+            del _followers[user_id]
+    
+    return reason
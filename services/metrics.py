@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Хранилище метрик серверов: кольцевые буферы в памяти и агрегаты в SQLite
+"""
+
+import asyncio
+import logging
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from database import save_host_metrics, get_host_metrics, prune_host_metrics, METRIC_RESOLUTIONS
+
+# Значений на метрику в памяти: сутки при опросе раз в минуту
+METRICS_RING_SIZE = getattr(config, 'METRICS_RING_SIZE', 1440)
+# Срок хранения агрегатов по разрешениям, секунды
+METRICS_RETENTION = getattr(config, 'METRICS_RETENTION', {
+    '1m': 2 * 86400,
+    '1h': 30 * 86400,
+    '1d': 365 * 86400
+})
+METRICS_FLUSH_DELAY = 1.0
+
+# Метрики: имя -> (подпись, единица)
+METRICS = {
+    'load1': ('📈 Нагрузка', ''),
+    'memory': ('💾 Память', '%'),
+    'disk': ('💿 Диск', '%')
+}
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+
+logger = logging.getLogger(__name__)
+
+class RingSeries:
+    """Кольцевой буфер значений метрики: два массива double, 16 байт на точку"""
+    
+    def __init__(self, capacity: int = METRICS_RING_SIZE):
+        self.capacity = capacity
+        self._times = array('d', bytes(8 * capacity))
+        self._values = array('d', bytes(8 * capacity))
+        self._next = 0
+        self.size = 0
+    
+    def append(self, timestamp: float, value: float) -> None:
+        self._times[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def oldest(self) -> Optional[float]:
+        """Время самой старой точки"""
+        if not self.size:
+            return None
+        return self._times[(self._next - self.size) % self.capacity]
+    
+    def since(self, timestamp: float) -> List[Tuple[float, float]]:
+        """Точки не старше timestamp в порядке времени"""
+        points = []
+        for offset in range(self.size):
+            index = (self._next - self.size + offset) % self.capacity
+            if self._times[index] >= timestamp:
+                points.append((self._times[index], self._values[index]))
+        return points
+
+def snapshot_metrics(snapshot: Dict[str, Any]) -> Dict[str, float]:
+    """Значения метрик из снимка состояния: нагрузка, память и диск в процентах"""
+    results = snapshot.get('results', {})
+    values = {}
+    
+    load = results.get('loadavg', {})
+    if load.get('ok'):
+        values['load1'] = load['value']['load1']
+    
+    memory = results.get('meminfo', {})
+    if memory.get('ok') and memory['value']['total']:
+        values['memory'] = 100.0 * memory['value']['used'] / memory['value']['total']
+    
+    disk = results.get('statvfs', {})
+    if disk.get('ok'):
+        used = disk['value']['total'] - disk['value']['free']
+        # Как df: доля от места, доступного пользователям
+        capacity = used + disk['value']['available']
+        if capacity:
+            values['disk'] = 100.0 * used / capacity
+    
+    return values
+
+class MetricsStore:
+    """Метрики всех серверов: сырые точки в памяти, агрегаты 1m/1h/1d в базе"""
+    
+    def __init__(self, ring_size: int = METRICS_RING_SIZE):
+        self.ring_size = ring_size
+        self._series: Dict[Tuple[int, str], RingSeries] = {}
+        self._pending: List[Tuple[int, str, float, float]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    def record(self, server_id: int, timestamp: float, values: Dict[str, float]) -> None:
+        """Добавить значения; запись в базу - одним пакетом вскоре после опроса"""
+        for metric, value in values.items():
+            series = self._series.get((server_id, metric))
+            if series is None:
+                series = self._series[(server_id, metric)] = RingSeries(self.ring_size)
+            series.append(timestamp, value)
+            self._pending.append((server_id, metric, timestamp, value))
+        
+        if self._pending and not self._flush_task:
+            self._flush_task = asyncio.create_task(self._flush_later())
+    
+    async def on_snapshot(self, server: Dict[str, Any], snapshot: Dict[str, Any],
+                          previous: Optional[Dict[str, Any]]) -> None:
+        """Подписчик монитора состояния"""
+        if snapshot['ok']:
+            self.record(snapshot['server_id'], snapshot['checked_at'], snapshot_metrics(snapshot))
+    
+    async def _flush_later(self) -> None:
+        # Снимки одного цикла опроса приходят подряд - собираем их в одну транзакцию
+        await asyncio.sleep(METRICS_FLUSH_DELAY)
+        self._flush_task = None
+        await self.flush()
+    
+    async def flush(self) -> None:
+        """Записать накопленные значения"""
+        samples, self._pending = self._pending, []
+        if not samples:
+            return
+        try:
+            await save_host_metrics(samples)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить метрики ({len(samples)} значений): {e}")
+    
+    def forget(self, server_id: int) -> None:
+        """Удалить буферы сервера"""
+        for key in [key for key in self._series if key[0] == server_id]:
+            del self._series[key]
+    
+    async def query(self, server_id: int, window: float) -> Dict[str, List[Tuple[float, float, float, float]]]:
+        """
+        Точки метрик за окно: metric -> [(время, среднее, минимум, максимум)]
+
+        Окно, покрытое кольцевым буфером, отдается из памяти; более длинное -
+        из агрегатов самого мелкого разрешения, дающего не больше ~500 точек.
+        """
+        now = time.time()
+        start = now - window
+        
+        series = {metric: self._series.get((server_id, metric)) for metric in METRICS}
+        if all(ring is not None and ring.oldest() is not None and ring.oldest() <= start
+               for ring in series.values()):
+            return {
+                metric: [(timestamp, value, value, value) for timestamp, value in ring.since(start)]
+                for metric, ring in series.items()
+            }
+        
+        resolution = next((name for name, step in METRIC_RESOLUTIONS.items() if window / step <= 500), '1d')
+        rows = await get_host_metrics(server_id, resolution, start)
+        return {
+            metric: [(bucket, total / count, low, high) for bucket, count, total, low, high in points]
+            for metric, points in rows.items()
+        }
+    
+    async def prune(self) -> int:
+        """Удалить агрегаты старше сроков хранения"""
+        return await prune_host_metrics(METRICS_RETENTION, time.time())
+
+def sparkline(values: List[float], width: int = 30) -> str:
+    """Текстовый график: значения усредняются до width столбцов"""
+    if not values:
+        return ''
+    if len(values) > width:
+        step = len(values) / width
+        values = [
+            sum(chunk) / len(chunk)
+            for chunk in (values[int(i * step):int((i + 1) * step)] for i in range(width))
+            if chunk
+        ]
+    low, high = min(values), max(values)
+    if high - low < 1e-9:
+        return SPARK_CHARS[0] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return ''.join(SPARK_CHARS[int(round((value - low) * scale))] for value in values)
+
+metrics_store = MetricsStore()
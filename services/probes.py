@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Пакетный опрос состояния сервера за одно SSH выполнение
+"""
+
+import shlex
+from typing import Callable, Dict, Any, Optional
+from services.scheduler import PRIORITY_INTERACTIVE
+from services.ssh_client import execute_server_command
+from utils.helpers import format_size, format_duration
+
+PROBE_BEGIN = '@@probe'
+PROBE_END = '@@end'
+# Повторный опрос того же набора проб в течение этого времени отдается из кэша
+PROBE_CACHE_TTL = 5
+
+# Базовые пробы состояния системы: имя -> команда
+SYSTEM_PROBES = {
+    'loadavg': 'cat /proc/loadavg',
+    'meminfo': "grep -E '^(MemTotal|MemFree|MemAvailable):' /proc/meminfo",
+    'uptime': 'cat /proc/uptime',
+    'statvfs': "stat -f -c '%S %b %f %a' /",
+    'cpu_count': 'nproc'
+}
+
+def bot_process_pattern(bot_filename: str) -> str:
+    """Шаблон pgrep -f для процесса бота"""
+    # [p]ython3 не совпадает с командной строкой самой проверки
+    return f'[p]ython3.*{bot_filename}'
+
+def bot_probes(bot_filename: str, service_name: Optional[str] = None) -> Dict[str, str]:
+    """Пробы процесса и systemd сервиса бота"""
+    probes = {'bot_pids': f"pgrep -f {shlex.quote(bot_process_pattern(bot_filename))}"}
+    probes['bot_service'] = f"systemctl is-active {shlex.quote(service_name or 'bot')} 2>/dev/null"
+    return probes
+
+def status_probes(bot_filename: str, service_name: Optional[str] = None) -> Dict[str, str]:
+    """Полный набор проб для /server_status"""
+    probes = dict(SYSTEM_PROBES)
+    probes.update(bot_probes(bot_filename, service_name))
+    return probes
+
+def build_probe_script(probes: Dict[str, str]) -> str:
+    """Собрать один скрипт из набора проб"""
+    lines = ['{']
+    for name, command in probes.items():
+        lines.append(f"echo '{PROBE_BEGIN} {name}'")
+        # Каждая проба в своей подоболочке: ошибка одной не влияет на остальные
+        lines.append(f"( {command} ) 2>&1 </dev/null")
+        lines.append(f'echo "{PROBE_END} {name} $?"')
+    lines.append('}')
+    return '\n'.join(lines)
+
+def _parse_loadavg(output: str) -> Dict[str, Any]:
+    parts = output.split()
+    return {
+        'load1': float(parts[0]),
+        'load5': float(parts[1]),
+        'load15': float(parts[2])
+    }
+
+def _parse_meminfo(output: str) -> Dict[str, Any]:
+    values = {}
+    for line in output.splitlines():
+        key, _, rest = line.partition(':')
+        fields = rest.split()
+        if fields:
+            values[key.strip()] = int(fields[0]) * 1024
+    
+    total = values['MemTotal']
+    available = values.get('MemAvailable', values.get('MemFree', 0))
+    return {'total': total, 'available': available, 'used': total - available}
+
+def _parse_uptime(output: str) -> Dict[str, Any]:
+    return {'seconds': float(output.split()[0])}
+
+def _parse_statvfs(output: str) -> Dict[str, Any]:
+    block_size, blocks, free, available = (int(value) for value in output.split()[:4])
+    return {
+        'total': block_size * blocks,
+        'free': block_size * free,
+        'available': block_size * available
+    }
+
+def _parse_cpu_count(output: str) -> Dict[str, Any]:
+    return {'cores': int(output.split()[0])}
+
+def _parse_pids(output: str) -> Dict[str, Any]:
+    return {'pids': [line.strip() for line in output.splitlines() if line.strip().isdigit()]}
+
+def _parse_service(output: str) -> Dict[str, Any]:
+    lines = output.strip().splitlines()
+    return {'state': lines[-1].strip() if lines else 'unknown'}
+
+PROBE_PARSERS: Dict[str, Callable[[str], Dict[str, Any]]] = {
+    'loadavg': _parse_loadavg,
+    'meminfo': _parse_meminfo,
+    'uptime': _parse_uptime,
+    'statvfs': _parse_statvfs,
+    'cpu_count': _parse_cpu_count,
+    'bot_pids': _parse_pids,
+    'bot_service': _parse_service
+}
+
+# Допустимые коды возврата проб (None - любой код): pgrep возвращает 1, если процессов нет,
+# systemctl is-active - ненулевой код для неактивного сервиса
+PROBE_EXIT_CODES = {
+    'bot_pids': (0, 1),
+    'bot_service': None
+}
+
+def parse_probe_output(probes: Dict[str, str], output: str) -> Dict[str, Dict[str, Any]]:
+    """Разобрать вывод скрипта проб"""
+    raw: Dict[str, Dict[str, Any]] = {}
+    current = None
+    buffer = []
+    
+    for line in output.splitlines():
+        if line.startswith(PROBE_BEGIN + ' '):
+            current = line[len(PROBE_BEGIN) + 1:].strip()
+            buffer = []
+        elif current and line.startswith(f"{PROBE_END} {current} "):
+            code = line.rsplit(' ', 1)[-1]
+            raw[current] = {
+                'output': '\n'.join(buffer).strip(),
+                'exit_code': int(code) if code.lstrip('-').isdigit() else -1
+            }
+            current = None
+        elif current:
+            buffer.append(line)
+    
+    results = {}
+    for name in probes:
+        probe = raw.get(name)
+        if probe is None:
+            results[name] = {'ok': False, 'error': 'нет ответа', 'output': ''}
+            continue
+        
+        allowed_codes = PROBE_EXIT_CODES.get(name, (0,))
+        if allowed_codes is not None and probe['exit_code'] not in allowed_codes:
+            results[name] = {
+                'ok': False,
+                'error': probe['output'] or f"код {probe['exit_code']}",
+                'output': probe['output']
+            }
+            continue
+        
+        result = {'ok': True, 'output': probe['output'], 'exit_code': probe['exit_code']}
+        parser = PROBE_PARSERS.get(name)
+        if parser:
+            try:
+                result['value'] = parser(probe['output'])
+            except (ValueError, IndexError, KeyError) as e:
+                result = {'ok': False, 'error': f"не удалось разобрать: {e}", 'output': probe['output']}
+        results[name] = result
+    
+    return results
+
+async def run_probe_bundle(server_id: int, user_id: int, probes: Dict[str, str],
+                           priority: int = PRIORITY_INTERACTIVE, audit: bool = True,
+                           admission: bool = True) -> Dict[str, Dict[str, Any]]:
+    """Выполнить набор проб одним SSH вызовом; audit=False - опрос без записи в журнал"""
+    script = build_probe_script(probes)
+    success, output = await execute_server_command(server_id, user_id, script, trusted=True,
+                                                   cache_ttl=PROBE_CACHE_TTL, priority=priority,
+                                                   audit=audit, admission=admission)
+    
+    if not success and PROBE_BEGIN not in output:
+        return {name: {'ok': False, 'error': output, 'output': ''} for name in probes}
+    
+    return parse_probe_output(probes, output)
+
+def describe_bot_status(results: Dict[str, Dict[str, Any]]) -> str:
+    """Текстовый статус бота по результатам проб"""
+    pids_probe = results.get('bot_pids', {})
+    if not pids_probe.get('ok'):
+        return "❓ Неизвестно (ошибка проверки)"
+    
+    pids = pids_probe['value']['pids']
+    if not pids:
+        return "❌ Остановлен"
+    
+    service_probe = results.get('bot_service', {})
+    if service_probe.get('ok') and service_probe['value']['state'] == 'active':
+        return f"✅ Запущен (systemd, {len(pids)} процессов)"
+    return f"✅ Запущен ({len(pids)} процессов)"
+
+def describe_system_status(results: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """Текстовые значения uptime, памяти, диска и нагрузки"""
+    described = {}
+    
+    uptime = results.get('uptime', {})
+    described['uptime'] = format_duration(uptime['value']['seconds']) if uptime.get('ok') else "❌ Ошибка"
+    
+    memory = results.get('meminfo', {})
+    if memory.get('ok'):
+        value = memory['value']
+        described['memory'] = f"{format_size(value['used'])}/{format_size(value['total'])}"
+    else:
+        described['memory'] = "❌ Ошибка"
+    
+    disk = results.get('statvfs', {})
+    if disk.get('ok'):
+        value = disk['value']
+        described['disk'] = f"{format_size(value['available'])} свободно из {format_size(value['total'])}"
+    else:
+        described['disk'] = "❌ Ошибка"
+    
+    load = results.get('loadavg', {})
+    if load.get('ok'):
+        value = load['value']
+        described['load'] = f"{value['load1']}, {value['load5']}, {value['load15']}"
+    else:
+        described['load'] = "❌ Ошибка"
+    
+    return described
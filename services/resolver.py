@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Кэш разрешения имен и параллельное подключение по нескольким адресам (happy eyeballs)
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from config import SSH_TIMEOUT
+from utils.cache import LRUCache
+
+RESOLVER_CACHE_SIZE = getattr(config, 'RESOLVER_CACHE_SIZE', 512)
+RESOLVER_TTL = getattr(config, 'RESOLVER_TTL', 300)
+# Неудачное разрешение тоже кэшируется, чтобы не ждать DNS на каждой попытке
+RESOLVER_NEGATIVE_TTL = getattr(config, 'RESOLVER_NEGATIVE_TTL', 30)
+# Пауза перед попыткой следующего адреса, если предыдущий еще не ответил (RFC 8305)
+HAPPY_EYEBALLS_DELAY = getattr(config, 'HAPPY_EYEBALLS_DELAY', 0.25)
+
+logger = logging.getLogger(__name__)
+
+Address = Tuple[int, tuple]
+
+def interleave_families(addresses: List[Address]) -> List[Address]:
+    """Чередовать IPv6 и IPv4, начиная с семейства первого адреса"""
+    by_family: Dict[int, List[Address]] = {}
+    for address in addresses:
+        by_family.setdefault(address[0], []).append(address)
+    groups = list(by_family.values())
+    result = []
+    for index in range(max((len(group) for group in groups), default=0)):
+        for group in groups:
+            if index < len(group):
+                result.append(group[index])
+    return result
+
+class HostResolver:
+    """
+    Асинхронное разрешение имен с TTL и кэшем неудач
+
+    Одновременные запросы одного имени ждут один вызов getaddrinfo.
+    Адрес, через который удалось подключиться, ставится первым.
+    """
+    
+    def __init__(self, ttl: float = RESOLVER_TTL, negative_ttl: float = RESOLVER_NEGATIVE_TTL,
+                 maxsize: int = RESOLVER_CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache = LRUCache(maxsize=maxsize)
+        self._inflight: Dict[Tuple[str, int], asyncio.Task] = {}
+        self.lookups = 0
+    
+    async def resolve(self, host: str, port: int) -> List[Address]:
+        """Адреса (family, sockaddr) для подключения; ошибка разрешения - socket.gaierror"""
+        key = (host, port)
+        cached = self.cache.get(key)
+        if isinstance(cached, OSError):
+            raise cached
+        if cached is not None:
+            return list(cached)
+        
+        task = self._inflight.get(key)
+        if task is None:
+            # Разрешение - отдельная задача: отмена одного из ожидающих (таймаут опроса)
+            # не прерывает его и не передает отмену остальным
+            task = asyncio.create_task(self._resolve(key))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        return list(await asyncio.shield(task))
+    
+    async def _resolve(self, key: Tuple[str, int]) -> List[Address]:
+        host, port = key
+        try:
+            addresses = await self._lookup(host, port)
+        except OSError as e:
+            if not _is_ip(host):
+                self.cache.set(key, e, ttl=self.negative_ttl)
+            raise
+        finally:
+            del self._inflight[key]
+        
+        self.cache.set(key, addresses, ttl=self.ttl)
+        return addresses
+    
+    async def _lookup(self, host: str, port: int) -> List[Address]:
+        self.lookups += 1
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            if (family, sockaddr) not in addresses:
+                addresses.append((family, sockaddr))
+        if not addresses:
+            raise socket.gaierror(socket.EAI_NONAME, f"нет адресов для {host}")
+        return interleave_families(addresses)
+    
+    def prefer(self, host: str, port: int, address: Address) -> None:
+        """Поставить адрес первым для следующих подключений"""
+        addresses = self.cache.get((host, port))
+        if isinstance(addresses, list) and address in addresses and addresses[0] != address:
+            addresses.remove(address)
+            addresses.insert(0, address)
+    
+    def invalidate(self, host: str, port: Optional[int] = None) -> None:
+        """Забыть адреса имени (все подключения не удались - возможно, адрес сменился)"""
+        self.cache.invalidate_where(lambda key: key[0] == host and (port is None or key[1] == port))
+    
+    async def connect(self, host: str, port: int, timeout: float = SSH_TIMEOUT,
+                      delay: float = HAPPY_EYEBALLS_DELAY) -> socket.socket:
+        """
+        Подключенный TCP сокет к host:port
+
+        Адреса пробуются наперегонки: следующий запускается через delay или сразу
+        после отказа предыдущего, побеждает первое установленное соединение.
+        Недоступный IPv6 адрес поэтому задерживает подключение не больше чем на delay.
+        """
+        addresses = await self.resolve(host, port)
+        try:
+            address, sock = await asyncio.wait_for(race_connect(addresses, delay), timeout)
+        except (asyncio.TimeoutError, OSError):
+            self.invalidate(host, port)
+            raise
+        if address != addresses[0]:
+            logger.debug(f"Подключение к {host} через {address[1][0]}: первый адрес не ответил")
+            self.prefer(host, port, address)
+        return sock
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # Все ожидающие могли уйти по таймауту - ошибку тогда некому прочитать
+    if not task.cancelled():
+        task.exception()
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+async def _connect_address(address: Address) -> socket.socket:
+    family, sockaddr = address
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, sockaddr)
+        return sock
+    except BaseException:
+        sock.close()
+        raise
+
+async def race_connect(addresses: List[Address], delay: float) -> Tuple[Address, socket.socket]:
+    """Подключиться к первому ответившему адресу; остальные попытки отменяются"""
+    remaining = list(addresses)
+    attempts: Dict[asyncio.Task, Address] = {}
+    pending: Set[asyncio.Task] = set()
+    errors: List[str] = []
+    
+    def start_next() -> None:
+        address = remaining.pop(0)
+        task = asyncio.create_task(_connect_address(address))
+        attempts[task] = address
+        pending.add(task)
+    
+    start_next()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=delay if remaining else None,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    return attempts[task], task.result()
+                errors.append(f"{attempts[task][1][0]}: {task.exception()}")
+            # Пауза истекла или адрес отказал - запускаем следующий
+            if remaining:
+                start_next()
+        raise OSError(f"не удалось подключиться ({'; '.join(errors)})")
+    finally:
+        for task in pending:
+            task.cancel()
+        for task in pending:
+            try:
+                sock = await task
+            except BaseException:
+                continue
+            sock.close()
+
+resolver = HostResolver()
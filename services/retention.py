@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Хранение журнала команд: сроки, лимиты и очистка выводов
+"""
+
+import logging
+from typing import Dict
+
+import config
+from database import compact_server_commands, enable_incremental_vacuum, is_incremental_vacuum
+from services.metrics import metrics_store
+from utils.tasks import PeriodicTask
+
+RETENTION_DAYS = getattr(config, 'RETENTION_DAYS', 30)
+RETENTION_MAX_ROWS_PER_SERVER = getattr(config, 'RETENTION_MAX_ROWS_PER_SERVER', 5000)
+# Переопределения для отдельных серверов: {server_id: {'days': 7, 'max_rows': 1000}}
+RETENTION_SERVER_OVERRIDES = getattr(config, 'RETENTION_SERVER_OVERRIDES', {})
+RETENTION_INTERVAL = getattr(config, 'RETENTION_INTERVAL', 3600)
+RETENTION_VACUUM_PAGES = getattr(config, 'RETENTION_VACUUM_PAGES', 2000)
+
+logger = logging.getLogger(__name__)
+
+_incremental_vacuum_checked = False
+
+async def ensure_incremental_vacuum() -> None:
+    """
+    Однократный перевод базы в режим инкрементальной очистки
+
+    Выполняется первым проходом очистки, а не при запуске: полный VACUUM
+    большой базы длится долго, и бот в это время уже отвечает (записи ждут).
+    """
+    global _incremental_vacuum_checked
+    if _incremental_vacuum_checked:
+        return
+    if not await is_incremental_vacuum():
+        logger.info("Включение инкрементальной очистки базы: выполняется полный VACUUM")
+        seconds = await enable_incremental_vacuum()
+        logger.info(f"Инкрементальная очистка базы включена, VACUUM занял {seconds:.1f} с")
+    _incremental_vacuum_checked = True
+
+async def run_retention() -> Dict[str, int]:
+    """Один проход очистки журнала команд"""
+    await ensure_incremental_vacuum()
+    stats = await compact_server_commands(
+        RETENTION_DAYS, RETENTION_MAX_ROWS_PER_SERVER,
+        RETENTION_SERVER_OVERRIDES, RETENTION_VACUUM_PAGES
+    )
+    logger.info(
+        f"Очистка журнала команд: устарело {stats['expired']}, сверх лимита {stats['trimmed']}, "
+        f"удаленных серверов {stats['orphaned']}, перенесено {stats['migrated']}, "
+        f"освобождено выводов {stats['collected']}, "
+        f"свободных страниц {stats['freelist_pages']}"
+    )
+    
+    stats['metrics_pruned'] = await metrics_store.prune()
+    if stats['metrics_pruned']:
+        logger.info(f"Очистка метрик: удалено агрегатов {stats['metrics_pruned']}")
+    return stats
+
+retention_task = PeriodicTask('retention', RETENTION_INTERVAL, run_retention, jitter=60, initial_delay=60)
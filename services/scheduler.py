@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Очереди команд по серверам: ограничение параллельности, допуск пользователей и справедливая очередь
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Hashable, Optional
+
+import config
+from utils.ratelimit import TokenBucket
+
+# Одновременных SSH сессий на сервер (ниже MaxStartups sshd по умолчанию)
+SCHEDULER_SERVER_CONCURRENCY = getattr(config, 'SCHEDULER_SERVER_CONCURRENCY', 4)
+# Долгих потоковых сессий (слежение за логом) на сервер - отдельно от мест для команд
+SCHEDULER_SERVER_STREAMS = getattr(config, 'SCHEDULER_SERVER_STREAMS', 2)
+# Команд пользователя в секунду и допустимая серия подряд
+SCHEDULER_USER_RATE = getattr(config, 'SCHEDULER_USER_RATE', 1.0)
+SCHEDULER_USER_BURST = getattr(config, 'SCHEDULER_USER_BURST', 5)
+# Дольше этого команда пользователя не ждет допуска - отклоняется сразу
+SCHEDULER_ADMISSION_WAIT = getattr(config, 'SCHEDULER_ADMISSION_WAIT', 5.0)
+# Ожидание в очереди дольше этого попадает в журнал
+SCHEDULER_SLOW_WAIT = 2.0
+
+# Классы приоритета: команды пользователей раньше фонового мониторинга
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+logger = logging.getLogger(__name__)
+
+class _ServerQueue:
+    """Очередь одного сервера: приоритет -> пользователь -> ожидающие по порядку"""
+    
+    def __init__(self):
+        self.active = 0
+        self.queues: Dict[int, 'OrderedDict[Hashable, Deque[asyncio.Future]]'] = {
+            priority: OrderedDict() for priority in PRIORITY_NAMES
+        }
+    
+    def depth(self) -> int:
+        return sum(len(waiters) for queue in self.queues.values() for waiters in queue.values())
+
+class CommandScheduler:
+    """
+    Планировщик SSH команд
+
+    На каждом сервере выполняется не больше server_concurrency команд; остальные ждут.
+    Освободившееся место получает очередь высшего приоритета, внутри нее пользователи
+    обслуживаются по кругу - по одной команде, поэтому поток команд одного пользователя
+    не задерживает остальных. Команды пользователя допускаются ведром токенов.
+    Потоковые сессии занимают свой класс мест: не больше server_streams на сервер,
+    сверх этого новая сессия отклоняется, а не ждет.
+    """
+    
+    def __init__(self, server_concurrency: int = SCHEDULER_SERVER_CONCURRENCY,
+                 user_rate: float = SCHEDULER_USER_RATE, user_burst: float = SCHEDULER_USER_BURST,
+                 admission_wait: float = SCHEDULER_ADMISSION_WAIT, server_streams: int = SCHEDULER_SERVER_STREAMS):
+        self.server_concurrency = server_concurrency
+        self.server_streams = server_streams
+        self._streams: Dict[int, int] = {}
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.admission_wait = admission_wait
+        self._servers: Dict[int, _ServerQueue] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self.rejected = 0
+        self.waits: Dict[int, Dict[str, float]] = {
+            priority: {'count': 0, 'queued': 0, 'total': 0.0, 'max': 0.0} for priority in PRIORITY_NAMES
+        }
+    
+    async def admit(self, user_id: int) -> Optional[str]:
+        """
+        Допуск команды пользователя: None или текст отказа
+
+        Токен резервируется сразу, поэтому ожидание следующей команды учитывает
+        уже ждущие допуска и ограничено admission_wait.
+        """
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        
+        delay = bucket.delay()
+        if delay > self.admission_wait:
+            self.rejected += 1
+            return f"❌ Слишком много команд, повторите через {delay:.0f} с"
+        delay = bucket.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return None
+    
+    @asynccontextmanager
+    async def slot(self, server_id: int, user_id: Optional[int], priority: int = PRIORITY_INTERACTIVE):
+        """Дождаться места на сервере с учетом приоритета и очереди пользователей"""
+        queue = self._servers.get(server_id)
+        if queue is None:
+            queue = self._servers[server_id] = _ServerQueue()
+        
+        started = time.monotonic()
+        if queue.active < self.server_concurrency and not queue.depth():
+            queue.active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            queue.queues[priority].setdefault(user_id, deque()).append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Место уже выделено - вернуть его следующему
+                    self._release(server_id, queue)
+                else:
+                    self._discard(queue, priority, user_id, future)
+                raise
+        self._record_wait(priority, time.monotonic() - started, server_id)
+        
+        try:
+            yield
+        finally:
+            self._release(server_id, queue)
+    
+    @asynccontextmanager
+    async def stream(self, server_id: int):
+        """Место для долгой потоковой сессии; RuntimeError, если все заняты"""
+        active = self._streams.get(server_id, 0)
+        if active >= self.server_streams:
+            self.rejected += 1
+            raise RuntimeError(f"заняты все места потоковых сессий сервера ({active}), повторите позже")
+        self._streams[server_id] = active + 1
+        try:
+            yield
+        finally:
+            self._streams[server_id] -= 1
+            if not self._streams[server_id]:
+                del self._streams[server_id]
+    
+    def _release(self, server_id: int, queue: _ServerQueue) -> None:
+        queue.active -= 1
+        while queue.active < self.server_concurrency:
+            future = self._next_waiter(queue)
+            if future is None:
+                break
+            queue.active += 1
+            future.set_result(None)
+        
+        if not queue.active and not queue.depth():
+            self._servers.pop(server_id, None)
+    
+    @staticmethod
+    def _next_waiter(queue: _ServerQueue) -> Optional[asyncio.Future]:
+        for priority in sorted(queue.queues):
+            users = queue.queues[priority]
+            while users:
+                # Круговой обход: первый пользователь отдает одну команду и уходит в конец
+                user_id, waiters = users.popitem(last=False)
+                future = waiters.popleft()
+                if waiters:
+                    users[user_id] = waiters
+                if not future.done():
+                    return future
+        return None
+    
+    @staticmethod
+    def _discard(queue: _ServerQueue, priority: int, user_id: Optional[int], future: asyncio.Future) -> None:
+        waiters = queue.queues[priority].get(user_id)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del queue.queues[priority][user_id]
+    
+    def _record_wait(self, priority: int, waited: float, server_id: int) -> None:
+        stats = self.waits[priority]
+        stats['count'] += 1
+        if waited > 0.001:
+            stats['queued'] += 1
+        stats['total'] += waited
+        stats['max'] = max(stats['max'], waited)
+        if waited > SCHEDULER_SLOW_WAIT:
+            logger.warning(f"Команда ({PRIORITY_NAMES[priority]}) ждала очереди сервера {server_id} {waited:.1f} с")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очередей, занятые места и время ожидания по классам"""
+        return {
+            'servers': {
+                server_id: {'active': queue.active, 'queued': queue.depth()}
+                for server_id, queue in self._servers.items()
+            },
+            'queued': sum(queue.depth() for queue in self._servers.values()),
+            'streams': sum(self._streams.values()),
+            'rejected': self.rejected,
+            'waits': {
+                PRIORITY_NAMES[priority]: {
+                    'count': stats['count'],
+                    'queued': stats['queued'],
+                    'avg': stats['total'] / stats['count'] if stats['count'] else 0.0,
+                    'max': stats['max']
+                }
+                for priority, stats in self.waits.items()
+            }
+        }
+
+command_scheduler = CommandScheduler()
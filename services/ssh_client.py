@@ -3,103 +3,56 @@
 Модуль для SSH подключений и выполнения команд
 """
 
-import paramiko
 import asyncio
-from typing import Tuple, Dict, Any
-from config import SSH_TIMEOUT, ALLOWED_SSH_COMMANDS
+import asyncssh
+from contextlib import asynccontextmanager
+from typing import Tuple, Dict, Any, Optional
+from config import SSH_TIMEOUT
+from services.circuit_breaker import ServerUnavailable
+from services.command_cache import command_cache, command_ttl
+from services.command_policy import command_policy, is_safe_command
+from services.scheduler import command_scheduler, PRIORITY_INTERACTIVE
+from services.ssh_pool import ssh_pool
+from services.audit import audit_writer
 
-def is_safe_command(command: str) -> bool:
-    """Проверка безопасности команды"""
-    command_lower = command.lower().strip()
-    
-    # Разрешаем базовые команды для статуса системы
-    basic_commands = ['uptime', 'free -h', 'df -h', 'whoami', 'pwd']
-    if command_lower in basic_commands:
-        return True
-    
-    # Разрешаем команды с параметрами для статуса
-    if any(command_lower.startswith(cmd) for cmd in ['free ', 'df ', 'cat /proc/loadavg']):
-        return True
-    
-    # Разрешаем команды для управления процессами
-    process_commands = ['ps ', 'pgrep ', 'pkill -f ', 'kill ']
-    if any(command_lower.startswith(cmd) for cmd in process_commands):
-        # Проверяем, что это не опасные варианты
-        dangerous_patterns = ['-9', 'killall', 'rm -rf']
-        if not any(pattern in command_lower for pattern in dangerous_patterns):
-            return True
-    
-    # Разрешаем команды для управления сервисами
-    if any(command_lower.startswith(cmd) for cmd in ['systemctl ', 'journalctl ']):
-        return True
-    
-    # Разрешаем команды для работы с файлами (ограниченно)
-    if any(command_lower.startswith(cmd) for cmd in ['tail ', 'cd ', 'ls ', 'cat ']):
-        return True
-    
-    # Разрешаем screen команды
-    if command_lower.startswith('screen '):
-        return True
-    
-    # Разрешаем команды для запуска/остановки ботов
-    bot_commands = ['nohup python', 'python3 ', 'pkill -f python']
-    if any(cmd in command_lower for cmd in bot_commands):
-        # Проверяем, что это не опасные варианты
-        dangerous_patterns = ['-9', 'killall', 'rm -rf', '; rm', '| rm']
-        if not any(pattern in command_lower for pattern in dangerous_patterns):
-            return True
-    
-    # Запрещаем явно опасные команды
-    dangerous_patterns = [
-        'rm -rf', 'dd if=', 'mkfs', 'shutdown', 'reboot', 
-        'halt', 'poweroff', 'chmod 777', ':(){:|:&};:',
-        'mv / /dev/null', '> /dev/sda', 'mkfs.ext3 /dev/sda1',
-        'wget ', 'curl ', 'bash -c', 'sh -c'
-    ]
+def _with_directory(server_config: Dict[str, Any], command: str) -> str:
+    """Выполнять команду в рабочем каталоге бота, если он указан"""
+    if server_config.get('bot_directory'):
+        return f"cd {server_config['bot_directory']} && {command}"
+    return command
+
+async def execute_ssh_command(server_config: Dict[str, Any], command: str,
+                              timeout: Optional[float] = None) -> Tuple[bool, str]:
+    """Выполнение команды по SSH (timeout по умолчанию - SSH_TIMEOUT)"""
+    if not server_config.get('private_key') and not server_config.get('password'):
+        return False, "❌ Не указаны учетные данные для подключения"
     
-    if any(pattern in command_lower for pattern in dangerous_patterns):
-        return False
+    # Устанавливаем рабочий каталог если указан
+    full_command = _with_directory(server_config, command)
+    timeout = timeout or SSH_TIMEOUT
     
-    # Разрешаем команды из белого списка
-    first_word = command_lower.split()[0] if command_lower else ''
-    return first_word in ALLOWED_SSH_COMMANDS
-
-async def execute_ssh_command(server_config: Dict[str, Any], command: str) -> Tuple[bool, str]:
-    """Выполнение команды по SSH"""
-    ssh = None
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
-        connect_args = {
-            'hostname': server_config['hostname'],
-            'port': server_config.get('port', 22),
-            'username': server_config['username'],
-            'timeout': SSH_TIMEOUT
-        }
-        
-        if server_config.get('private_key'):
-            key = paramiko.RSAKey.from_private_key_file(server_config['private_key'])
-            connect_args['pkey'] = key
-        elif server_config.get('password'):
-            connect_args['password'] = server_config['password']
-        else:
-            return False, "❌ Не указаны учетные данные для подключения"
-        
-        ssh.connect(**connect_args)
-        
-        # Устанавливаем рабочий каталог если указан
-        if server_config.get('bot_directory'):
-            full_command = f"cd {server_config['bot_directory']} && {command}"
-        else:
-            full_command = command
-        
-        # Выполняем команду с таймаутом
-        stdin, stdout, stderr = ssh.exec_command(full_command, timeout=SSH_TIMEOUT)
-        exit_code = stdout.channel.recv_exit_status()
+        for attempt in range(2):
+            try:
+                async with ssh_pool.connection(server_config) as conn:
+                    # Выполняем команду с таймаутом, не блокируя цикл событий
+                    result = await conn.run(full_command, check=False, timeout=timeout,
+                                            encoding='utf-8', errors='ignore')
+                break
+            except asyncssh.ChannelOpenError:
+                # Соединение из пула оказалось разорванным, канал не открылся и команда
+                # не запускалась - переподключаемся один раз
+                ssh_pool.invalidate(server_config['id'])
+                if attempt:
+                    raise
+            except asyncssh.ConnectionLost:
+                # Команда могла уже выполниться на сервере - не повторяем
+                ssh_pool.invalidate(server_config['id'])
+                raise
         
-        output = stdout.read().decode('utf-8', errors='ignore').strip()
-        error = stderr.read().decode('utf-8', errors='ignore').strip()
+        output = (result.stdout or '').strip()
+        error = (result.stderr or '').strip()
+        exit_code = result.exit_status
         
         if exit_code == 0:
             return True, output if output else "✅ Команда выполнена успешно"
@@ -107,47 +60,98 @@ async def execute_ssh_command(server_config: Dict[str, Any], command: str) -> Tu
             error_msg = error if error else f"❌ Ошибка выполнения (код: {exit_code})"
             return False, error_msg
             
-    except paramiko.AuthenticationException:
+    except ServerUnavailable as e:
+        return False, f"❌ {e}"
+    except asyncssh.PermissionDenied:
         return False, "❌ Ошибка аутентификации SSH"
-    except paramiko.SSHException as e:
+    except asyncio.TimeoutError:
+        return False, f"❌ Превышено время ожидания ({timeout:g} с)"
+    except asyncssh.Error as e:
         return False, f"❌ Ошибка SSH: {str(e)}"
     except Exception as e:
         return False, f"❌ Ошибка подключения: {str(e)}"
-    finally:
-        if ssh:
-            ssh.close()
 
-async def execute_server_command(server_id: int, user_id: int, command: str) -> Tuple[bool, str]:
-    """Выполнить команду на сервере"""
+async def execute_server_command(server_id: int, user_id: int, command: str,
+                                 trusted: bool = False, timeout: Optional[float] = None,
+                                 cache_ttl: Optional[float] = None,
+                                 priority: int = PRIORITY_INTERACTIVE, audit: bool = True,
+                                 admission: bool = True) -> Tuple[bool, str]:
+    """
+    Выполнить команду на сервере
+    
+    Args:
+        trusted: Команда собрана самим ботом (пакет проб и т.п.) и не проходит проверку безопасности
+        timeout: Время выполнения для длительных скриптов (по умолчанию SSH_TIMEOUT)
+        cache_ttl: Время жизни результата скрипта только для чтения. Без него время
+            пользовательской команды определяется по ее классу, а скрипт бота
+            считается изменяющим и сбрасывает кэш сервера
+        priority: Класс очереди сервера; команды пользователя проходят допуск по частоте
+        admission: Проверить частоту команд пользователя. False - действие уже прошло
+            допуск целиком (опрос нескольких серверов одной командой)
+        audit: Записать команду в журнал. Фоновые опросы не записываются, чтобы
+            не вытеснять историю команд пользователя при очистке журнала
+    """
     from database import get_server_config
     
-    server_config = get_server_config(server_id, user_id)
+    server_config = await get_server_config(server_id, user_id)
     if not server_config:
         return False, "❌ Сервер не найден"
     
-    if not is_safe_command(command):
-        return False, f"❌ Команда не разрешена для безопасности: {command}"
+    if not trusted:
+        allowed, reason = command_policy.check(command, user_id)
+        if not allowed:
+            return False, f"❌ Команда не разрешена для безопасности ({reason}): {command}"
     
-    try:
-        # Выполняем команду
-        success, result = await execute_ssh_command(server_config, command)
+    async def execute() -> Tuple[bool, str]:
+        if priority == PRIORITY_INTERACTIVE and admission:
+            rejection = await command_scheduler.admit(user_id)
+            if rejection:
+                return False, rejection
         
-        # Сохраняем результат в базу
-        from database import get_db_connection
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-            INSERT INTO server_commands (server_id, command, result, success)
-            VALUES (?, ?, ?, ?)
-            ''', (server_id, command, result, success))
-            conn.commit()
-        except Exception as e:
-            pass  # Логируем, но не прерываем выполнение
-        finally:
-            conn.close()
+        # Не больше SCHEDULER_SERVER_CONCURRENCY сессий на сервер, пользователи - по очереди
+        async with command_scheduler.slot(server_id, user_id, priority):
+            success, result = await execute_ssh_command(server_config, command, timeout)
         
+        # Сохраняем результат в журнал (запись в базу - в фоне, пакетами)
+        if audit:
+            await audit_writer.record(server_id, command, result, success)
         return success, result
+    
+    if cache_ttl is None:
+        cache_ttl = None if trusted else command_ttl(command)
+    
+    try:
+        # Одинаковые команды только для чтения выполняются один раз и кэшируются
+        return await command_cache.run(server_id, command, cache_ttl, execute)
         
     except Exception as e:
-        return False, f"❌ Ошибка выполнения: {str(e)}"
\ No newline at end of file
+        return False, f"❌ Ошибка выполнения: {str(e)}"
+
+@asynccontextmanager
+async def open_server_process(server_id: int, user_id: int, command: str):
+    """
+    Запустить долгоживущую команду на сервере для потокового чтения вывода
+    
+    Команда должна быть собрана самим ботом: проверка безопасности не выполняется.
+    stderr объединяется с stdout. Ошибки подключения передаются исключениями.
+    Сессия проходит допуск пользователя и занимает место потоковой сессии сервера.
+    """
+    from database import get_server_config
+    
+    server_config = await get_server_config(server_id, user_id)
+    if not server_config:
+        raise RuntimeError("Сервер не найден")
+    if not server_config.get('private_key') and not server_config.get('password'):
+        raise RuntimeError("Не указаны учетные данные для подключения")
+    
+    rejection = await command_scheduler.admit(user_id)
+    if rejection:
+        raise RuntimeError(rejection.removeprefix("❌ "))
+    
+    async with command_scheduler.stream(server_id), ssh_pool.connection(server_config) as conn:
+        process = await conn.create_process(_with_directory(server_config, command),
+                                            stderr=asyncssh.STDOUT, encoding='utf-8', errors='ignore')
+        try:
+            yield process
+        finally:
+            process.close()
\ No newline at end of file
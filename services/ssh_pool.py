@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Пул постоянных SSH соединений с серверами
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Tuple
+
+import asyncssh
+
+import config
+from config import SSH_TIMEOUT
+from services.circuit_breaker import circuit_breaker
+from services.resolver import resolver
+
+SSH_POOL_IDLE_TTL = getattr(config, 'SSH_POOL_IDLE_TTL', 300)
+SSH_KEEPALIVE_INTERVAL = getattr(config, 'SSH_KEEPALIVE_INTERVAL', 30)
+SSH_KEEPALIVE_COUNT_MAX = getattr(config, 'SSH_KEEPALIVE_COUNT_MAX', 3)
+SSH_MAX_CHANNELS_PER_CONNECTION = getattr(config, 'SSH_MAX_CHANNELS_PER_CONNECTION', 8)
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, означающие недоступность сервера (а не отказ в аутентификации)
+UNREACHABLE_ERRORS = (OSError, asyncio.TimeoutError, asyncssh.ConnectionLost)
+
+# Поля конфигурации, изменение которых требует нового подключения
+CONNECTION_FIELDS = ('hostname', 'port', 'username', 'password', 'private_key')
+
+def connection_fingerprint(server_config: Dict[str, Any]) -> Tuple:
+    """Отпечаток параметров подключения сервера"""
+    return tuple(server_config.get(field) for field in CONNECTION_FIELDS)
+
+def build_connect_args(server_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Параметры asyncssh.connect для сервера"""
+    connect_args = {
+        'host': server_config['hostname'],
+        'port': server_config.get('port', 22),
+        'username': server_config['username'],
+        'known_hosts': None,
+        'connect_timeout': SSH_TIMEOUT,
+        'keepalive_interval': SSH_KEEPALIVE_INTERVAL,
+        'keepalive_count_max': SSH_KEEPALIVE_COUNT_MAX
+    }
+
+    if server_config.get('private_key'):
+        connect_args['client_keys'] = [server_config['private_key']]
+    elif server_config.get('password'):
+        connect_args['password'] = server_config['password']
+
+    return connect_args
+
+class _PoolClient(asyncssh.SSHClient):
+    """Клиент, отмечающий разрыв соединения"""
+
+    def __init__(self):
+        self.closed = False
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.closed = True
+
+class _PooledConnection:
+    """Соединение пула и его счетчики"""
+
+    def __init__(self, conn: asyncssh.SSHClientConnection, client: _PoolClient, fingerprint: Tuple):
+        self.conn = conn
+        self.client = client
+        self.fingerprint = fingerprint
+        self.channels = asyncio.Semaphore(SSH_MAX_CHANNELS_PER_CONNECTION)
+        self.active = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return not self.client.closed
+
+    def close(self) -> None:
+        self.conn.close()
+
+class SSHConnectionPool:
+    """Пул аутентифицированных SSH соединений, ключ - ID сервера"""
+
+    def __init__(self, idle_ttl: float = SSH_POOL_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._entries: Dict[int, _PooledConnection] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._reaper_task: Optional[asyncio.Task] = None
+
+    async def _get_entry(self, server_config: Dict[str, Any], probing: bool = False) -> _PooledConnection:
+        """
+        Получить живое соединение или установить новое
+
+        Пока сервер считается недоступным, новое подключение не выполняется
+        (ServerUnavailable); probing - пробное подключение размыкателя.
+        """
+        server_id = server_config['id']
+        fingerprint = connection_fingerprint(server_config)
+        lock = self._locks.setdefault(server_id, asyncio.Lock())
+
+        async with lock:
+            entry = self._entries.get(server_id)
+            if entry and entry.alive and entry.fingerprint == fingerprint:
+                return entry
+
+            if entry:
+                self._drop(server_id)
+
+            if not probing:
+                circuit_breaker.check(server_id)
+
+            client = _PoolClient()
+            connect_args = build_connect_args(server_config)
+            try:
+                # Имя разрешается через кэш, адреса IPv6 и IPv4 пробуются наперегонки
+                sock = await resolver.connect(connect_args['host'], connect_args['port'])
+                conn = await asyncssh.connect(client_factory=lambda: client, sock=sock, **connect_args)
+            except UNREACHABLE_ERRORS as e:
+                if not probing:
+                    circuit_breaker.record_failure(server_id, e,
+                                                   lambda: self._get_entry(server_config, probing=True))
+                raise
+            circuit_breaker.record_success(server_id)
+            entry = _PooledConnection(conn, client, fingerprint)
+            self._entries[server_id] = entry
+            self._ensure_reaper()
+            logger.debug(f"Открыто SSH соединение с сервером {server_id}")
+            return entry
+
+    @asynccontextmanager
+    async def connection(self, server_config: Dict[str, Any]):
+        """Занять канал на соединении сервера"""
+        entry = await self._get_entry(server_config)
+
+        async with entry.channels:
+            entry.active += 1
+            try:
+                yield entry.conn
+            finally:
+                entry.active -= 1
+                entry.last_used = time.monotonic()
+
+    def _drop(self, server_id: int) -> None:
+        entry = self._entries.pop(server_id, None)
+        if entry:
+            entry.close()
+
+    def invalidate(self, server_id: int) -> None:
+        """Закрыть соединение сервера (смена учетных данных или удаление)"""
+        if server_id in self._entries:
+            logger.debug(f"Сброшено SSH соединение с сервером {server_id}")
+        self._drop(server_id)
+
+    def evict_idle(self) -> int:
+        """Закрыть простаивающие и разорванные соединения"""
+        now = time.monotonic()
+        expired = [
+            server_id for server_id, entry in self._entries.items()
+            if not entry.alive or (entry.active == 0 and now - entry.last_used > self.idle_ttl)
+        ]
+        for server_id in expired:
+            self._drop(server_id)
+        return len(expired)
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper_task is None or self._reaper_task.done():
+            self._reaper_task = asyncio.create_task(self._reaper())
+
+    async def _reaper(self) -> None:
+        interval = max(1.0, min(self.idle_ttl / 2, 30.0))
+        while self._entries:
+            await asyncio.sleep(interval)
+            evicted = self.evict_idle()
+            if evicted:
+                logger.debug(f"Закрыто простаивающих SSH соединений: {evicted}")
+
+    async def close_all(self) -> None:
+        """Закрыть все соединения пула"""
+        if self._reaper_task:
+            self._reaper_task.cancel()
+            self._reaper_task = None
+
+        entries = list(self._entries.values())
+        self._entries.clear()
+        for entry in entries:
+            entry.close()
+        for entry in entries:
+            try:
+                await entry.conn.wait_closed()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """Статистика пула"""
+        return {
+            'connections': len(self._entries),
+            'active_channels': sum(entry.active for entry in self._entries.values())
+        }
+
+ssh_pool = SSHConnectionPool()
@@ -4,6 +4,8 @@
 """
 
 import asyncio
+import re
+import shlex
 from typing import Tuple
 from services.ssh_client import execute_server_command
 
@@ -37,7 +39,8 @@ WantedBy=multi-user.target
     
     results = []
     for cmd in commands:
-        success, result = await execute_server_command(server_id, user_id, cmd)
+        # Команды собраны ботом (запись юнита через tee) - политика пользовательских команд не применяется
+        success, result = await execute_server_command(server_id, user_id, cmd, trusted=True)
         results.append((success, result))
         if not success:
             return False, f"Ошибка при создании сервиса: {result}"
@@ -46,8 +49,8 @@ WantedBy=multi-user.target
 
 async def check_systemd_service(server_id: int, user_id: int, service_name: str) -> Tuple[bool, str]:
     """Проверка существования systemd сервиса"""
-    check_cmd = f"systemctl list-unit-files | grep -E '^{service_name}\\.service'"
-    success, result = await execute_server_command(server_id, user_id, check_cmd)
+    check_cmd = f"systemctl list-unit-files | grep -E {shlex.quote('^' + re.escape(service_name) + '[.]service')}"
+    success, result = await execute_server_command(server_id, user_id, check_cmd, trusted=True)
     
     if success and service_name in result:
         return True, "✅ Сервис существует"
@@ -60,8 +63,8 @@ async def manage_systemd_service(server_id: int, user_id: int, service_name: str
     if action not in actions:
         return False, f"❌ Неподдерживаемое действие: {action}"
     
-    cmd = f"sudo systemctl {action} {service_name}"
-    success, result = await execute_server_command(server_id, user_id, cmd)
+    cmd = f"sudo systemctl {action} {shlex.quote(service_name)}"
+    success, result = await execute_server_command(server_id, user_id, cmd, trusted=True)
     
     if success:
         return True, f"✅ Команда '{action}' выполнена успешно"
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Автоматический перезапуск остановившегося бота
+"""
+
+import asyncio
+import logging
+import shlex
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import config
+from database import get_bot_watchdogs, mark_watchdog_crash_loop, mark_watchdog_held
+from services.bot_control import start_bot
+from services.fleet import fan_out, FLEET_OK
+from services.probes import bot_probes, run_probe_bundle
+from services.scheduler import PRIORITY_BACKGROUND
+from services.ssh_client import execute_server_command
+from utils.outbound import outbound
+from utils.tasks import PeriodicTask
+
+# Проверка только процесса бота - чаще общего опроса, чтобы простой был секундами
+WATCHDOG_CHECK_INTERVAL = getattr(config, 'WATCHDOG_CHECK_INTERVAL', 10)
+# Пауза перед следующим перезапуском: base * 2^(попытки без стабильной работы - 1), не больше max
+WATCHDOG_BACKOFF_BASE = getattr(config, 'WATCHDOG_BACKOFF_BASE', 5)
+WATCHDOG_BACKOFF_MAX = getattr(config, 'WATCHDOG_BACKOFF_MAX', 300)
+# Столько перезапусков за окно - циклические падения, перезапуски прекращаются
+WATCHDOG_CRASH_LOOP_RESTARTS = getattr(config, 'WATCHDOG_CRASH_LOOP_RESTARTS', 5)
+WATCHDOG_CRASH_LOOP_WINDOW = getattr(config, 'WATCHDOG_CRASH_LOOP_WINDOW', 600)
+# Бот, проработавший столько после перезапуска, считается восстановленным - пауза сбрасывается
+WATCHDOG_STABLE_SECONDS = getattr(config, 'WATCHDOG_STABLE_SECONDS', 120)
+WATCHDOG_LOG_LINES = 30
+
+logger = logging.getLogger(__name__)
+
+def watchdog_backoff(attempts: int, base: float = WATCHDOG_BACKOFF_BASE,
+                     maximum: float = WATCHDOG_BACKOFF_MAX) -> float:
+    """Пауза перед следующей попыткой после attempts перезапусков, за которыми бот не проработал стабильно"""
+    if attempts <= 0:
+        return 0.0
+    return min(maximum, base * 2 ** (attempts - 1))
+
+def build_log_tail_script(bot_filename: str, service_name: Optional[str], lines: int = WATCHDOG_LOG_LINES) -> str:
+    """Хвост лога бота: файл рядом со скриптом, иначе журнал systemd"""
+    log_file = shlex.quote(bot_filename.replace('.py', '.log'))
+    script = f"tail -n {lines} {log_file} 2>/dev/null"
+    if service_name:
+        script += f" || journalctl -u {shlex.quote(service_name)} -n {lines} --no-pager 2>/dev/null"
+    return script
+
+class BotWatchdog:
+    """
+    Перезапуск бота на серверах с включенным автоперезапуском
+
+    Остановка замечается собственной быстрой проверкой (только pgrep и systemctl)
+    и снимками монитора состояния. Неудачные попытки повторяются с экспоненциальной
+    паузой; WATCHDOG_CRASH_LOOP_RESTARTS перезапусков за WATCHDOG_CRASH_LOOP_WINDOW
+    останавливают перезапуски до повторного включения.
+    """
+    
+    def __init__(self, interval: float = WATCHDOG_CHECK_INTERVAL):
+        self.task = PeriodicTask('bot_watchdog', interval, self.check_all, initial_delay=interval)
+        self.bot = None
+        self._servers: Dict[int, Dict[str, Any]] = {}
+        self._states: Dict[int, Dict[str, Any]] = {}
+        self._restarting: Dict[int, asyncio.Task] = {}
+        self.restarts = 0
+    
+    async def start(self, bot) -> None:
+        """Загрузить серверы с автоперезапуском и запустить проверку; bot - для уведомлений"""
+        self.bot = bot
+        await self.reload()
+        self.task.start()
+    
+    async def stop(self) -> None:
+        await self.task.stop()
+        for task in list(self._restarting.values()):
+            task.cancel()
+        self._restarting.clear()
+    
+    async def reload(self) -> None:
+        """Перечитать серверы (после включения или выключения)"""
+        servers = {server['id']: server for server in await get_bot_watchdogs()}
+        self._servers = servers
+        for server_id in [server_id for server_id in self._states if server_id not in servers]:
+            del self._states[server_id]
+        for server_id, server in servers.items():
+            state = self._state(server_id)
+            if state['crash_loop_at'] and not server['crash_loop_at']:
+                # Включен повторно после циклических падений - счет начинается заново
+                state['restarts'].clear()
+                state['attempts'] = 0
+                state['next_attempt_at'] = 0.0
+            state['crash_loop_at'] = server['crash_loop_at']
+            state['held'] = server['held']
+    
+    def _state(self, server_id: int) -> Dict[str, Any]:
+        state = self._states.get(server_id)
+        if state is None:
+            state = self._states[server_id] = {
+                'restarts': deque(), 'attempts': 0, 'next_attempt_at': 0.0, 'down_since': None,
+                'restarted_at': None, 'crash_loop_at': None, 'held': False
+            }
+        return state
+    
+    async def hold(self, server_id: int) -> None:
+        """
+        Не перезапускать бота (остановлен вручную) до следующего ручного запуска
+
+        Начатый перезапуск отменяется и дожидается, чтобы он не запустил бота
+        после остановки. Признак сохраняется в базе.
+        """
+        if server_id not in self._servers:
+            return
+        self._state(server_id)['held'] = True
+        task = self._restarting.get(server_id)
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self._save_held(server_id, True)
+    
+    async def release(self, server_id: int) -> None:
+        """Снять ручную остановку"""
+        if server_id not in self._servers:
+            return
+        self._state(server_id)['held'] = False
+        await self._save_held(server_id, False)
+    
+    async def _save_held(self, server_id: int, held: bool) -> None:
+        try:
+            await mark_watchdog_held(server_id, held)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить ручную остановку сервера {server_id}: {e}")
+    
+    def status(self, server_id: int) -> Optional[Dict[str, Any]]:
+        """Состояние автоперезапуска сервера или None, если он выключен"""
+        if server_id not in self._servers:
+            return None
+        state = self._state(server_id)
+        return {
+            'crash_loop_at': state['crash_loop_at'],
+            'held': state['held'],
+            'restarts': len(state['restarts']),
+            'next_attempt_at': state['next_attempt_at'] if state['attempts'] else None
+        }
+    
+    async def check_all(self) -> None:
+        """Быстрая проверка процесса бота на всех серверах с автоперезапуском"""
+        servers = [server for server_id, server in self._servers.items() if self._should_check(server_id)]
+        if not servers:
+            return
+        
+        async def probe(server: Dict[str, Any]):
+            probes = bot_probes(server['filename'] or 'bot.py', server['service_name'])
+            return await run_probe_bundle(server['id'], server['user_id'], probes, PRIORITY_BACKGROUND,
+                                          audit=False)
+        
+        async for server, status, result, _ in fan_out(servers, probe):
+            if status == FLEET_OK:
+                self._observe(server, result)
+    
+    async def on_snapshot(self, server: Dict[str, Any], snapshot: Dict[str, Any],
+                          previous: Optional[Dict[str, Any]]) -> None:
+        """Подписчик монитора состояния: снимок тоже показывает, запущен ли бот"""
+        watched = self._servers.get(snapshot['server_id'])
+        if watched and snapshot['ok'] and self._should_check(watched['id']):
+            self._observe(watched, snapshot['results'])
+    
+    def _should_check(self, server_id: int) -> bool:
+        state = self._state(server_id)
+        return not state['crash_loop_at'] and not state['held'] and server_id not in self._restarting
+    
+    def _observe(self, server: Dict[str, Any], results: Dict[str, Dict[str, Any]]) -> None:
+        probe = results.get('bot_pids', {})
+        if not probe.get('ok'):
+            # Ошибка проверки - не повод перезапускать
+            return
+        
+        now = time.time()
+        state = self._state(server['id'])
+        if probe['value']['pids']:
+            state['down_since'] = None
+            if state['restarted_at'] and now - state['restarted_at'] >= WATCHDOG_STABLE_SECONDS:
+                state['attempts'] = 0
+                state['next_attempt_at'] = 0.0
+            return
+        
+        if state['down_since'] is None:
+            state['down_since'] = now
+        if now < state['next_attempt_at'] or not self._should_check(server['id']):
+            return
+        self._restarting[server['id']] = asyncio.create_task(self._restart(server, state))
+    
+    async def _restart(self, server: Dict[str, Any], state: Dict[str, Any]) -> None:
+        try:
+            now = time.time()
+            restarts: Deque[float] = state['restarts']
+            while restarts and now - restarts[0] > WATCHDOG_CRASH_LOOP_WINDOW:
+                restarts.popleft()
+            if len(restarts) >= WATCHDOG_CRASH_LOOP_RESTARTS:
+                await self._crash_loop(server, state, now)
+                return
+            
+            result = await start_bot(server['id'], server['user_id'],
+                                     {'bot_filename': server['filename'], 'service_name': server['service_name']},
+                                     priority=PRIORITY_BACKGROUND, admission=False)
+            if result['error'] is None:
+                # Скрипт запуска выполнился - попытка считается перезапуском (ошибка SSH - нет)
+                restarts.append(now)
+                self.restarts += 1
+            
+            if result['ok']:
+                state['restarted_at'] = time.time()
+                downtime = state['restarted_at'] - state['down_since'] if state['down_since'] else None
+                state['down_since'] = None
+                # Пауза до следующей попытки растет, пока бот не проработает WATCHDOG_STABLE_SECONDS
+                state['attempts'] += 1
+                state['next_attempt_at'] = state['restarted_at'] + watchdog_backoff(state['attempts'])
+                text = f"🔁 {server['name']} (ID: {server['id']}): бот перезапущен"
+                if result['method']:
+                    text += f" ({result['method']})"
+                if downtime is not None:
+                    text += f", простой {downtime:.0f} с"
+                await self._send(server, text)
+                return
+            
+            state['attempts'] += 1
+            delay = watchdog_backoff(state['attempts'])
+            state['next_attempt_at'] = time.time() + delay
+            reason = result['error'] or '; '.join(f"{method}: {why}" for method, why in result.get('attempts', []))
+            await self._send(server, f"⚠️ {server['name']} (ID: {server['id']}): не удалось перезапустить бота"
+                                     f" ({reason or 'не запустился'}), следующая попытка через {delay:.0f} с")
+        except Exception as e:
+            logger.error(f"Ошибка автоперезапуска на сервере {server['id']}: {e}", exc_info=True)
+        finally:
+            self._restarting.pop(server['id'], None)
+    
+    async def _crash_loop(self, server: Dict[str, Any], state: Dict[str, Any], now: float) -> None:
+        state['crash_loop_at'] = now
+        try:
+            await mark_watchdog_crash_loop(server['id'], now)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить состояние автоперезапуска {server['id']}: {e}")
+        
+        script = build_log_tail_script(server['filename'] or 'bot.py', server['service_name'])
+        success, output = await execute_server_command(server['id'], server['user_id'], script, trusted=True,
+                                                       priority=PRIORITY_BACKGROUND, audit=False)
+        text = (f"🛑 {server['name']} (ID: {server['id']}): бот падает циклически - "
+                f"{len(state['restarts'])} перезапусков за {WATCHDOG_CRASH_LOOP_WINDOW // 60} мин.\n"
+                f"Автоперезапуск приостановлен, включите снова: /watchdog {server['id']} on")
+        if success and output.strip():
+            text += f"\n\n📋 Последние строки лога:\n{output.strip()}"
+        await self._send(server, text)
+    
+    async def _send(self, server: Dict[str, Any], text: str) -> None:
+        if not self.bot:
+            logger.warning(f"Уведомление не отправлено (бот не подключен): {text}")
+            return
+        await outbound.send_to_chat(self.bot, server['user_id'], text)
+
+bot_watchdog = BotWatchdog()
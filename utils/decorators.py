@@ -28,7 +28,7 @@ def require_server_exists(func: Callable) -> Callable:
     """Декоратор для проверки существования сервера"""
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, server_id: int, *args, **kwargs):
         user_id = update.effective_user.id
-        server_config = get_server_config(server_id, user_id)
+        server_config = await get_server_config(server_id, user_id)
         
         if not server_config:
             await update.message.reply_text("❌ Сервер не найден")
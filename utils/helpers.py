@@ -3,18 +3,101 @@
 Вспомогательные функции
 """
 
-from telegram import Update
+import asyncio
+import time
+from telegram import Message, Update
 from typing import Optional
+from utils.outbound import outbound
 
-async def safe_send_message(update: Update, text: str, max_length: int = 4096) -> None:
-    """Безопасная отправка сообщений с учетом ограничения длины"""
-    if len(text) > max_length:
-        text = text[:max_length - 100] + "\n\n... (сообщение обрезано)"
-    
-    try:
-        if update and update.message:
-            await update.message.reply_text(text)
-        elif update and update.effective_chat:
-            await update.effective_chat.send_message(text)
-    except Exception:
-        pass
\ No newline at end of file
+async def safe_send_message(update: Update, text: str) -> Optional[Message]:
+    """
+    Отправка ответа с учетом ограничений Telegram
+    
+    Длинный текст делится на несколько сообщений по строкам, очень длинный
+    отправляется файлом. Возвращает первое отправленное сообщение.
+    """
+    if not update or not update.effective_chat:
+        return None
+    return await outbound.send_text(update.effective_chat, text, reply_to=update.message)
+
+async def safe_edit_message(message: Optional[Message], text: str) -> None:
+    """Безопасное редактирование ранее отправленного сообщения"""
+    if not message:
+        return
+    await outbound.edit_text(message, text)
+
+class ThrottledEditor:
+    """Редактирование сообщения не чаще одного раза за интервал"""
+    
+    def __init__(self, message: Optional[Message], interval: float = 1.0):
+        self.message = message
+        self.interval = interval
+        self._text: Optional[str] = None
+        self._shown: Optional[str] = None
+        self._last_edit = 0.0
+        self._pending: Optional[asyncio.Task] = None
+    
+    async def update(self, text: str) -> None:
+        """Запомнить новый текст и показать его, как только позволит интервал"""
+        self._text = text
+        delay = self._last_edit + self.interval - time.monotonic()
+        if delay <= 0:
+            await self._edit()
+        elif not self._pending:
+            self._pending = asyncio.create_task(self._edit_later(delay))
+    
+    async def flush(self) -> None:
+        """Немедленно показать последний текст"""
+        if self._pending:
+            self._pending.cancel()
+            self._pending = None
+        await self._edit()
+    
+    async def _edit_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._pending = None
+        await self._edit()
+    
+    async def _edit(self) -> None:
+        if self._text is None or self._text == self._shown:
+            return
+        self._shown = self._text
+        self._last_edit = time.monotonic()
+        await safe_edit_message(self.message, self._text)
+
+def format_size(num_bytes: float) -> str:
+    """Размер в удобочитаемом виде (как free -h / df -h)"""
+    for unit in ['B', 'K', 'M', 'G', 'T']:
+        if abs(num_bytes) < 1024 or unit == 'T':
+            break
+        num_bytes /= 1024
+    
+    if unit == 'B':
+        return f"{int(num_bytes)}{unit}"
+    return f"{num_bytes:.1f}{unit}"
+
+def format_age(seconds: float) -> str:
+    """Давность в виде 'N с назад' / 'N мин назад' / 'N ч назад'"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} с назад"
+    if seconds < 3600:
+        return f"{seconds // 60} мин назад"
+    if seconds < 86400:
+        return f"{seconds // 3600} ч назад"
+    return f"{seconds // 86400} дн. назад"
+
+def format_duration(seconds: float) -> str:
+    """Длительность в виде 'N дн. N ч N мин'"""
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes = seconds // 60
+    
+    parts = []
+    if days:
+        parts.append(f"{days} дн.")
+    if hours or days:
+        parts.append(f"{hours} ч")
+    parts.append(f"{minutes} мин")
+    return ' '.join(parts)
\ No newline at end of file
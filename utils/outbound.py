@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Отправка сообщений в Telegram с учетом ограничений частоты
+"""
+
+import asyncio
+import logging
+from io import BytesIO
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram import Bot, Chat, Message
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+import config
+from utils.cache import LRUCache
+from utils.ratelimit import TokenBucket
+
+MESSAGE_MAX_LENGTH = 4096
+# Общие ограничения Telegram: ~30 сообщений в секунду на бота, ~1 в секунду в один чат
+OUTBOUND_GLOBAL_RATE = getattr(config, 'OUTBOUND_GLOBAL_RATE', 25)
+OUTBOUND_CHAT_RATE = getattr(config, 'OUTBOUND_CHAT_RATE', 1.0)
+OUTBOUND_CHAT_BURST = getattr(config, 'OUTBOUND_CHAT_BURST', 3)
+OUTBOUND_MAX_RETRIES = getattr(config, 'OUTBOUND_MAX_RETRIES', 3)
+# Длиннее - отправляется файлом, а не серией сообщений
+OUTBOUND_DOCUMENT_THRESHOLD = getattr(config, 'OUTBOUND_DOCUMENT_THRESHOLD', 4 * MESSAGE_MAX_LENGTH)
+
+logger = logging.getLogger(__name__)
+
+def split_message(text: str, max_length: int = MESSAGE_MAX_LENGTH) -> List[str]:
+    """Разбить текст на части по границам строк (слишком длинные строки режутся)"""
+    chunks = []
+    current = ''
+    for line in text.split('\n'):
+        while len(line) > max_length:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(line[:max_length])
+            line = line[max_length:]
+        
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= max_length:
+            current += '\n' + line
+        else:
+            chunks.append(current)
+            current = line
+    
+    if current.strip():
+        chunks.append(current)
+    return chunks or [text[:max_length]]
+
+def _retry_delay(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class OutboundSender:
+    """Очередь отправки: общее и по-чатовое ведро токенов, повтор при RetryAfter"""
+    
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE, chat_rate: float = OUTBOUND_CHAT_RATE,
+                 chat_burst: float = OUTBOUND_CHAT_BURST, max_retries: int = OUTBOUND_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chat_buckets = LRUCache(maxsize=10000)
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+    
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets.set(chat_id, bucket)
+        return bucket
+    
+    async def call(self, chat_id: int, request: Callable[[], Awaitable[Any]], idempotent: bool = False) -> Any:
+        """
+        Выполнить запрос к Telegram с ожиданием токенов и повторами
+
+        Таймаут ответа повторяется только для идемпотентных запросов (редактирование):
+        отправленное сообщение при таймауте часто уже доставлено, и повтор дал бы дубликат.
+
+        Returns:
+            Результат запроса или None, если его не удалось выполнить
+        """
+        chat_bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.max_retries + 1):
+            await chat_bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                result = await request()
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                delay = _retry_delay(e)
+                # Ведро чата не выдаст токен до истечения паузы - это ждут и повтор,
+                # и остальные отправки в этот чат
+                chat_bucket.penalize(delay)
+                logger.warning(f"Telegram просит подождать {delay} с (чат {chat_id})")
+                if attempt == self.max_retries:
+                    break
+                self.retries += 1
+            except (TimedOut, NetworkError) as e:
+                if (isinstance(e, BadRequest) or (isinstance(e, TimedOut) and not idempotent)
+                        or attempt == self.max_retries):
+                    logger.error(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+                    break
+                self.retries += 1
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                logger.error(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+                break
+        
+        self.failed += 1
+        return None
+    
+    async def send_text(self, chat: Chat, text: str, reply_to: Optional[Message] = None) -> Optional[Message]:
+        """
+        Отправить текст любой длины
+
+        Длинный текст делится на сообщения по строкам, очень длинный
+        отправляется файлом. Возвращает первое отправленное сообщение.
+        """
+        if len(text) > OUTBOUND_DOCUMENT_THRESHOLD:
+            return await self.send_document(chat, text, reply_to=reply_to)
+        
+        first = None
+        for index, chunk in enumerate(split_message(text)):
+            if index == 0 and reply_to:
+                message = await self.call(chat.id, lambda: reply_to.reply_text(chunk))
+            else:
+                message = await self.call(chat.id, lambda: chat.send_message(chunk))
+            first = first or message
+        return first
+    
+    async def send_to_chat(self, bot: Bot, chat_id: int, text: str) -> Optional[Message]:
+        """Отправить текст в чат по id (оповещения без входящего сообщения)"""
+        first = None
+        for chunk in split_message(text):
+            message = await self.call(chat_id, lambda: bot.send_message(chat_id, chunk))
+            first = first or message
+        return first
+    
+    async def send_document(self, chat: Chat, text: str, filename: str = 'output.txt',
+                            reply_to: Optional[Message] = None) -> Optional[Message]:
+        """Отправить текст файлом из памяти; первая строка - подпись"""
+        data = text.encode('utf-8')
+        caption = text.split('\n', 1)[0][:200]
+        
+        async def request():
+            # Новый буфер на каждую попытку: неудачная отправка могла его прочитать
+            document = BytesIO(data)
+            if reply_to:
+                return await reply_to.reply_document(document, filename=filename, caption=caption)
+            return await chat.send_document(document, filename=filename, caption=caption)
+        
+        return await self.call(chat.id, request)
+    
+    async def edit_text(self, message: Message, text: str) -> Optional[Message]:
+        """Изменить текст сообщения (редактирование тоже расходует лимит чата)"""
+        if len(text) > MESSAGE_MAX_LENGTH:
+            text = text[:MESSAGE_MAX_LENGTH - 100] + "\n\n... (сообщение обрезано)"
+        
+        async def request():
+            try:
+                return await message.edit_text(text)
+            except BadRequest as e:
+                if 'not modified' in str(e).lower():
+                    return message
+                raise
+        
+        return await self.call(message.chat_id, request, idempotent=True)
+    
+    def stats(self) -> Dict[str, int]:
+        """Счетчики отправки"""
+        return {
+            'sent': self.sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'global_waits': self.global_bucket.waits,
+            'chats': len(self._chat_buckets)
+        }
+
+outbound = OutboundSender()
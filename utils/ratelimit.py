@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Ограничение частоты операций
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waits = 0
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Взять токены без ожидания; False - если их недостаточно"""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+    
+    def delay(self, tokens: float = 1.0) -> float:
+        """Сколько секунд ждать, пока накопится нужное число токенов"""
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+    
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Взять токены сразу, в долг; вернуть, сколько секунд ждать до их появления
+
+        Долг учитывается следующими delay() и reserve(), поэтому очередь
+        ожидающих видна новым вызовам.
+        """
+        wait = self.delay(tokens)
+        self._tokens -= tokens
+        return wait
+    
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Дождаться и взять токены (ожидающие обслуживаются по очереди)"""
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                self.waits += 1
+                await asyncio.sleep(self.delay(tokens))
+    
+    def penalize(self, seconds: float) -> None:
+        """Не выдавать токены указанное время (ответ сервера 'слишком часто')"""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
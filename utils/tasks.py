@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Периодические фоновые задачи
+"""
+
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """Вызов корутины с заданным интервалом и случайным разбросом"""
+    
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[Any]],
+                 jitter: float = 0.0, initial_delay: Optional[float] = None):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.jitter = jitter
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self) -> None:
+        """Запустить задачу"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+    
+    async def stop(self) -> None:
+        """Остановить задачу"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def _delay(self, base: float) -> float:
+        return max(0.0, base + random.uniform(-self.jitter, self.jitter))
+    
+    async def _run(self) -> None:
+        await asyncio.sleep(self._delay(self.initial_delay))
+        while True:
+            try:
+                await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка периодической задачи {self.name}: {e}", exc_info=True)
+            await asyncio.sleep(self._delay(self.interval))